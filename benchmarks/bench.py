@@ -0,0 +1,241 @@
+'''
+data path の benchmark。結果は JSON で出す。
+
+> python benchmarks/bench.py -o bench_output.txt
+
+network には出ない。fixture を localhost の StandInServer から取る。
+'''
+from typing import Callable, Dict, List
+import argparse
+import asyncio
+import datetime
+import gc
+import json
+import pathlib
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(HERE.parent / 'src'))
+sys.path.append(str(HERE))
+
+import jma  # noqa: E402
+from jma import snapshot  # noqa: E402
+from jma.amedas import AmedasStore  # noqa: E402
+from jma.cache_backend import create_backend  # noqa: E402
+from jma.forecast import Forecast  # noqa: E402
+from jma.http_getter import HttpGetter  # noqa: E402
+from jma.json_stream import fast_loads  # noqa: E402
+import fixtures  # noqa: E402
+from server import StandInServer  # noqa: E402
+
+PATHS = {
+    'area.json': '/bosai/common/const/area.json',
+    'amedastable.json': '/bosai/amedas/const/amedastable.json',
+    'forecast.json': '/bosai/forecast/data/forecast/130000.json',
+    'amedas_map.json': '/bosai/amedas/data/map/20220212080000.json',
+}
+
+
+def measure(func: Callable, repeat: int) -> dict:
+    '''
+    ms
+    '''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - start) * 1000)
+    return {'min_ms': min(times), 'median_ms': statistics.median(times), 'max_ms': max(times)}
+
+
+def measure_peak(func: Callable) -> int:
+    '''
+    tracemalloc の peak bytes
+    '''
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def bench_parse(payloads: Dict[str, bytes], repeat: int) -> dict:
+    result = {}
+    for name, data in payloads.items():
+        result[name] = {
+            'bytes': len(data),
+            'json': measure(lambda: json.loads(data), repeat),
+            'fast_loads': measure(lambda: fast_loads(data), repeat),
+        }
+    return result
+
+
+def bench_build(payloads: Dict[str, bytes], repeat: int) -> dict:
+    area = json.loads(payloads['area.json'])
+    stable = json.loads(payloads['amedastable.json'])
+    forecast = json.loads(payloads['forecast.json'])
+    amedas_map = json.loads(payloads['amedas_map.json'])
+    stations = jma.StationTable.from_json(stable)
+
+    def add_amedas():
+        store = AmedasStore(stations)
+        store.add(fixtures.AMEDAS_TIME, amedas_map)
+
+    result = {
+        'area_index': measure(lambda: jma.AreaIndex(area), repeat),
+        'station_table': measure(lambda: jma.StationTable.from_json(stable), repeat),
+        'forecast': measure(lambda: Forecast(forecast), repeat),
+        'amedas_store': measure(add_amedas, repeat),
+    }
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = pathlib.Path(tmp) / 'snapshot.bin'
+
+        def cold():
+            path.unlink(missing_ok=True)
+            snapshot.load_or_build(path, payloads['area.json'], payloads['amedastable.json'])
+        result['snapshot_build'] = measure(cold, repeat)
+        result['snapshot_load'] = measure(
+            lambda: snapshot.load_or_build(path, payloads['area.json'], payloads['amedastable.json']), repeat)
+    return result
+
+
+def bench_memory(payloads: Dict[str, bytes]) -> dict:
+    def build():
+        jma.AreaIndex(json.loads(payloads['area.json']))
+        jma.StationTable.from_json(json.loads(payloads['amedastable.json']))
+    return {
+        name: measure_peak(lambda: fast_loads(data)) for name, data in payloads.items()
+    } | {'area_index+station_table': measure_peak(build)}
+
+
+async def bench_cache_async(payloads: Dict[str, bytes], repeat: int, backend: str) -> dict:
+    loop = asyncio.get_running_loop()
+    server = StandInServer({PATHS[name]: data for name, data in payloads.items()})
+    await server.start_async()
+    result: Dict[str, dict] = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            getter = HttpGetter(loop, pathlib.Path(tmp), rate=1000, burst=1000,
+                                backend=create_backend(pathlib.Path(tmp), backend))
+            try:
+                for name, path in PATHS.items():
+                    url = server.url(path)
+                    miss: List[float] = []
+                    disk: List[float] = []
+                    memory: List[float] = []
+                    revalidate: List[float] = []
+                    for _ in range(repeat):
+                        getter.backend.put(url, b'{}', jma.cache_policy.CacheMeta(0))
+                        getter.objects.clear()
+                        # etag が違うので 200
+                        start = time.perf_counter()
+                        await getter.get_json_async(url, use_cache=False)
+                        miss.append(time.perf_counter() - start)
+                        # 304
+                        start = time.perf_counter()
+                        await getter.get_json_async(url, use_cache=False)
+                        revalidate.append(time.perf_counter() - start)
+                        getter.objects.clear()
+                        start = time.perf_counter()
+                        await getter.get_json_async(url)
+                        disk.append(time.perf_counter() - start)
+                        start = time.perf_counter()
+                        await getter.get_json_async(url)
+                        memory.append(time.perf_counter() - start)
+                    result[name] = {
+                        key: {'min_ms': min(values) * 1000, 'median_ms': statistics.median(values) * 1000}
+                        for key, values in (('miss', miss), ('revalidate', revalidate),
+                                            ('disk_hit', disk), ('object_hit', memory))
+                    }
+            finally:
+                getter.shutdown()
+                await asyncio.sleep(0)
+    finally:
+        await server.stop_async()
+    return result
+
+
+async def bench_throughput_async(payloads: Dict[str, bytes], concurrencies: List[int],
+                                 count: int, latency: float) -> dict:
+    '''
+    time の違う amedas map を count 個、latency のある server から取る
+    '''
+    loop = asyncio.get_running_loop()
+    body = payloads['amedas_map.json']
+    server = StandInServer({}, latency=latency)
+    start_time = fixtures.AMEDAS_TIME
+    paths = []
+    for i in range(count):
+        t = start_time - datetime.timedelta(minutes=10 * i)
+        path = f'/bosai/amedas/data/map/{t.strftime(jma.DATE_FORMAT)}.json'
+        server.add(path, body)
+        paths.append(path)
+    await server.start_async()
+    urls = [server.url(path) for path in paths]
+    result = {}
+    try:
+        for concurrency in concurrencies:
+            with tempfile.TemporaryDirectory() as tmp:
+                getter = HttpGetter(loop, pathlib.Path(tmp), concurrency=concurrency,
+                                    rate=100000, burst=100000)
+                try:
+                    start = time.perf_counter()
+                    await asyncio.gather(*(getter.get_async(url) for url in urls))
+                    elapsed = time.perf_counter() - start
+                finally:
+                    getter.shutdown()
+                    await asyncio.sleep(0)
+            result[str(concurrency)] = {
+                'seconds': elapsed,
+                'requests_per_second': count / elapsed,
+                'megabytes_per_second': count * len(body) / elapsed / 1024 / 1024,
+                'latency_average_ms': getter.stats.latency_average * 1000,
+            }
+    finally:
+        await server.stop_async()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', '--output', type=pathlib.Path, help='write JSON to file')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--backend', choices=['file', 'sqlite'], default='file')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--count', type=int, default=64, help='requests for the throughput run')
+    parser.add_argument('--latency', type=float, default=0.05, help='server latency in seconds')
+    args = parser.parse_args()
+
+    payloads = fixtures.load()
+    result = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': datetime.datetime.now().astimezone().isoformat(),
+        'fixtures': {name: ('recorded' if (fixtures.FIXTURES_DIR / name).exists() else 'generated')
+                     for name in payloads},
+        'parse': bench_parse(payloads, args.repeat),
+        'build': bench_build(payloads, args.repeat),
+        'memory_peak_bytes': bench_memory(payloads),
+        'cache': asyncio.run(bench_cache_async(payloads, args.repeat, args.backend)),
+        'throughput': asyncio.run(bench_throughput_async(
+            payloads, args.concurrency, args.count, args.latency)),
+    }
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        args.output.write_text(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+'''
+benchmark 用の payload。
+
+fixtures/ に記録済みの JSON があればそれを使い、無ければ同じ形・同じくらいの大きさのものを
+乱数(seed 固定)で作る。
+
+> python benchmarks/fixtures.py --record
+'''
+from typing import Dict
+import argparse
+import datetime
+import json
+import pathlib
+import random
+import sys
+
+HERE = pathlib.Path(__file__).absolute().parent
+FIXTURES_DIR = HERE / 'fixtures'
+sys.path.append(str(HERE.parent / 'src'))
+
+import jma  # noqa: E402
+
+AMEDAS_TIME = datetime.datetime(2022, 2, 12, 8, 0)
+FORECAST_OFFICE = '130000'
+
+# fixture 名 => 本物の url
+URLS = {
+    'area.json': jma.AREA_URL,
+    'amedastable.json': jma.AMEDAS_STALBE_URL,
+    'forecast.json': jma.FORECAST_URL % {'office': FORECAST_OFFICE},
+    'amedas_map.json': jma.AMEDAS_MAP_URL % {'time': AMEDAS_TIME.strftime(jma.DATE_FORMAT)},
+}
+
+
+def generate_area(rng: random.Random) -> dict:
+    area: Dict[str, dict] = {level: {} for level in jma.area_index.LEVELS}
+    for c in range(11):
+        center = f'{c + 1:02}0100'
+        area['centers'][center] = {'name': f'地方{c}', 'enName': f'Region{c}', 'children': []}
+        for o in range(5):
+            office = f'{c * 5 + o + 1:02}0000'
+            area['centers'][center]['children'].append(office)
+            area['offices'][office] = {'name': f'府県{office}', 'parent': center, 'children': []}
+            for k10 in range(2):
+                class10 = f'{office[:2]}00{k10 + 1}0'
+                area['offices'][office]['children'].append(class10)
+                area['class10s'][class10] = {'name': f'一次細分{class10}', 'parent': office, 'children': []}
+                for k15 in range(3):
+                    class15 = f'{class10[:5]}{k15 + 1}'
+                    area['class10s'][class10]['children'].append(class15)
+                    area['class15s'][class15] = {'name': f'市町村等{class15}', 'parent': class10, 'children': []}
+                    for k20 in range(rng.randint(4, 8)):
+                        class20 = f'{class15}{k20:02}0'
+                        area['class15s'][class15]['children'].append(class20)
+                        area['class20s'][class20] = {
+                            'name': f'市町村{class20}', 'enName': f'City{class20}',
+                            'kana': 'しちょうそん', 'parent': class15}
+    return area
+
+
+def generate_stable(rng: random.Random) -> dict:
+    stable = {}
+    for i in range(1300):
+        code = f'{11 + i // 20}{i % 20:03}'
+        stable[code] = {
+            'type': rng.choice('ABC'), 'elems': '11111111',
+            'lat': [rng.randint(24, 45), round(rng.uniform(0, 60), 1)],
+            'lon': [rng.randint(123, 145), round(rng.uniform(0, 60), 1)],
+            'alt': rng.randint(0, 2000),
+            'kjName': f'地点{i}', 'knName': f'チテン{i}', 'enName': f'Station{i}',
+        }
+    return stable
+
+
+def generate_amedas_map(rng: random.Random, stable: dict) -> dict:
+    data = {}
+    for code in stable:
+        data[code] = {
+            'temp': [round(rng.uniform(-20, 35), 1), 0],
+            'humidity': [rng.randint(10, 100), 0],
+            'precipitation10m': [round(rng.uniform(0, 5), 1), 0],
+            'precipitation1h': [round(rng.uniform(0, 20), 1), 0],
+            'windDirection': [rng.randint(0, 16), 0],
+            'wind': [round(rng.uniform(0, 20), 1), rng.choice([0, 0, 0, 1])],
+        }
+    return data
+
+
+def generate_forecast(rng: random.Random) -> list:
+    base = datetime.datetime(2022, 2, 12, 5, tzinfo=datetime.timezone(datetime.timedelta(hours=9)))
+
+    def times(count: int, hours: int):
+        return [(base + datetime.timedelta(hours=hours * i)).isoformat() for i in range(count)]
+
+    def area(code: str):
+        return {'name': f'area{code}', 'code': code}
+    areas = ['130010', '130020', '130030', '130040']
+    return [
+        {'publishingOffice': '気象庁', 'reportDatetime': base.isoformat(), 'timeSeries': [
+            {'timeDefines': times(3, 24), 'areas': [{
+                'area': area(a), 'weatherCodes': [str(rng.choice([100, 101, 200, 300])) for _ in range(3)],
+                'weathers': ['晴れ　時々　くもり'] * 3, 'winds': ['北の風　やや強く'] * 3, 'waves': ['０．５メートル'] * 3}
+                for a in areas]},
+            {'timeDefines': times(6, 6), 'areas': [
+                {'area': area(a), 'pops': [str(rng.randint(0, 10) * 10) for _ in range(6)]} for a in areas]},
+            {'timeDefines': times(4, 9), 'areas': [
+                {'area': area('44132'), 'temps': [str(rng.randint(-5, 15)) for _ in range(4)]}]},
+        ]},
+        {'publishingOffice': '気象庁', 'reportDatetime': base.isoformat(), 'timeSeries': [
+            {'timeDefines': times(7, 24), 'areas': [{
+                'area': area('130010'), 'weatherCodes': ['101'] * 7, 'pops': ['10'] * 7, 'reliabilities': ['A'] * 7}]},
+            {'timeDefines': times(7, 24), 'areas': [{
+                'area': area('44132'), 'tempsMin': ['2'] * 7, 'tempsMax': ['12'] * 7}]},
+        ], 'tempAverage': {'areas': [{'area': area('44132'), 'min': '2.1', 'max': '10.3'}]},
+            'precipAverage': {'areas': [{'area': area('44132'), 'min': '3', 'max': '13'}]}},
+    ]
+
+
+def generate() -> Dict[str, bytes]:
+    rng = random.Random(0)
+    stable = generate_stable(rng)
+    payloads = {
+        'area.json': generate_area(rng),
+        'amedastable.json': stable,
+        'forecast.json': generate_forecast(rng),
+        'amedas_map.json': generate_amedas_map(rng, stable),
+    }
+    return {name: json.dumps(value, ensure_ascii=False).encode('utf-8') for name, value in payloads.items()}
+
+
+def load() -> Dict[str, bytes]:
+    '''
+    記録済みのものを優先する
+    '''
+    payloads = generate()
+    for name in payloads:
+        path = FIXTURES_DIR / name
+        if path.exists():
+            payloads[name] = path.read_bytes()
+    return payloads
+
+
+def record():
+    import urllib.request
+    FIXTURES_DIR.mkdir(parents=True, exist_ok=True)
+    for name, url in URLS.items():
+        print(f'{url} => {name}')
+        with urllib.request.urlopen(url) as response:
+            (FIXTURES_DIR / name).write_bytes(response.read())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--record', action='store_true', help='download the real payloads')
+    args = parser.parse_args()
+    if args.record:
+        record()
+    else:
+        for name, data in load().items():
+            print(f'{name}: {len(data)} bytes')
@@ -0,0 +1,70 @@
+'''
+気象庁の代わりに fixture を返す localhost の http server。
+
+応答前に latency 秒待つ。status に path => status code を入れるとその code を返す。
+ETag を付けるので If-None-Match には 304 を返す。
+'''
+from typing import Dict, Optional
+import asyncio
+import hashlib
+import urllib.parse
+from aiohttp import web
+
+
+class StandInServer:
+    def __init__(self, routes: Dict[str, bytes], *, latency: float = 0.0,
+                 status: Optional[Dict[str, int]] = None) -> None:
+        '''
+        routes: path => body
+        '''
+        self.routes = routes
+        self.etags = {path: '"' + hashlib.sha1(body).hexdigest() + '"'
+                      for path, body in routes.items()}
+        self.latency = latency
+        self.status = status or {}
+        self.requests = 0
+        self.not_modified = 0
+        self.runner: Optional[web.AppRunner] = None
+        self.port = 0
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.port}'
+
+    def url(self, path: str) -> str:
+        return self.base_url + path
+
+    def add(self, path: str, body: bytes):
+        self.routes[path] = body
+        self.etags[path] = '"' + hashlib.sha1(body).hexdigest() + '"'
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        path = urllib.parse.unquote(request.path)
+        status = self.status.get(path)
+        if status:
+            return web.Response(status=status)
+        body = self.routes.get(path)
+        if body is None:
+            return web.Response(status=404)
+        etag = self.etags[path]
+        if request.headers.get('If-None-Match') == etag:
+            self.not_modified += 1
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(body=body, content_type='application/json', headers={'ETag': etag})
+
+    async def start_async(self):
+        app = web.Application()
+        app.router.add_route('GET', '/{tail:.*}', self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]  # type: ignore
+
+    async def stop_async(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
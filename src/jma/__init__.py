@@ -1,5 +1,7 @@
 from typing import List
 import datetime
+from .area_index import AreaNode, AreaIndex
+from .stations import Station, StationTable
 
 DATE_FORMAT = '%Y%m%d%H%M%S'
 
@@ -20,33 +22,13 @@ BASE_URL = 'https://www.jma.go.jp/bosai'
 AREA_URL = f'{BASE_URL}/common/const/area.json'
 AMEDAS_STALBE_URL = f'{BASE_URL}/amedas/const/amedastable.json'
 HIMAWARI_TIMES_URL = f'{BASE_URL}/himawari/data/satimg/targetTimes_fd.json'
+HIMAWARI_TILE_URL = f'{BASE_URL}/himawari/data/satimg/%(basetime)s/fd/%(validtime)s/%(band)s/%(prod)s/%(z)s/%(x)s/%(y)s.jpg'
+AMEDAS_MAP_URL = f'{BASE_URL}/amedas/data/map/%(time)s.json'
+AMEDAS_LATEST_URL = f'{BASE_URL}/amedas/data/latest_time.txt'
 
 OVERVIEW_URL = f'{BASE_URL}/forecast/data/overview_forecast/%(office)s.json'
 FORECAST_URL = f'{BASE_URL}/forecast/data/forecast/%(office)s.json'
 
-class AreaNode:
-    def __init__(self, key, name) -> None:
-        self.key = key
-        self.name = name
-        self.children: List[AreaNode] = []
-
 
 def area_tree(area) -> List[AreaNode]:
-    node_map = {}
-
-    def create_node(data):
-        nodes = []
-        for k, v in data.items():
-            node = AreaNode(k, v['name'])
-            node_map[k] = node
-            for child in v.get('children', []):
-                if child == k:
-                    continue
-                node.children.append(node_map[child])
-            nodes.append(node)
-        return nodes
-    create_node(area['class20s'])
-    create_node(area['class15s'])
-    create_node(area['class10s'])
-    create_node(area['offices'])
-    return create_node(area['centers'])
+    return AreaIndex(area).roots
@@ -1,314 +1,246 @@
-import json
-from typing import List, Optional, Tuple
-import pathlib
-import datetime
+import argparse
 import asyncio
 import logging
-import ctypes
+import pathlib
+import sys
 import jma
-from pydear.utils import dockspace
-from pydear import imgui as ImGui
-logger = logging.getLogger(__name__)
-
-# ひまわり
-# https://www.jma.go.jp/bosai/himawari/data/satimg/{basetime}/fd/{validtime}/{band}/{prod}/{z}/{x}/{y}.jpg
-
-
-def table_selector(headers: List[str], row_it, col_it, last_selected):
-    flags = (
-        ImGui.ImGuiTableFlags_.BordersV
-        | ImGui.ImGuiTableFlags_.BordersOuterH
-        | ImGui.ImGuiTableFlags_.Resizable
-        | ImGui.ImGuiTableFlags_.RowBg
-        | ImGui.ImGuiTableFlags_.NoBordersInBody
-    )
-    selected = None
-    if ImGui.BeginTable("table_selector", len(headers), flags):
-        # header
-        for header in headers:
-            ImGui.TableSetupColumn(header)
-        ImGui.TableHeadersRow()
-
-        # body
-        for key, row in row_it:
-            # row
-            ImGui.TableNextRow()
-            it = col_it(row)
-            # 0
-            ImGui.TableNextColumn()
-            col = next(it)
-            if ImGui.Selectable(f'{col}###{key}', key == last_selected, ImGui.ImGuiSelectableFlags_.SpanAllColumns):
-                logger.debug(f'select: {key}')
-                selected = key
-            while True:
-                try:
-                    col = next(it)
-                    ImGui.TableNextColumn()
-                    ImGui.TextUnformatted(str(col))
-                except StopIteration:
-                    break
-
-        ImGui.EndTable()
-
-    return selected
-
-
-def area_selector(centers: List[jma.AreaNode], last_selected) -> Optional[Tuple[jma.AreaNode, ...]]:
-    flags = (
-        ImGui.ImGuiTableFlags_.BordersV
-        | ImGui.ImGuiTableFlags_.BordersOuterH
-        | ImGui.ImGuiTableFlags_.Resizable
-        | ImGui.ImGuiTableFlags_.RowBg
-        | ImGui.ImGuiTableFlags_.NoBordersInBody
-    )
-    selected: List[Tuple[jma.AreaNode, ...]] = [()]
-    if ImGui.BeginTable("area_selector", 2, flags):
-        # header
-        ImGui.TableSetupColumn('name')
-        ImGui.TableSetupColumn('key')
-        ImGui.TableHeadersRow()
-
-        def area_node(node: jma.AreaNode, parent_path: Tuple[jma.AreaNode, ...], default_open=False):
-            path = parent_path + (node,)
-            ImGui.TableNextRow()
-            # name
-            ImGui.TableNextColumn()
-            tree_flag = ImGui.ImGuiTreeNodeFlags_.OpenOnArrow | ImGui.ImGuiTreeNodeFlags_.OpenOnDoubleClick | ImGui.ImGuiTreeNodeFlags_.SpanAvailWidth
-            if path == last_selected:
-                tree_flag |= ImGui.ImGuiTreeNodeFlags_.Selected
-            if not node.children:
-                tree_flag |= ImGui.ImGuiTreeNodeFlags_.Leaf
-                tree_flag |= ImGui.ImGuiTreeNodeFlags_.Bullet
-            if default_open:
-                ImGui.SetNextItemOpen(True, ImGui.ImGuiCond_.FirstUseEver)
-            open = ImGui.TreeNodeEx(node.name, tree_flag)
-            if ImGui.IsItemClicked() and not ImGui.IsItemToggledOpen():
-                selected[0] = path
-                logger.debug(f'selected: {selected[0]}')
-            # ImGui.SetItemAllowOverlap()
-            # key
-            ImGui.TableNextColumn()
-            ImGui.TextUnformatted(node.key)
-
-            if open:
-                for child in node.children:
-                    area_node(child, path)
-                ImGui.TreePop()
-
-        for node in centers:
-            area_node(node, (), True)
-
-        ImGui.EndTable()
-    return selected[0]
-
-
-def show_table(table_name, times, headers, data):
-    name = data['area']['name']
-    ImGui.TextUnformatted(f'{name}')
-    flags = (
-        ImGui.ImGuiTableFlags_.BordersV
-        | ImGui.ImGuiTableFlags_.BordersOuterH
-        | ImGui.ImGuiTableFlags_.Resizable
-        | ImGui.ImGuiTableFlags_.RowBg
-        | ImGui.ImGuiTableFlags_.NoBordersInBody
-    )
-    if ImGui.BeginTable(table_name, len(headers)+1, flags):
-        # header
-        ImGui.TableSetupColumn('time')
-        for header in headers:
-            ImGui.TableSetupColumn(header)
-        ImGui.TableHeadersRow()
-
-        # body
-        for i, time in enumerate(times):
-            # row
-            ImGui.TableNextRow()
-            # 0
-            ImGui.TableNextColumn()
-            ImGui.TextUnformatted(f'{time}')
-
-            for header in headers:
-                ImGui.TableNextColumn()
-                value = data.get(header)
-                if value:
-                    # waves 無いとき
-                    ImGui.TextUnformatted(f'{value[i]}')
-
-        ImGui.EndTable()
-
-
-class Gui(dockspace.DockingGui):
-    def __init__(self, loop: asyncio.AbstractEventLoop, cache_dir: pathlib.Path) -> None:
-        from pydear.utils.loghandler import ImGuiLogHandler
-        log_handler = ImGuiLogHandler()
-        log_handler.setFormatter(logging.Formatter(
-            '%(name)s:%(lineno)s[%(levelname)s]%(message)s'))
-        log_handler.register_root()
-
-        docks = [
-            dockspace.Dock('log', log_handler.draw,
-                           (ctypes.c_bool * 1)(True)),
-            dockspace.Dock('area', self.select_area,
-                           (ctypes.c_bool * 1)(True)),
-            dockspace.Dock('times', self.select_time,
-                           (ctypes.c_bool * 1)(True)),
-            dockspace.Dock('selected', self.show_selected,
-                           (ctypes.c_bool * 1)(True)),
-            dockspace.Dock('forecast', self.show_forecast,
-                           (ctypes.c_bool * 1)(True)),
-            dockspace.Dock('metrics', ImGui.ShowMetricsWindow,
-                           (ctypes.c_bool * 1)(True)),
-        ]
-        super().__init__(loop, docks=docks)
-
-        self.times = []
-        self.time_selected = None
-        self.area = None
-        self.area_selected = None
-        self.stable = None
-        self.stable_selected = None
-        self.amedas = None
-        self.forecast = None
-
-        import jma.http_getter
-        self.getter = jma.http_getter.HttpGetter(loop, cache_dir)
-        self.loop.create_task(self.start_async())
-
-    def _setup_font(self):
-        io = ImGui.GetIO()
-        font_size = 24
-
-        io.Fonts.AddFontFromFileTTF('C:/Windows/Fonts/MSGothic.ttc',
-                                    font_size, None, io.Fonts.GetGlyphRangesJapanese())
-
-        import pkgutil
-        font = pkgutil.get_data(
-            'weather_icons', 'assets/weathericons-regular-webfont.ttf')
-        assert font
-        font_range = [
-            0xf000, 0xf00e,
-            0xf010, 0xf01f,
-            0xf021, 0xf03f,
-            0xf040, 0xf049,
-            0xf04a, 0xf04f,
-            0xf050, 0xf059,
-            0xf062, 0xf06f,
-            0xf070, 0xf07f,
-            0xf080, 0xf0ec,
-            0
-        ]
-        font_range = (ctypes.c_ushort * len(font_range))(*font_range)
-
-        font_cfg = ImGui.ImFontConfig()
-        font_cfg.FontDataOwnedByAtlas = True
-        font_cfg.OversampleH = 3  # FIXME: 2 may be a better default?
-        font_cfg.OversampleV = 1
-        font_cfg.GlyphMaxAdvanceX = 9999
-        font_cfg.RasterizerMultiply = 1.0
-        font_cfg.EllipsisChar = 65535
-        font_cfg.MergeMode = True
-        import weather_icons
-        io.Fonts.AddFontFromFileTTF(str(weather_icons.get_path()), font_size, font_cfg, font_range)
-
-        io.Fonts.Build()
-
-    async def start_async(self):
-        area = await self.getter.get_json_async(jma.AREA_URL)
-        self.area = jma.area_tree(area)
-
-        stable = await self.getter.get_json_async(jma.AMEDAS_STALBE_URL)
-        self.stable = stable
-
-        times = await self.getter.get_json_async(jma.HIMAWARI_TIMES_URL)
-        self.times = [jma.to_datetime(t['validtime']) for t in times]
-
-    def select_area(self, p_open: ctypes.Array):
-        if ImGui.Begin('area', p_open):
-            if self.area:
-                selected = area_selector(self.area, self.area_selected)
-                if selected:
-                    self.area_selected = selected
-                    if len(self.area_selected) > 1:
-                        office = self.area_selected[1]
-                        self.loop.create_task(self.get_forecast(office))
-        ImGui.End()
-
-    async def get_forecast(self, office: jma.AreaNode):
-        url = f'https://www.jma.go.jp/bosai/forecast/data/forecast/{office.key}.json'
-        self.forecast = await self.getter.get_json_async(url, use_cache=False)
-
-    def _show_forecast_3day(self, data):
-        times = [datetime.datetime.fromisoformat(
-            t) for t in data['timeDefines']]
-        for area in data['areas']:
-            show_table(f'forecast3', times,
-                       ['weatherCodes', 'weathers', 'winds \uf058', 'waves'], area)
-
-    def _show_forecast_rain6(self, data):
-        times = [datetime.datetime.fromisoformat(
-            t) for t in data['timeDefines']]
-        for area in data['areas']:
-            show_table('rain6', times, ['pops'], area)
-
-    def _show_forecast_temperature(self, data):
-        times = [datetime.datetime.fromisoformat(
-            t) for t in data['timeDefines']]
-        for area in data['areas']:
-            show_table('temperature', times, ['temps'], area)
-
-    def show_forecast(self, p_open: ctypes.Array):
-        if ImGui.Begin('forecast', p_open):
-            if self.forecast:
-                latest, week = self.forecast
-                forecast3day, rain6, temperature = latest['timeSeries']
-                self._show_forecast_3day(forecast3day)
-                self._show_forecast_rain6(rain6)
-                self._show_forecast_temperature(temperature)
-                week_forecast, week_temperature = week['timeSeries']
-                temp_average = week['tempAverage']
-                precip_average = week['precipAverage']
-        ImGui.End()
-
-    def select_time(self, p_open: ctypes.Array):
-        if ImGui.Begin('times', p_open):
-            selected = table_selector(
-                ['value'], enumerate(self.times), lambda v: iter([v]), self.time_selected)
-            if selected:
-                self.time_selected = selected
-            # if isinstance(selected, int):
-            #     self.loop.create_task(
-            #         self.select_time_async(self.times[selected]))
-        ImGui.End()
-
-    async def select_time_async(self, time: datetime.datetime):
-        url = f'https://www.jma.go.jp/bosai/amedas/data/map/{time.strftime(jma.DATE_FORMAT)}.json'
-        self.amedas = await self.getter.get_json_async(url)
-
-    def show_selected(self, p_open: ctypes.Array):
-        if ImGui.Begin('amedas', p_open):
-            if self.area_selected:
-                ImGui.TextUnformatted(f'center: {self.area_selected[0].name}')
-                if len(self.area_selected) > 1:
-                    ImGui.TextUnformatted(
-                        f'office: {self.area_selected[1].name}')
-            if self.time_selected:
-                ImGui.TextUnformatted(f'{self.times[self.time_selected]}')
-        ImGui.End()
+
+
+def create_metrics(args: argparse.Namespace, loop: asyncio.AbstractEventLoop):
+    '''
+    --metrics-file, --metrics-port が無ければ None(計測しない)
+    '''
+    if not args.metrics_file and not args.metrics_port:
+        return None
+    from .metrics import Metrics, MetricsSinks
+    sinks = MetricsSinks(Metrics(), path=args.metrics_file, port=args.metrics_port)
+    sinks.start(loop)
+    return sinks
+
+
+def close_loop(loop: asyncio.AbstractEventLoop, getter, sinks):
+    '''
+    session を閉じて metrics を最後に書き出し、残った task と executor を片付けてから loop を閉じる
+    '''
+    async def close_async():
+        await getter.shutdown_async()
+        if sinks:
+            await sinks.stop_async()
+        current = asyncio.current_task()
+        tasks = [task for task in asyncio.all_tasks() if task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await loop.shutdown_default_executor()
+        getter.backend.close()
+
+    try:
+        loop.run_until_complete(close_async())
+    finally:
+        loop.close()
+
+
+def backfill(args: argparse.Namespace):
+    from .http_getter import HttpGetter
+    from .cache_backend import create_backend
+    from .archive import Archive
+    from . import backfill
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    sinks = create_metrics(args, loop)
+    getter = HttpGetter(loop, args.cache, concurrency=args.concurrency, rate=args.rate, burst=args.burst,
+                        backend=create_backend(args.cache, args.backend),
+                        metrics=sinks.metrics if sinks else None)
+    with Archive(args.archive) as archive:
+        try:
+            loop.run_until_complete(backfill.run_async(
+                getter, archive,
+                start=jma.to_datetime(args.start) if args.start else None,
+                end=jma.to_datetime(args.end) if args.end else None,
+                repeat=args.repeat))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            close_loop(loop, getter, sinks)
+
+
+def poll(args: argparse.Namespace):
+    from .http_getter import HttpGetter
+    from .cache_backend import create_backend
+    from . import poll
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    sinks = create_metrics(args, loop)
+    getter = HttpGetter(loop, args.cache, rate=args.rate, burst=args.burst,
+                        backend=create_backend(args.cache, args.backend),
+                        metrics=sinks.metrics if sinks else None)
+
+    async def run_async():
+        offices = args.office
+        if not offices:
+            area = await getter.get_json_async(jma.AREA_URL)
+            offices = list(jma.AreaIndex(area).level_maps[1].keys())
+        sink = poll.SocketSink(args.port) if args.port else poll.StdoutSink()
+        thresholds = poll.AMEDAS_THRESHOLDS if args.thresholds else None
+        await poll.run_async(getter, poll.create_endpoints(offices, amedas_thresholds=thresholds), sink)
+
+    try:
+        loop.run_until_complete(run_async())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        close_loop(loop, getter, sinks)
+
+
+def overview(args: argparse.Namespace):
+    from .http_getter import HttpGetter
+    from .cache_backend import create_backend
+    from .overview import OverviewStore, hours_ago
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    sinks = create_metrics(args, loop)
+    getter = HttpGetter(loop, args.cache, rate=args.rate, burst=args.burst,
+                        backend=create_backend(args.cache, args.backend),
+                        metrics=sinks.metrics if sinks else None)
+    store = OverviewStore(args.archive)
+
+    async def run_async():
+        if not args.offline:
+            area = await getter.get_json_async(jma.AREA_URL)
+            added = await store.refresh_async(getter, jma.AreaIndex(area), args.office)
+            # level は WARNING なので log には出ない。検索結果と混ざらないように stderr
+            print(f'{len(added)} new, {len(store)} bulletins', file=sys.stderr)
+        if args.search:
+            since = hours_ago(args.hours) if args.hours is not None else None
+            for bulletin in store.search(args.search, since=since, offices=args.office):
+                print(f'{bulletin.report_datetime} {bulletin.office} {bulletin.target_area}: {bulletin.headline}')
+
+    try:
+        loop.run_until_complete(run_async())
+    finally:
+        store.close()
+        close_loop(loop, getter, sinks)
+
+
+def export(args: argparse.Namespace):
+    from .http_getter import HttpGetter
+    from .cache_backend import create_backend
+    from .archive import Archive
+    from .json_stream import fast_loads
+    from . import export
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    backend = create_backend(args.cache, args.backend)
+    sinks = create_metrics(args, loop)
+    getter = HttpGetter(loop, args.cache, rate=args.rate, burst=args.burst,
+                        backend=backend, metrics=sinks.metrics if sinks else None)
+
+    async def get_table_async(url: str):
+        # cache にあれば古くてもそれを使う。無いときだけ取得する
+        entry = backend.get(url)
+        if entry:
+            return fast_loads(entry[0])
+        return await getter.get_json_async(url)
+
+    async def get_mapping_async():
+        area = await get_table_async(jma.AREA_URL)
+        stable = await get_table_async(jma.AMEDAS_STALBE_URL)
+        return export.create_mapping(jma.StationTable.from_json(stable), jma.AreaIndex(area))
+
+    try:
+        mapping = loop.run_until_complete(get_mapping_async())
+        if args.archive:
+            with Archive(args.archive) as archive:
+                rows = export.export(export.iter_archive(archive), mapping, args.out, format=args.format,
+                                     workers=args.workers, chunk_rows=args.chunk_rows)
+        else:
+            rows = export.export(export.iter_cache(backend, args.kind or ['amedas', 'forecast']), mapping,
+                                 args.out, format=args.format, workers=args.workers, chunk_rows=args.chunk_rows)
+        for kind, count in rows.items():
+            logging.info('%s: %d rows => %s', kind, count, args.out / kind)
+    finally:
+        close_loop(loop, getter, sinks)
+
+
+def gui(args: argparse.Namespace):
+    from . import gui
+    gui.run(args.cache, args.backend)
 
 
 def main():
-    logging.basicConfig(level=logging.DEBUG)
-
-    from pydear.utils import glfw_app
-    app = glfw_app.GlfwApp('pyjma')
-
-    gui = Gui(app.loop, pathlib.Path('.') / 'cache')
-    from pydear.backends import impl_glfw
-    impl_glfw = impl_glfw.ImplGlfwInput(app.window)
-    while app.clear():
-        impl_glfw.process_inputs()
-        gui.render()
-    del gui
+    parser = argparse.ArgumentParser(prog='jma')
+    parser.add_argument('--cache', type=pathlib.Path,
+                        default=pathlib.Path('.') / 'cache')
+    parser.add_argument('--backend', choices=['file', 'sqlite'], default='file',
+                        help='sqlite: compressed, deduplicated single file cache')
+    parser.add_argument('--metrics-file', type=pathlib.Path,
+                        help='write fetch/cache metrics in prometheus text format')
+    parser.add_argument('--metrics-port', type=int,
+                        help='serve prometheus metrics on localhost:PORT/metrics')
+    parser.add_argument('--rate', type=float, default=5.0,
+                        help='requests per second per host')
+    parser.add_argument('--burst', type=float, default=10.0,
+                        help='requests allowed at once before --rate applies')
+    parser.set_defaults(func=gui, level=logging.DEBUG)
+    subparsers = parser.add_subparsers()
+
+    parser_gui = subparsers.add_parser('gui', help='viewer (default)')
+    parser_gui.set_defaults(func=gui)
+
+    parser_backfill = subparsers.add_parser(
+        'backfill', help='archive amedas maps in the targetTimes range')
+    parser_backfill.add_argument('--archive', type=pathlib.Path,
+                                 default=pathlib.Path('.') / 'archive' / 'amedas.jmaa')
+    parser_backfill.add_argument('--start', help=jma.DATE_FORMAT.replace('%', '%%'))
+    parser_backfill.add_argument('--end', help=jma.DATE_FORMAT.replace('%', '%%'))
+    parser_backfill.add_argument('--concurrency', type=int, default=4)
+    parser_backfill.add_argument('--repeat', type=float,
+                                 help='seconds. keep capturing the rolling window')
+    parser_backfill.set_defaults(func=backfill, level=logging.INFO)
+
+    parser_poll = subparsers.add_parser(
+        'poll', help='poll endpoints and emit changes as newline delimited json')
+    parser_poll.add_argument('--office', action='append',
+                             help='office key. default: all offices')
+    parser_poll.add_argument('--port', type=int,
+                             help='serve events on localhost:PORT instead of stdout')
+    parser_poll.add_argument('--thresholds', action='store_true',
+                             help='amedas: only emit threshold crossings and observed element changes')
+    parser_poll.set_defaults(func=poll, level=logging.WARNING)
+
+    parser_overview = subparsers.add_parser(
+        'overview', help='archive overview bulletins of all offices and search them')
+    parser_overview.add_argument('--archive', type=pathlib.Path,
+                                 default=pathlib.Path('.') / 'archive' / 'overview')
+    parser_overview.add_argument('--office', action='append',
+                                 help='office key. default: all offices')
+    parser_overview.add_argument('--search', help='text to search. e.g. 大雪')
+    parser_overview.add_argument('--hours', type=float, help='only bulletins in the last HOURS')
+    parser_overview.add_argument('--offline', action='store_true',
+                                 help='search the archive without fetching')
+    parser_overview.set_defaults(func=overview, level=logging.WARNING)
+
+    parser_export = subparsers.add_parser(
+        'export', help='convert cached or archived json to partitioned columnar files')
+    parser_export.add_argument('--archive', type=pathlib.Path,
+                               help='export an amedas archive instead of the cache')
+    parser_export.add_argument('--kind', action='append', choices=['amedas', 'forecast'],
+                               help='cache entries to export. default: all')
+    parser_export.add_argument('--out', type=pathlib.Path, default=pathlib.Path('.') / 'export')
+    parser_export.add_argument('--format', choices=['auto', 'parquet', 'arrow', 'npz'], default='auto',
+                               help='auto: parquet if pyarrow is installed, otherwise npz')
+    parser_export.add_argument('--workers', type=int, help='processes. default: cpu count')
+    parser_export.add_argument('--chunk-rows', type=int, default=250_000,
+                               help='rows per output file')
+    parser_export.set_defaults(func=export, level=logging.INFO)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=args.level)
+    args.func(args)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,196 @@
+'''
+amedas/data/map/{time}.json を station x time x element の配列に詰める。
+
+map の中身は
+
+{"11001": {"temp": [1.2, 0], "precipitation10m": [0.0, 0], ...}, ...}
+
+で、値の 2 番目が品質 flag(0 が正常)。
+'''
+from typing import List, Dict, Optional, Sequence, Tuple
+import datetime
+import numpy as np
+from .area_index import AreaIndex
+from .stations import StationTable
+from .station_index import map_to_areas
+
+ELEMENTS = [
+    'temp',
+    'humidity',
+    'pressure',
+    'normalPressure',
+    'visibility',
+    'sun10m',
+    'sun1h',
+    'precipitation10m',
+    'precipitation1h',
+    'precipitation3h',
+    'precipitation24h',
+    'windDirection',
+    'wind',
+    'snow',
+    'snow1h',
+    'snow6h',
+    'snow12h',
+    'snow24h',
+]
+
+# 値が無い
+QUALITY_MISSING = -1
+QUALITY_OK = 0
+
+
+class AmedasStore:
+    '''
+    max_times を指定すると、それを超えたときに古い time から捨てる
+    '''
+
+    def __init__(self, stations: StationTable, elements: Sequence[str] = ELEMENTS, *,
+                 capacity: int = 144, max_times: Optional[int] = None) -> None:
+        self.stations = stations
+        self.max_times = max_times
+        self.elements = list(elements)
+        self.element_map = {name: i for i, name in enumerate(self.elements)}
+        self.times: List[datetime.datetime] = []
+        self.time_map: Dict[datetime.datetime, int] = {}
+        shape = (len(stations), capacity, len(self.elements))
+        self._values = np.full(shape, np.nan, dtype=np.float32)
+        self._quality = np.full(shape, QUALITY_MISSING, dtype=np.int8)
+        self._times64 = np.empty(capacity, dtype='datetime64[m]')
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._values[:, :len(self.times)]
+
+    @property
+    def quality(self) -> np.ndarray:
+        return self._quality[:, :len(self.times)]
+
+    @property
+    def times64(self) -> np.ndarray:
+        return self._times64[:len(self.times)]
+
+    def _grow(self):
+        capacity = self._values.shape[1] * 2
+        values = np.full((len(self.stations), capacity, len(self.elements)), np.nan, dtype=np.float32)
+        quality = np.full(values.shape, QUALITY_MISSING, dtype=np.int8)
+        times64 = np.empty(capacity, dtype='datetime64[m]')
+        n = len(self.times)
+        values[:, :n] = self._values[:, :n]
+        quality[:, :n] = self._quality[:, :n]
+        times64[:n] = self._times64[:n]
+        self._values, self._quality, self._times64 = values, quality, times64
+
+    def _evict(self, count: int):
+        '''
+        古い順に count 個の time を捨てて前に詰める
+        '''
+        n = len(self.times)
+        keep = np.sort(np.argsort(self._times64[:n], kind='stable')[count:])
+        k = len(keep)
+        self._values[:, :k] = self._values[:, keep]
+        self._quality[:, :k] = self._quality[:, keep]
+        self._times64[:k] = self._times64[keep]
+        self._values[:, k:n] = np.nan
+        self._quality[:, k:n] = QUALITY_MISSING
+        self.times = [self.times[i] for i in keep]
+        self.time_map = {time: i for i, time in enumerate(self.times)}
+
+    def _time_index(self, time: datetime.datetime) -> int:
+        ti = self.time_map.get(time)
+        if ti is None:
+            if self.max_times and len(self.times) >= self.max_times:
+                self._evict(len(self.times) - self.max_times + 1)
+            ti = len(self.times)
+            if ti >= self._values.shape[1]:
+                self._grow()
+            self.times.append(time)
+            self.time_map[time] = ti
+            self._times64[ti] = np.datetime64(time, 'm')
+        return ti
+
+    def add(self, time: datetime.datetime, data: dict):
+        ti = self._time_index(time)
+        values = self._values[:, ti]
+        quality = self._quality[:, ti]
+        index_of = self.stations.index_of
+        element_map = self.element_map
+        for code, elems in data.items():
+            si = index_of(code)
+            if si is None:
+                continue
+            for name, pair in elems.items():
+                ei = element_map.get(name)
+                if ei is None or not isinstance(pair, list):
+                    continue
+                value, flag = pair
+                if value is None:
+                    continue
+                values[si, ei] = value
+                quality[si, ei] = flag
+
+    def column(self, element: str, *, strict=True) -> np.ndarray:
+        '''
+        station x time。strict なら品質 flag が 0 以外を NaN にする
+        '''
+        ei = self.element_map[element]
+        values = self.values[:, :, ei]
+        if strict:
+            values = np.where(self.quality[:, :, ei] == QUALITY_OK, values, np.nan)
+        return values
+
+    def time_range(self, end: datetime.datetime, hours: float) -> np.ndarray:
+        '''
+        (end - hours, end] に入る time の mask
+        '''
+        end64 = np.datetime64(end, 'm')
+        start64 = end64 - np.timedelta64(int(hours * 60), 'm')
+        times = self.times64
+        return (times > start64) & (times <= end64)
+
+    def totals(self, element: str, end: datetime.datetime, hours: float) -> np.ndarray:
+        '''
+        station 毎の合計。precipitation10m を N 時間分足すなど
+        '''
+        values = self.column(element)[:, self.time_range(end, hours)]
+        return np.nansum(values, axis=1)
+
+    def group_max(self, element: str, time: datetime.datetime, groups: np.ndarray, group_count: int) -> np.ndarray:
+        '''
+        groups[station index] => group id 毎の最大値。値が無ければ NaN
+        '''
+        values = self.column(element)[:, self.time_map[time]]
+        result = np.full(group_count, -np.inf, dtype=np.float32)
+        valid = ~np.isnan(values) & (groups >= 0)
+        np.maximum.at(result, groups[valid], values[valid])
+        result[np.isinf(result)] = np.nan
+        return result
+
+    def office_groups(self, area_index: AreaIndex) -> Tuple[np.ndarray, List[str]]:
+        '''
+        府県予報区(office)毎に group 分けする。(groups, office code)。
+        station code の上 2 桁は府県と一致しない(北海道は複数に分かれる)ので、
+        map_to_areas の office を使う。office の分からない station は -1
+        '''
+        _, offices = map_to_areas(self.stations, area_index)
+        keys = sorted({office.key for office in offices if office})
+        key_map = {key: i for i, key in enumerate(keys)}
+        groups = np.array([key_map[office.key] if office else -1 for office in offices], dtype=np.int32)
+        return groups, keys
+
+    def ranking(self, element: str, time: datetime.datetime, n: int = 10, *, descending=True) -> List[Tuple[int, float]]:
+        '''
+        (station index, value) の上位 n 件
+        '''
+        values = self.column(element)[:, self.time_map[time]]
+        valid = np.flatnonzero(~np.isnan(values))
+        keys = -values[valid] if descending else values[valid]
+        if n < len(valid):
+            top = np.argpartition(keys, n)[:n]
+        else:
+            top = np.arange(len(valid))
+        top = top[np.argsort(keys[top], kind='stable')]
+        return [(int(valid[i]), float(values[valid[i]])) for i in top]
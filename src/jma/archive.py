@@ -0,0 +1,118 @@
+'''
+time 毎の JSON を追記していく archive。
+
+file の先頭に MAGIC、以降は record の繰り返し
+
+* header: time(yyyymmddHHMMSS を整数にしたもの int64), 圧縮後の byte 数, 元の byte 数
+* body: zlib で圧縮した JSON
+
+書き込み途中で落ちて末尾の record が壊れていたら、開くときに切り詰める。
+'''
+from typing import Dict, Iterator, Optional, Tuple
+import datetime
+import logging
+import pathlib
+import struct
+import zlib
+import numpy as np
+from . import DATE_FORMAT, to_datetime
+from .timeaxis import parse_compact
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'JMAA0001'
+RECORD = struct.Struct('<qII')
+
+
+def to_key(time: datetime.datetime) -> int:
+    return int(time.strftime(DATE_FORMAT))
+
+
+class Archive:
+    def __init__(self, path: pathlib.Path, *, level: int = 6) -> None:
+        self.path = path
+        self.level = level
+        # key => (body の offset, 圧縮後の byte 数)
+        self.index: Dict[int, Tuple[int, int]] = {}
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if not path.exists() or path.stat().st_size == 0:
+            path.write_bytes(MAGIC)
+        self._scan()
+        self.f = open(path, 'r+b')
+        self.f.seek(0, 2)
+
+    def _scan(self):
+        file_size = self.path.stat().st_size
+        with open(self.path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{self.path}: not an archive')
+            good = f.tell()
+            while True:
+                header = f.read(RECORD.size)
+                if len(header) < RECORD.size:
+                    break
+                key, size, _ = RECORD.unpack(header)
+                offset = f.tell()
+                f.seek(size, 1)
+                if f.tell() > file_size:
+                    break
+                self.index[key] = (offset, size)
+                good = f.tell()
+        if good < file_size:
+            logger.warning(f'{self.path}: truncate broken record at {good}')
+            with open(self.path, 'r+b') as f:
+                f.truncate(good)
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self) -> 'Archive':
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, time: datetime.datetime) -> bool:
+        return to_key(time) in self.index
+
+    def append(self, time: datetime.datetime, data: bytes):
+        key = to_key(time)
+        if key in self.index:
+            return
+        compressed = zlib.compress(data, self.level)
+        self.f.write(RECORD.pack(key, len(compressed), len(data)))
+        offset = self.f.tell()
+        self.f.write(compressed)
+        self.f.flush()
+        self.index[key] = (offset, len(compressed))
+
+    def read(self, time: datetime.datetime) -> Optional[bytes]:
+        item = self.index.get(to_key(time))
+        if not item:
+            return None
+        return self._read(*item)
+
+    def _read(self, offset: int, size: int) -> bytes:
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return zlib.decompress(f.read(size))
+
+    def times(self) -> Iterator[datetime.datetime]:
+        for key in sorted(self.index):
+            yield to_datetime(str(key))
+
+    def times64(self) -> np.ndarray:
+        '''
+        昇順の datetime64[s]
+        '''
+        return parse_compact(np.sort(np.fromiter(self.index, dtype=np.int64, count=len(self.index))))
+
+    def items(self) -> Iterator[Tuple[datetime.datetime, bytes]]:
+        with open(self.path, 'rb') as f:
+            for key in sorted(self.index):
+                offset, size = self.index[key]
+                f.seek(offset)
+                yield to_datetime(str(key)), zlib.decompress(f.read(size))
@@ -0,0 +1,151 @@
+from typing import List, Dict, Optional, Iterable, Iterator
+import array
+
+# area.json の階層。上から順
+LEVELS = ['centers', 'offices', 'class10s', 'class15s', 'class20s']
+
+
+class AreaNode:
+    __slots__ = ('key', 'name', 'children', 'parent', 'level', 'index')
+
+    def __init__(self, key, name, level=0) -> None:
+        self.key = key
+        self.name = name
+        self.children: List[AreaNode] = []
+        self.parent: Optional[AreaNode] = None
+        self.level = level
+        # AreaIndex.nodes 内の位置(先行順)
+        self.index = -1
+
+    def __repr__(self) -> str:
+        return f'AreaNode({LEVELS[self.level]}:{self.key}:{self.name})'
+
+
+class AreaIndex:
+    '''
+    area.json から一度だけ作る索引。
+
+    office の key と class10 の key は重複することがある(011000 宗谷地方 など)ので、
+    key 引きは level 毎の dict を持つ。
+
+    nodes は先行順(euler tour)に並んでいて、
+    node の子孫は nodes[node.index + 1: end[node.index]] になる。
+    '''
+
+    def __init__(self, area: dict) -> None:
+        self.level_maps: List[Dict[str, AreaNode]] = []
+        for level, level_name in enumerate(LEVELS):
+            self.level_maps.append({k: AreaNode(k, v['name'], level)
+                                   for k, v in area.get(level_name, {}).items()})
+
+        # link
+        for level, level_name in enumerate(LEVELS[:-1]):
+            child_map = self.level_maps[level + 1]
+            for k, v in area.get(level_name, {}).items():
+                node = self.level_maps[level][k]
+                for child_key in v.get('children', []):
+                    child = child_map.get(child_key)
+                    if child:
+                        child.parent = node
+                        node.children.append(child)
+
+        self._build(list(self.level_maps[0].values()))
+
+    @classmethod
+    def from_nodes(cls, nodes: List[AreaNode]) -> 'AreaIndex':
+        '''
+        parent, children が link 済みの node から作る(snapshot からの復元用)
+        '''
+        index = cls.__new__(cls)
+        index.level_maps = [{} for _ in LEVELS]
+        for node in nodes:
+            index.level_maps[node.level][node.key] = node
+        index._build([node for node in nodes if not node.parent])
+        return index
+
+    def _build(self, roots: List[AreaNode]):
+        self.roots = roots
+
+        # 先行順に並べる
+        self.nodes: List[AreaNode] = []
+        self.end = array.array('i')
+
+        def traverse(node: AreaNode):
+            node.index = len(self.nodes)
+            self.nodes.append(node)
+            self.end.append(0)
+            for child in node.children:
+                traverse(child)
+            self.end[node.index] = len(self.nodes)
+        for root in self.roots:
+            traverse(root)
+
+        self.name_map: Dict[str, List[AreaNode]] = {}
+        for node in self.nodes:
+            self.name_map.setdefault(node.name, []).append(node)
+
+        # node.index => 所属する office / center の index
+        self.office = array.array('i', [-1]) * len(self.nodes)
+        self.center = array.array('i', [-1]) * len(self.nodes)
+        for root in self.roots:
+            for i in range(root.index, self.end[root.index]):
+                self.center[i] = root.index
+            for office in root.children:
+                for i in range(office.index, self.end[office.index]):
+                    self.office[i] = office.index
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def get(self, key: str, level: Optional[str] = None) -> Optional[AreaNode]:
+        '''
+        level を省略したときは下の level から探す。
+        予報・警報の code は class10, class20 なので、この順が都合が良い。
+        '''
+        if level:
+            return self.level_maps[LEVELS.index(level)].get(key)
+        for level_map in reversed(self.level_maps):
+            node = level_map.get(key)
+            if node:
+                return node
+        return None
+
+    def find_by_name(self, name: str) -> List[AreaNode]:
+        return self.name_map.get(name, [])
+
+    def ancestors(self, node: AreaNode) -> List[AreaNode]:
+        '''
+        center から node の親まで
+        '''
+        path = []
+        parent = node.parent
+        while parent:
+            path.append(parent)
+            parent = parent.parent
+        path.reverse()
+        return path
+
+    def descendants(self, node: AreaNode) -> List[AreaNode]:
+        return self.nodes[node.index + 1:self.end[node.index]]
+
+    def contains(self, ancestor: AreaNode, node: AreaNode) -> bool:
+        return ancestor.index < node.index < self.end[ancestor.index]
+
+    def office_of(self, node: AreaNode) -> Optional[AreaNode]:
+        if node.index < 0:
+            # center に繋がっていない
+            return None
+        i = self.office[node.index]
+        return self.nodes[i] if i >= 0 else None
+
+    def center_of(self, node: AreaNode) -> Optional[AreaNode]:
+        if node.index < 0:
+            # center に繋がっていない
+            return None
+        i = self.center[node.index]
+        return self.nodes[i] if i >= 0 else None
+
+    def resolve_offices(self, keys: Iterable[str], level: Optional[str] = None) -> Iterator[Optional[AreaNode]]:
+        for key in keys:
+            node = self.get(key, level)
+            yield self.office_of(node) if node else None
@@ -0,0 +1,92 @@
+'''
+area tree の表示用に、開いている node だけを 1 列に並べた行を作っておく。
+開閉か filter が変わったときだけ作り直すので、描画は見えている行だけで済む。
+'''
+from typing import List, NamedTuple, Optional, Set, Tuple
+from .area_index import AreaIndex, AreaNode
+
+
+class AreaRow(NamedTuple):
+    node: AreaNode
+    depth: int
+    # center から node まで
+    path: Tuple[AreaNode, ...]
+    expanded: bool
+
+
+class AreaTreeView:
+    def __init__(self, index: AreaIndex) -> None:
+        self.index = index
+        # node.index
+        self.expanded: Set[int] = set()
+        self.filter = ''
+        # filter に一致した node.index。None は filter 無し
+        self.matched: Optional[List[int]] = None
+        self.rows: List[AreaRow] = []
+        self.dirty = True
+
+    def is_expanded(self, node: AreaNode) -> bool:
+        return node.index in self.expanded
+
+    def toggle(self, node: AreaNode):
+        if node.index in self.expanded:
+            self.expanded.remove(node.index)
+        else:
+            self.expanded.add(node.index)
+        self.dirty = True
+
+    def set_filter(self, text: str):
+        if text == self.filter:
+            return
+        nodes = self.index.nodes
+        if not text:
+            self.matched = None
+        elif self.matched is not None and self.filter and text.startswith(self.filter):
+            # 文字を足しただけなら前回の一致から絞る
+            self.matched = [i for i in self.matched if text in nodes[i].name]
+        else:
+            self.matched = [i for i, node in enumerate(nodes) if text in node.name]
+        self.filter = text
+        self.dirty = True
+
+    def get_rows(self) -> List[AreaRow]:
+        if self.dirty:
+            self.rows = self._build()
+            self.dirty = False
+        return self.rows
+
+    def _build(self) -> List[AreaRow]:
+        rows: List[AreaRow] = []
+        nodes = self.index.nodes
+        end = self.index.end
+
+        if self.matched is None:
+            # 先行順に辿って、閉じている node の子孫は飛ばす
+            stack: List[AreaNode] = []
+            i = 0
+            while i < len(nodes):
+                node = nodes[i]
+                while stack and not self.index.contains(stack[-1], node):
+                    stack.pop()
+                expanded = node.index in self.expanded
+                path = tuple(stack) + (node,)
+                rows.append(AreaRow(node, len(stack), path, expanded))
+                if expanded:
+                    stack.append(node)
+                    i += 1
+                else:
+                    i = end[i]
+            return rows
+
+        # 一致した node とその祖先を全部開いて表示する
+        visible: Set[int] = set()
+        for i in self.matched:
+            visible.add(i)
+            for ancestor in self.index.ancestors(nodes[i]):
+                visible.add(ancestor.index)
+        for i in sorted(visible):
+            node = nodes[i]
+            path = tuple(self.index.ancestors(node)) + (node,)
+            expanded = any(child.index in visible for child in node.children)
+            rows.append(AreaRow(node, len(path) - 1, path, expanded))
+        return rows
@@ -0,0 +1,86 @@
+'''
+ひまわりの targetTimes の範囲(3日くらい)の amedas map をまとめて取得して archive に追記する。
+'''
+from typing import Callable, Iterator, List, Optional
+import asyncio
+import datetime
+import logging
+import numpy as np
+import jma
+from . import timeaxis
+from .archive import Archive
+from .http_getter import HttpGetter
+
+logger = logging.getLogger(__name__)
+
+AMEDAS_INTERVAL = datetime.timedelta(minutes=10)
+# ひまわりの時刻は UTC、amedas は JST
+JST_OFFSET = datetime.timedelta(hours=9)
+
+
+def enumerate_times(start: datetime.datetime, end: datetime.datetime,
+                    interval: datetime.timedelta = AMEDAS_INTERVAL) -> Iterator[datetime.datetime]:
+    '''
+    start を interval に切り上げて end まで
+    '''
+    minutes = int(interval.total_seconds() // 60)
+    start = start.replace(second=0, microsecond=0)
+    if start.minute % minutes:
+        start += datetime.timedelta(minutes=minutes - start.minute % minutes)
+    while start <= end:
+        yield start
+        start += interval
+
+
+async def get_time_range_async(getter: HttpGetter):
+    '''
+    targetTimes_fd.json の範囲を JST で
+    '''
+    times = await getter.get_json_async(jma.HIMAWARI_TIMES_URL)
+    validtimes = timeaxis.parse_compact([t['validtime'] for t in times]) + np.timedelta64(JST_OFFSET)
+    return validtimes.min().item(), validtimes.max().item()
+
+
+async def backfill_async(getter: HttpGetter, archive: Archive, times: List[datetime.datetime], *,
+                         progress: Optional[Callable[[int, int], None]] = None) -> int:
+    '''
+    archive に無い time を並列に取得する。
+    失敗したものは次回に取り直すので、途中で止めても再開できる。
+    map は archive にだけ入れて disk cache には書かない。
+    '''
+    pending = [time for time in times if time not in archive]
+    done = 0
+
+    async def fetch_async(time: datetime.datetime):
+        nonlocal done
+        url = jma.AMEDAS_MAP_URL % {'time': time.strftime(jma.DATE_FORMAT)}
+        try:
+            data = await getter.get_async(url, store=False)
+        except Exception as ex:
+            logger.warning('%s: %s', time, ex)
+            return
+        archive.append(time, data)
+        done += 1
+        if progress:
+            progress(done, len(pending))
+
+    await asyncio.gather(*(fetch_async(time) for time in pending))
+    return done
+
+
+async def run_async(getter: HttpGetter, archive: Archive, *,
+                    start: Optional[datetime.datetime] = None, end: Optional[datetime.datetime] = None,
+                    repeat: Optional[float] = None):
+    def progress(done: int, total: int):
+        logger.info('%d/%d', done, total)
+
+    while True:
+        range_start, range_end = await get_time_range_async(getter)
+        times = list(enumerate_times(start or range_start, end or range_end))
+        done = await backfill_async(getter, archive, times, progress=progress)
+        logger.info('%d fetched, %d in %s. %s', done, len(archive), archive.path, getter.stats)
+        if not repeat:
+            break
+        await asyncio.sleep(repeat)
+        # targetTimes を取り直す
+        await getter.get_json_async(jma.HIMAWARI_TIMES_URL, use_cache=False)
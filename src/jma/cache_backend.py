@@ -0,0 +1,401 @@
+'''
+HttpGetter の disk cache。
+
+* FileCacheBackend: cache/{host}{path} に 1 url 1 file(従来の layout)。
+  query があれば file 名に @{query の sha256} を付ける
+* SqliteCacheBackend: 1 file の sqlite に圧縮して格納する。
+  body は内容の sha256 で共有するので、同じ payload は 1 つしか持たない。
+  max_bytes を超えたら最後に使われたのが古い url から消す。
+  stream で書くときは chunk 毎に圧縮するので、memory に持つのは圧縮後の body だけ。
+'''
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+import abc
+import hashlib
+import logging
+import pathlib
+import sqlite3
+import threading
+import time
+import urllib.parse
+import zlib
+from .cache_policy import CacheMeta, load_meta, save_meta
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class CacheWriter:
+    '''
+    chunk 毎に書き込む。既定の実装は memory に溜めて commit で put する
+    '''
+
+    def __init__(self, backend: 'CacheBackend', url: str) -> None:
+        self.backend = backend
+        self.url = url
+        self.hash = hashlib.sha256()
+        self.size = 0
+        self.chunks: List[bytes] = []
+
+    def write(self, chunk: bytes):
+        self.hash.update(chunk)
+        self.size += len(chunk)
+        self._write(chunk)
+
+    def _write(self, chunk: bytes):
+        self.chunks.append(chunk)
+
+    def commit(self, meta: CacheMeta):
+        self.backend.put(self.url, b''.join(self.chunks), meta)
+
+    def abort(self):
+        self.chunks.clear()
+
+
+class CacheBackend(abc.ABC):
+    @abc.abstractmethod
+    def get(self, url: str) -> Optional[Tuple[bytes, CacheMeta]]:
+        ...
+
+    @abc.abstractmethod
+    def get_meta(self, url: str) -> Optional[CacheMeta]:
+        ...
+
+    @abc.abstractmethod
+    def get_version(self, url: str) -> Optional[Hashable]:
+        '''
+        body が変わったら変わる値。304 では変わらない
+        '''
+
+    @abc.abstractmethod
+    def put(self, url: str, data: bytes, meta: CacheMeta):
+        ...
+
+    @abc.abstractmethod
+    def refresh(self, url: str, meta: CacheMeta) -> Optional[bytes]:
+        '''
+        304 Not Modified。meta を更新して保存済みの body を返す。
+        その間に消えていたら None
+        '''
+
+    @abc.abstractmethod
+    def urls(self) -> Iterator[str]:
+        ...
+
+    def open_writer(self, url: str) -> CacheWriter:
+        return CacheWriter(self, url)
+
+    def close(self):
+        pass
+
+
+class FileCacheWriter(CacheWriter):
+    '''
+    tmp に書いて commit で置き換える
+    '''
+
+    def __init__(self, backend: 'FileCacheBackend', url: str) -> None:
+        super().__init__(backend, url)
+        self.path = backend.get_path(url)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.tmp = self.path.with_name(self.path.name + '.tmp')
+        self.f = open(self.tmp, 'wb')
+
+    def _write(self, chunk: bytes):
+        self.f.write(chunk)
+
+    def commit(self, meta: CacheMeta):
+        self.f.close()
+        logger.debug('save %s ...', self.path)
+        self.tmp.replace(self.path)
+        save_meta(self.path, meta)
+
+    def abort(self):
+        self.f.close()
+        self.tmp.unlink(missing_ok=True)
+
+
+class FileCacheBackend(CacheBackend):
+    def __init__(self, cache_dir: pathlib.Path) -> None:
+        self.cache_dir = cache_dir
+
+    def get_path(self, url: str) -> pathlib.Path:
+        parsed = urllib.parse.urlparse(url)
+        path = self.cache_dir / f'{parsed.hostname}{parsed.path}'
+        if parsed.query:
+            # query だけ違う url を別の file にする
+            digest = hashlib.sha256(parsed.query.encode('utf-8')).hexdigest()[:16]
+            path = path.with_name(f'{path.name}@{digest}')
+        return path
+
+    def _load_meta(self, path: pathlib.Path) -> Optional[CacheMeta]:
+        # meta の無い古い file は mtime を取得時刻とみなす
+        try:
+            return load_meta(path) or CacheMeta(path.stat().st_mtime)
+        except FileNotFoundError:
+            return None
+
+    def get(self, url: str) -> Optional[Tuple[bytes, CacheMeta]]:
+        path = self.get_path(url)
+        meta = self._load_meta(path)
+        if not meta:
+            return None
+        try:
+            return path.read_bytes(), meta
+        except FileNotFoundError:
+            return None
+
+    def get_meta(self, url: str) -> Optional[CacheMeta]:
+        return self._load_meta(self.get_path(url))
+
+    def get_version(self, url: str) -> Optional[Hashable]:
+        # (mtime, size)
+        try:
+            st = self.get_path(url).stat()
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def put(self, url: str, data: bytes, meta: CacheMeta):
+        path = self.get_path(url)
+        logger.debug('save %s ...', path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 書きかけの file が残らないように
+        tmp = path.with_name(path.name + '.tmp')
+        tmp.write_bytes(data)
+        tmp.replace(path)
+        save_meta(path, meta)
+
+    def refresh(self, url: str, meta: CacheMeta) -> Optional[bytes]:
+        path = self.get_path(url)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        save_meta(path, meta)
+        return data
+
+    def open_writer(self, url: str) -> CacheWriter:
+        return FileCacheWriter(self, url)
+
+    def urls(self) -> Iterator[str]:
+        # url は {host}/{path} に置く。
+        # cache_dir 直下の file(snapshot.bin, glyphs.txt など)は url ではない。
+        # query 付きの url は file 名から戻せないので返さない
+        if not self.cache_dir.exists():
+            return
+        for host_dir in self.cache_dir.iterdir():
+            if not host_dir.is_dir():
+                continue
+            for path in host_dir.glob('**/*'):
+                if not path.is_file() or path.suffix in ('.meta', '.tmp') or '@' in path.name:
+                    continue
+                yield f'https://{path.relative_to(self.cache_dir).as_posix()}'
+
+
+CODEC_ZLIB = 'zlib'
+CODEC_ZSTD = 'zstd'
+
+
+def compress(data: bytes) -> Tuple[str, bytes]:
+    if zstandard:
+        return CODEC_ZSTD, zstandard.ZstdCompressor(level=10).compress(data)
+    return CODEC_ZLIB, zlib.compress(data, 6)
+
+
+def compressobj() -> Tuple[str, Any]:
+    if zstandard:
+        return CODEC_ZSTD, zstandard.ZstdCompressor(level=10).compressobj()
+    return CODEC_ZLIB, zlib.compressobj(6)
+
+
+def decompress(codec: str, data: bytes) -> bytes:
+    match codec:
+        case 'zstd':
+            if not zstandard:
+                raise RuntimeError('zstandard is required')
+            # compressobj の frame には content size が無い
+            return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+        case 'zlib':
+            return zlib.decompress(data)
+        case _:
+            raise ValueError(codec)
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS blobs (
+    hash BLOB PRIMARY KEY,
+    codec TEXT NOT NULL,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    stored_size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    url TEXT PRIMARY KEY,
+    hash BLOB NOT NULL REFERENCES blobs(hash),
+    fetched REAL NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed);
+CREATE INDEX IF NOT EXISTS entries_hash ON entries(hash);
+'''
+
+# get の度に UPDATE しないで、accessed はこの件数溜めてまとめて書く
+TOUCH_BATCH = 256
+
+
+class SqliteCacheWriter(CacheWriter):
+    '''
+    chunk 毎に圧縮して溜める。同じ body が既にあれば commit で捨てる
+    '''
+
+    def __init__(self, backend: 'SqliteCacheBackend', url: str) -> None:
+        super().__init__(backend, url)
+        self.sqlite = backend
+        self.codec, self.compressor = compressobj()
+
+    def _write(self, chunk: bytes):
+        self.chunks.append(self.compressor.compress(chunk))
+
+    def commit(self, meta: CacheMeta):
+        self.chunks.append(self.compressor.flush())
+        self.sqlite.put_blob(self.url, self.hash.digest(), self.size, meta,
+                              lambda: (self.codec, b''.join(self.chunks)))
+
+
+class SqliteCacheBackend(CacheBackend):
+    def __init__(self, path: pathlib.Path, *, max_bytes: int = 1024 * 1024 * 1024) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # executor の thread から呼ばれる
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(SCHEMA)
+        self.stored_bytes = self.db.execute(
+            'SELECT COALESCE(SUM(stored_size), 0) FROM blobs').fetchone()[0]
+        # url => 書いていない accessed
+        self.touched: Dict[str, float] = {}
+
+    def close(self):
+        with self.lock:
+            self._flush_touched()
+            self.db.close()
+
+    def _flush_touched(self):
+        if not self.touched:
+            return
+        with self.db:
+            self.db.executemany('UPDATE entries SET accessed = ? WHERE url = ?',
+                                [(accessed, url) for url, accessed in self.touched.items()])
+        self.touched.clear()
+
+    def get(self, url: str) -> Optional[Tuple[bytes, CacheMeta]]:
+        with self.lock:
+            row = self.db.execute(
+                'SELECT blobs.codec, blobs.data, entries.fetched, entries.etag, entries.last_modified '
+                'FROM entries JOIN blobs ON entries.hash = blobs.hash WHERE entries.url = ?',
+                (url,)).fetchone()
+            if not row:
+                return None
+            self.touched[url] = time.time()
+            if len(self.touched) >= TOUCH_BATCH:
+                self._flush_touched()
+        codec, data, fetched, etag, last_modified = row
+        return decompress(codec, data), CacheMeta(fetched, etag, last_modified)
+
+    def get_meta(self, url: str) -> Optional[CacheMeta]:
+        with self.lock:
+            row = self.db.execute(
+                'SELECT fetched, etag, last_modified FROM entries WHERE url = ?', (url,)).fetchone()
+        return CacheMeta(*row) if row else None
+
+    def get_version(self, url: str) -> Optional[Hashable]:
+        # content hash
+        with self.lock:
+            row = self.db.execute(
+                'SELECT hash FROM entries WHERE url = ?', (url,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, url: str, data: bytes, meta: CacheMeta):
+        self.put_blob(url, hashlib.sha256(data).digest(), len(data), meta, lambda: compress(data))
+
+    def open_writer(self, url: str) -> CacheWriter:
+        return SqliteCacheWriter(self, url)
+
+    def put_blob(self, url: str, digest: bytes, size: int, meta: CacheMeta,
+                 get_blob: Callable[[], Tuple[str, bytes]]):
+        '''
+        get_blob は同じ hash の blob が無いときだけ呼ぶ
+        '''
+        with self.lock:
+            exists = self.db.execute(
+                'SELECT 1 FROM blobs WHERE hash = ?', (digest,)).fetchone()
+            blob = None if exists else get_blob()
+            with self.db:
+                if blob:
+                    codec, stored = blob
+                    self.db.execute('INSERT INTO blobs VALUES (?, ?, ?, ?, ?)',
+                                    (digest, codec, stored, size, len(stored)))
+                    self.stored_bytes += len(stored)
+                old = self.db.execute(
+                    'SELECT hash FROM entries WHERE url = ?', (url,)).fetchone()
+                self.db.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)',
+                                (url, digest, meta.fetched, meta.etag, meta.last_modified, time.time()))
+                if old and old[0] != digest:
+                    self._delete_orphan(old[0])
+            self.touched.pop(url, None)
+            if self.stored_bytes > self.max_bytes:
+                self._evict()
+
+    def refresh(self, url: str, meta: CacheMeta) -> Optional[bytes]:
+        with self.lock, self.db:
+            self.db.execute('UPDATE entries SET fetched = ?, etag = ?, last_modified = ? WHERE url = ?',
+                            (meta.fetched, meta.etag, meta.last_modified, url))
+        entry = self.get(url)
+        return entry[0] if entry else None
+
+    def urls(self) -> Iterator[str]:
+        with self.lock:
+            rows = self.db.execute('SELECT url FROM entries').fetchall()
+        for url, in rows:
+            yield url
+
+    def _delete_orphan(self, digest: bytes):
+        if self.db.execute('SELECT 1 FROM entries WHERE hash = ? LIMIT 1', (digest,)).fetchone():
+            return
+        row = self.db.execute(
+            'SELECT stored_size FROM blobs WHERE hash = ?', (digest,)).fetchone()
+        if row:
+            self.db.execute('DELETE FROM blobs WHERE hash = ?', (digest,))
+            self.stored_bytes -= row[0]
+
+    def _evict(self):
+        # 最後に使われたのが古い順に max_bytes の 9 割まで消す
+        target = self.max_bytes * 0.9
+        self._flush_touched()
+        with self.db:
+            rows = self.db.execute(
+                'SELECT url, hash FROM entries ORDER BY accessed').fetchall()
+            for url, digest in rows:
+                if self.stored_bytes <= target:
+                    break
+                logger.debug('evict %s', url)
+                self.db.execute('DELETE FROM entries WHERE url = ?', (url,))
+                self._delete_orphan(digest)
+
+
+def create_backend(cache_dir: pathlib.Path, kind: str = 'file') -> CacheBackend:
+    match kind:
+        case 'file':
+            return FileCacheBackend(cache_dir)
+        case 'sqlite':
+            return SqliteCacheBackend(cache_dir / 'cache.sqlite3')
+        case _:
+            raise ValueError(kind)
@@ -0,0 +1,81 @@
+from typing import Optional, NamedTuple, List, Tuple, Dict
+import json
+import pathlib
+import re
+import time
+
+# url の pattern 毎の有効期間(秒)。None は期限なし
+DEFAULT_TTLS: List[Tuple[str, Optional[float]]] = [
+    (r'/common/const/area\.json$', 24 * 60 * 60),
+    (r'/amedas/const/amedastable\.json$', 24 * 60 * 60),
+    (r'/amedas/data/map/\d{14}\.json$', None),
+    (r'/amedas/data/latest_time\.txt$', 60),
+    (r'/himawari/data/satimg/targetTimes_fd\.json$', 60),
+    (r'/himawari/data/satimg/\d{14}/fd/\d{14}/.*\.jpg$', None),
+    (r'/forecast/data/(forecast|overview_forecast)/\d+\.json$', 10 * 60),
+]
+
+
+class CacheMeta(NamedTuple):
+    fetched: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    @staticmethod
+    def from_headers(headers) -> 'CacheMeta':
+        return CacheMeta(time.time(), headers.get('ETag'), headers.get('Last-Modified'))
+
+    def refreshed(self) -> 'CacheMeta':
+        return self._replace(fetched=time.time())
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+def get_meta_path(path: pathlib.Path) -> pathlib.Path:
+    return path.with_name(path.name + '.meta')
+
+
+def load_meta(path: pathlib.Path) -> Optional[CacheMeta]:
+    meta_path = get_meta_path(path)
+    if not meta_path.exists():
+        return None
+    try:
+        return CacheMeta(**json.loads(meta_path.read_bytes()))
+    except (ValueError, TypeError):
+        return None
+
+
+def save_meta(path: pathlib.Path, meta: CacheMeta):
+    get_meta_path(path).write_text(json.dumps(meta._asdict()))
+
+
+class CachePolicy:
+    def __init__(self, ttls: Optional[List[Tuple[str, Optional[float]]]] = None, *,
+                 default_ttl: Optional[float] = None) -> None:
+        if ttls is None:
+            ttls = DEFAULT_TTLS
+        self.ttls = [(re.compile(pattern), ttl) for pattern, ttl in ttls]
+        self.default_ttl = default_ttl
+
+    def get_ttl(self, url: str) -> Optional[float]:
+        for pattern, ttl in self.ttls:
+            if pattern.search(url):
+                return ttl
+        return self.default_ttl
+
+    def is_fresh(self, url: str, meta: Optional[CacheMeta]) -> bool:
+        '''
+        meta の無い古い cache は ttl が無ければ fresh とみなす。
+        '''
+        ttl = self.get_ttl(url)
+        if ttl is None:
+            return True
+        if not meta:
+            return False
+        return time.time() - meta.fetched < ttl
@@ -0,0 +1,323 @@
+'''
+cache や archive に溜めた JSON を columnar な file に書き出す。
+
+* amedas: amedas/data/map/{time}.json => (time, station) 1 行。element 毎に値と品質 flag の列
+* forecast: forecast/{office}.json => (報告時刻, area, 時刻, 要素) 1 行
+
+JSON の decode は process pool で並列にする。worker は数値の配列だけを返し、
+station code から office, class20 への対応は親 process で配列の take で付ける。
+出力は日付毎の directory に chunk_rows 行ずつ。pyarrow があれば Parquet か Arrow IPC、無ければ .npz。
+入力は時刻順なので、新しい日付が来たらそれより前の日付は書いてしまう。
+'''
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+import collections
+import concurrent.futures
+import datetime
+import logging
+import os
+import pathlib
+import re
+import numpy as np
+from . import DATE_FORMAT
+from .amedas import ELEMENTS, QUALITY_MISSING
+from .area_index import AreaIndex
+from .archive import Archive
+from .cache_backend import CacheBackend
+from .json_stream import fast_loads
+from .stations import StationTable
+from .station_index import map_to_areas
+from .timeaxis import parse_iso
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow', 'npz': '.npz'}
+
+# 1 file の行数。amedas の 1 日(約 1300 地点 x 144)が 1 file に入る
+CHUNK_ROWS = 250_000
+
+AMEDAS_MAP_PATTERN = re.compile(r'/amedas/data/map/(\d{14})\.json$')
+FORECAST_PATTERN = re.compile(r'/forecast/data/forecast/(\d{6})\.json$')
+
+Columns = Dict[str, np.ndarray]
+
+
+class Source(NamedTuple):
+    # amedas, forecast
+    kind: str
+    # amedas は yyyymmddHHMMSS、forecast は office
+    key: str
+    data: bytes
+
+
+class StationMapping(NamedTuple):
+    '''
+    worker に渡すので pickle できる値だけ
+    '''
+    codes: List[str]
+    offices: List[str]
+    class20s: List[str]
+    lat: List[float]
+    lon: List[float]
+    # office code => 名前
+    office_names: Dict[str, str]
+
+
+def create_mapping(stations: StationTable, area_index: AreaIndex) -> StationMapping:
+    class20s, offices = map_to_areas(stations, area_index)
+    return StationMapping(
+        list(stations.codes),
+        [office.key if office else '' for office in offices],
+        [class20.key if class20 else '' for class20 in class20s],
+        list(stations.lat), list(stations.lon),
+        {key: node.name for key, node in area_index.level_maps[1].items()})
+
+
+def iter_cache(backend: CacheBackend, kinds: Iterable[str]) -> Iterator[Source]:
+    patterns = {'amedas': AMEDAS_MAP_PATTERN, 'forecast': FORECAST_PATTERN}
+    patterns = {kind: patterns[kind] for kind in kinds}
+    for url in sorted(backend.urls()):
+        for kind, pattern in patterns.items():
+            m = pattern.search(url)
+            if not m:
+                continue
+            entry = backend.get(url)
+            if entry:
+                yield Source(kind, m.group(1), entry[0])
+            break
+
+
+def iter_archive(archive: Archive) -> Iterator[Source]:
+    for time, data in archive.items():
+        yield Source('amedas', time.strftime(DATE_FORMAT), data)
+
+
+#
+# worker process
+#
+_code_map: Dict[str, int] = {}
+
+
+def _init_worker(codes: List[str]):
+    global _code_map
+    _code_map = {code: i for i, code in enumerate(codes)}
+
+
+def decode_amedas(key: str, data: bytes) -> Tuple[str, Columns]:
+    time = np.datetime64(datetime.datetime.strptime(key, DATE_FORMAT), 's')
+    src = fast_loads(data)
+    element_map = {name: i for i, name in enumerate(ELEMENTS)}
+    rows = [(i, elems) for code, elems in src.items()
+            if (i := _code_map.get(code)) is not None]
+    values = np.full((len(rows), len(ELEMENTS)), np.nan, dtype=np.float32)
+    quality = np.full((len(rows), len(ELEMENTS)), QUALITY_MISSING, dtype=np.int8)
+    for row, (_, elems) in enumerate(rows):
+        for name, pair in elems.items():
+            ei = element_map.get(name)
+            if ei is None or not isinstance(pair, list) or pair[0] is None:
+                continue
+            values[row, ei] = pair[0]
+            quality[row, ei] = pair[1]
+    columns: Columns = {
+        'time': np.full(len(rows), time),
+        'station': np.array([i for i, _ in rows], dtype=np.int32),
+    }
+    for ei, name in enumerate(ELEMENTS):
+        columns[name] = values[:, ei]
+        columns[f'{name}_quality'] = quality[:, ei]
+    return f'{key[:4]}-{key[4:6]}-{key[6:8]}', columns
+
+
+def decode_forecast(key: str, data: bytes) -> Tuple[str, Columns]:
+    src = fast_loads(data)
+    rows = []
+    for report in src:
+        report_datetime = report['reportDatetime']
+        for series in report.get('timeSeries', []):
+            times = series['timeDefines']
+            for area in series['areas']:
+                code = area['area']['code']
+                name = area['area']['name']
+                for element, values in area.items():
+                    if element == 'area':
+                        continue
+                    for time, value in zip(times, values):
+                        rows.append((report_datetime, code, name, time, element, f'{value}'))
+    columns: Columns = {
+        'office': np.full(len(rows), key),
+    }
+    for i, column in enumerate(('report_datetime', 'area', 'area_name', 'time', 'element', 'value')):
+        columns[column] = np.array([row[i] for row in rows], dtype=str)
+    # 比べやすいように JST の datetime64 にする
+    columns['report_datetime'] = parse_iso(columns['report_datetime'])
+    columns['time'] = parse_iso(columns['time'])
+    partition = str(columns['report_datetime'][0].astype('datetime64[D]')) if rows else 'unknown'
+    return partition, columns
+
+
+DECODERS: Dict[str, Callable[[str, bytes], Tuple[str, Columns]]] = {
+    'amedas': decode_amedas,
+    'forecast': decode_forecast,
+}
+
+
+#
+# 出力
+#
+def resolve_format(format: str) -> str:
+    if format == 'auto':
+        return 'parquet' if pyarrow else 'npz'
+    if format in ('parquet', 'arrow') and not pyarrow:
+        raise RuntimeError(f'pyarrow is required for {format}')
+    if format not in EXTENSIONS:
+        raise ValueError(format)
+    return format
+
+
+def write_columns(path: pathlib.Path, columns: Columns, format: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    match format:
+        case 'parquet':
+            table = pyarrow.table({name: pyarrow.array(values) for name, values in columns.items()})
+            pyarrow.parquet.write_table(table, tmp, compression='zstd')
+        case 'arrow':
+            table = pyarrow.table({name: pyarrow.array(values) for name, values in columns.items()})
+            with pyarrow.ipc.new_file(str(tmp), table.schema) as writer:
+                writer.write_table(table)
+        case 'npz':
+            with open(tmp, 'wb') as f:
+                np.savez_compressed(f, **columns)
+    tmp.replace(path)
+
+
+class PartitionWriter:
+    '''
+    {out_dir}/{name}/date={partition}/part-00000.parquet
+
+    partition 毎に chunk_rows 行溜まったら書く。
+    それまでで一番新しい partition より新しいものが来たら、それより前の partition を書く。
+    全体で max_rows を超えたら全部書く
+    '''
+
+    def __init__(self, out_dir: pathlib.Path, name: str, format: str, *,
+                 chunk_rows: int = CHUNK_ROWS, max_rows: Optional[int] = None) -> None:
+        self.directory = out_dir / name
+        self.format = format
+        self.chunk_rows = chunk_rows
+        self.max_rows = max_rows or chunk_rows * 2
+        self.buffers: Dict[str, List[Columns]] = collections.defaultdict(list)
+        self.buffered: Dict[str, int] = collections.defaultdict(int)
+        self.parts: Dict[str, int] = collections.defaultdict(int)
+        self.rows = 0
+        self.files: List[pathlib.Path] = []
+        self.latest: Optional[str] = None
+
+    def add(self, partition: str, columns: Columns):
+        count = len(next(iter(columns.values()))) if columns else 0
+        if not count:
+            return
+        if self.latest is None or partition > self.latest:
+            # 前の partition にはもう来ない
+            for key in [key for key in self.buffers if key < partition]:
+                self.flush(key)
+            self.latest = partition
+        self.buffers[partition].append(columns)
+        self.buffered[partition] += count
+        if self.buffered[partition] >= self.chunk_rows:
+            self.flush(partition)
+        elif sum(self.buffered.values()) >= self.max_rows:
+            for key in list(self.buffers):
+                self.flush(key)
+
+    def flush(self, partition: str):
+        chunks = self.buffers.pop(partition, None)
+        count = self.buffered.pop(partition, 0)
+        if not chunks:
+            return
+        columns = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+        part = self.parts[partition]
+        self.parts[partition] += 1
+        path = self.directory / f'date={partition}' / f'part-{part:05}{EXTENSIONS[self.format]}'
+        write_columns(path, columns, self.format)
+        self.rows += count
+        self.files.append(path)
+        logger.info('%s: %d rows', path, count)
+
+    def close(self):
+        for partition in list(self.buffers):
+            self.flush(partition)
+
+
+def add_station_columns(columns: Columns, mapping: StationMapping, arrays: Dict[str, np.ndarray]) -> Columns:
+    '''
+    station index => code, office, class20, 緯度経度
+    '''
+    station = columns.pop('station')
+    mapped: Columns = {'time': columns.pop('time')}
+    for name, values in arrays.items():
+        mapped[name] = values[station]
+    mapped.update(columns)
+    return mapped
+
+
+def export(sources: Iterable[Source], mapping: StationMapping, out_dir: pathlib.Path, *,
+           format: str = 'auto', workers: Optional[int] = None, chunk_rows: int = CHUNK_ROWS) -> Dict[str, int]:
+    '''
+    kind => 書いた行数
+    '''
+    format = resolve_format(format)
+    workers = workers or os.cpu_count() or 1
+    arrays = {
+        'station_code': np.array(mapping.codes, dtype=str),
+        'office': np.array(mapping.offices, dtype=str),
+        'class20': np.array(mapping.class20s, dtype=str),
+        'lat': np.array(mapping.lat, dtype=np.float64),
+        'lon': np.array(mapping.lon, dtype=np.float64),
+    }
+    writers: Dict[str, PartitionWriter] = {}
+
+    def on_result(kind: str, partition: str, columns: Columns):
+        if kind == 'amedas':
+            columns = add_station_columns(columns, mapping, arrays)
+        elif kind == 'forecast' and len(columns['office']):
+            office = columns['office'][0]
+            columns['office_name'] = np.full(len(columns['office']), mapping.office_names.get(office, ''))
+        writer = writers.get(kind)
+        if not writer:
+            writer = PartitionWriter(out_dir, kind, format, chunk_rows=chunk_rows)
+            writers[kind] = writer
+        writer.add(partition, columns)
+
+    # 結果を待っている task を worker の数倍までにして、memory を抑える
+    max_pending = workers * 4
+    with concurrent.futures.ProcessPoolExecutor(
+            workers, initializer=_init_worker, initargs=(mapping.codes,)) as pool:
+        pending: collections.deque = collections.deque()
+
+        def drain_one():
+            kind, key, future = pending.popleft()
+            try:
+                partition, columns = future.result()
+            except Exception as ex:
+                logger.warning('%s %s: %s', kind, key, ex)
+                return
+            on_result(kind, partition, columns)
+
+        for source in sources:
+            pending.append((source.kind, source.key,
+                            pool.submit(DECODERS[source.kind], source.key, source.data)))
+            while len(pending) >= max_pending:
+                drain_one()
+        while pending:
+            drain_one()
+
+    for writer in writers.values():
+        writer.close()
+    return {kind: writer.rows for kind, writer in writers.items()}
@@ -0,0 +1,97 @@
+'''
+forecast/{office}.json を一度だけ parse して、表示用の文字列まで作っておく。
+
+[
+    # 直近
+    {"timeSeries": [3日の天気, 6時間降水確率, 気温], ...},
+    # 週間
+    {"timeSeries": [天気, 気温], "tempAverage": ..., "precipAverage": ...},
+]
+'''
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import datetime
+from .weather_code import label as weather_label
+
+
+class Area(NamedTuple):
+    code: str
+    name: str
+
+
+class AreaSeries:
+    '''
+    1 area 分。rows は (時刻, column...) の表示用文字列
+    '''
+    __slots__ = ('area', 'values', 'rows')
+
+    def __init__(self, area: Area, values: Dict[str, list], rows: List[Tuple[str, ...]]) -> None:
+        self.area = area
+        self.values = values
+        self.rows = rows
+
+
+class TimeSeries:
+    __slots__ = ('times', 'columns', 'areas')
+
+    def __init__(self, data: dict) -> None:
+        self.times = [datetime.datetime.fromisoformat(t) for t in data['timeDefines']]
+        time_labels = [f'{t}' for t in self.times]
+
+        self.columns: List[str] = []
+        for area in data['areas']:
+            for k in area.keys():
+                if k != 'area' and k not in self.columns:
+                    self.columns.append(k)
+
+        self.areas: List[AreaSeries] = []
+        for area in data['areas']:
+            values = {k: v for k, v in area.items() if k != 'area'}
+            rows = []
+            for i, time_label in enumerate(time_labels):
+                row = [time_label]
+                for column in self.columns:
+                    value = values.get(column)
+                    # waves 無いとき
+                    if not value or i >= len(value):
+                        row.append('')
+                    elif column == 'weatherCodes':
+                        row.append(weather_label(value[i]))
+                    else:
+                        row.append(f'{value[i]}')
+                rows.append(tuple(row))
+            self.areas.append(AreaSeries(
+                Area(area['area']['code'], area['area']['name']), values, rows))
+
+    def get(self, code: str) -> Optional[AreaSeries]:
+        for area in self.areas:
+            if area.area.code == code:
+                return area
+        return None
+
+
+class Average(NamedTuple):
+    area: Area
+    min: str
+    max: str
+
+
+def parse_average(data: Optional[dict]) -> List[Average]:
+    if not data:
+        return []
+    return [Average(Area(a['area']['code'], a['area']['name']), a.get('min', ''), a.get('max', ''))
+            for a in data['areas']]
+
+
+class Forecast:
+    __slots__ = ('office', 'report_datetime', 'three_day', 'rain6', 'temperature',
+                 'week', 'week_temperature', 'temp_average', 'precip_average')
+
+    def __init__(self, data: list) -> None:
+        latest, week = data
+        self.office: str = latest['publishingOffice']
+        self.report_datetime = datetime.datetime.fromisoformat(latest['reportDatetime'])
+        self.three_day, self.rain6, self.temperature = [
+            TimeSeries(t) for t in latest['timeSeries']]
+        self.week, self.week_temperature = [TimeSeries(t) for t in week['timeSeries']]
+        self.temp_average = parse_average(week.get('tempAverage'))
+        self.precip_average = parse_average(week.get('precipAverage'))
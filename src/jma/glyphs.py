@@ -0,0 +1,100 @@
+'''
+font atlas に入れる文字の集合。
+
+GetGlyphRangesJapanese は 3000 字近い漢字を毎回 rasterize するので起動が遅い。
+表示した文字(area 名、地点名、予報の文字列)を file に残しておき、
+次回の起動ではその文字だけで atlas を作る。
+atlas の画像は binding から読み戻せないので、保存するのは文字の集合。
+atlas は起動時に一度だけ作るので、途中で増えた文字は次回から表示される。
+
+add, save は worker thread、ranges は描画 thread から呼ぶので lock で守る。
+'''
+from typing import Iterable, List, Optional, Set
+import logging
+import pathlib
+import threading
+
+logger = logging.getLogger(__name__)
+
+# ASCII, 句読点と仮名, 全角英数と半角カナ, 置換文字
+BASE_RANGES = ((0x0020, 0x007e), (0x3000, 0x30ff), (0xff00, 0xffef), (0xfffd, 0xfffd))
+
+
+def to_ranges(codepoints: Iterable[int]) -> List[int]:
+    '''
+    ImGui の glyph range。連続した codepoint を [start, end] にまとめて 0 で終わる
+    '''
+    ranges: List[int] = []
+    for codepoint in sorted(set(codepoints)):
+        if codepoint <= 0 or codepoint > 0xffff:
+            # ImWchar は 16bit
+            continue
+        if ranges and ranges[-1] + 1 >= codepoint:
+            ranges[-1] = codepoint
+        else:
+            ranges += [codepoint, codepoint]
+    ranges.append(0)
+    return ranges
+
+
+def is_base(codepoint: int) -> bool:
+    return any(start <= codepoint <= end for start, end in BASE_RANGES)
+
+
+class GlyphSet:
+    def __init__(self, path: pathlib.Path) -> None:
+        self.path = path
+        # BASE_RANGES 以外に必要な文字
+        self.chars: Set[int] = set()
+        self.loaded = False
+        self.dirty = False
+        self.lock = threading.Lock()
+        if path.exists():
+            self.chars = {ord(c) for c in path.read_text(encoding='utf-8')}
+            self.loaded = True
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.chars)
+
+    def add(self, text: str) -> bool:
+        '''
+        新しい文字があれば True
+        '''
+        new = {ord(c) for c in text if not c.isspace()}
+        new = {codepoint for codepoint in new if not is_base(codepoint)}
+        with self.lock:
+            new -= self.chars
+            if not new:
+                return False
+            self.chars |= new
+            self.dirty = True
+        return True
+
+    def add_all(self, texts: Iterable[str]) -> bool:
+        return self.add(''.join(texts))
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            text = ''.join(chr(c) for c in sorted(self.chars))
+            self.dirty = False
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        tmp.write_text(text, encoding='utf-8')
+        tmp.replace(self.path)
+        logger.info('%s: %d glyphs', self.path, len(text))
+
+    def ranges(self, extra: Iterable[int] = ()) -> Optional[List[int]]:
+        '''
+        保存した文字が無ければ(初回) None
+        '''
+        if not self.loaded:
+            return None
+        with self.lock:
+            codepoints = set(self.chars)
+        codepoints.update(extra)
+        for start, end in BASE_RANGES:
+            codepoints.update(range(start, end + 1))
+        return to_ranges(codepoints)
@@ -0,0 +1,390 @@
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple
+import pathlib
+import datetime
+import time
+import asyncio
+import logging
+import ctypes
+import jma
+import jma.forecast
+import jma.area_view
+import jma.timeaxis
+import jma.worker
+import jma.glyphs
+import jma.weather_code
+import jma.metrics
+from pydear.utils import dockspace
+from pydear import imgui as ImGui
+logger = logging.getLogger(__name__)
+
+# ひまわり
+# https://www.jma.go.jp/bosai/himawari/data/satimg/{basetime}/fd/{validtime}/{band}/{prod}/{z}/{x}/{y}.jpg
+
+
+def table_selector(headers: List[str], rows: Sequence[Tuple[Any, Tuple[str, ...]]], last_selected):
+    '''
+    rows は (key, 表示用の文字列) 。見えている行だけ描画する
+    '''
+    flags = (
+        ImGui.ImGuiTableFlags_.BordersV
+        | ImGui.ImGuiTableFlags_.BordersOuterH
+        | ImGui.ImGuiTableFlags_.Resizable
+        | ImGui.ImGuiTableFlags_.RowBg
+        | ImGui.ImGuiTableFlags_.NoBordersInBody
+        | ImGui.ImGuiTableFlags_.ScrollY
+    )
+    selected = None
+    if ImGui.BeginTable("table_selector", len(headers), flags):
+        # header
+        ImGui.TableSetupScrollFreeze(0, 1)
+        for header in headers:
+            ImGui.TableSetupColumn(header)
+        ImGui.TableHeadersRow()
+
+        # body
+        clipper = ImGui.ImGuiListClipper()
+        clipper.Begin(len(rows))
+        while clipper.Step():
+            for i in range(clipper.DisplayStart, clipper.DisplayEnd):
+                key, cols = rows[i]
+                ImGui.TableNextRow()
+                # 0
+                ImGui.TableNextColumn()
+                if ImGui.Selectable(f'{cols[0]}###{key}', key == last_selected, ImGui.ImGuiSelectableFlags_.SpanAllColumns):
+                    logger.debug(f'select: {key}')
+                    selected = key
+                for col in cols[1:]:
+                    ImGui.TableNextColumn()
+                    ImGui.TextUnformatted(col)
+        clipper.End()
+
+        ImGui.EndTable()
+
+    return selected
+
+
+def area_selector(view: jma.area_view.AreaTreeView, last_selected) -> Optional[Tuple[jma.AreaNode, ...]]:
+    flags = (
+        ImGui.ImGuiTableFlags_.BordersV
+        | ImGui.ImGuiTableFlags_.BordersOuterH
+        | ImGui.ImGuiTableFlags_.Resizable
+        | ImGui.ImGuiTableFlags_.RowBg
+        | ImGui.ImGuiTableFlags_.NoBordersInBody
+        | ImGui.ImGuiTableFlags_.ScrollY
+    )
+    selected = None
+    if ImGui.BeginTable("area_selector", 2, flags):
+        # header
+        ImGui.TableSetupScrollFreeze(0, 1)
+        ImGui.TableSetupColumn('name')
+        ImGui.TableSetupColumn('key')
+        ImGui.TableHeadersRow()
+
+        rows = view.get_rows()
+        indent = ImGui.GetTreeNodeToLabelSpacing()
+        clipper = ImGui.ImGuiListClipper()
+        clipper.Begin(len(rows))
+        while clipper.Step():
+            for i in range(clipper.DisplayStart, clipper.DisplayEnd):
+                row = rows[i]
+                node = row.node
+                ImGui.TableNextRow()
+                # name
+                ImGui.TableNextColumn()
+                tree_flag = (ImGui.ImGuiTreeNodeFlags_.OpenOnArrow | ImGui.ImGuiTreeNodeFlags_.OpenOnDoubleClick
+                             | ImGui.ImGuiTreeNodeFlags_.SpanAvailWidth | ImGui.ImGuiTreeNodeFlags_.NoTreePushOnOpen)
+                if row.path == last_selected:
+                    tree_flag |= ImGui.ImGuiTreeNodeFlags_.Selected
+                if not node.children:
+                    tree_flag |= ImGui.ImGuiTreeNodeFlags_.Leaf
+                    tree_flag |= ImGui.ImGuiTreeNodeFlags_.Bullet
+                # 開閉は view が持つ
+                if row.depth:
+                    ImGui.Indent(indent * row.depth)
+                ImGui.SetNextItemOpen(row.expanded, ImGui.ImGuiCond_.Always)
+                ImGui.TreeNodeEx(f'{node.name}###{node.level}:{node.key}', tree_flag)
+                if ImGui.IsItemToggledOpen():
+                    if view.matched is None:
+                        view.toggle(node)
+                elif ImGui.IsItemClicked():
+                    selected = row.path
+                    logger.debug(f'selected: {selected}')
+                if row.depth:
+                    ImGui.Unindent(indent * row.depth)
+                # key
+                ImGui.TableNextColumn()
+                ImGui.TextUnformatted(node.key)
+        clipper.End()
+
+        ImGui.EndTable()
+    return selected
+
+
+# weather icon を付ける
+COLUMN_LABELS = {
+    'winds': 'winds \uf058',
+}
+
+
+def show_table(table_name, series: jma.forecast.TimeSeries, area: jma.forecast.AreaSeries):
+    ImGui.TextUnformatted(area.area.name)
+    flags = (
+        ImGui.ImGuiTableFlags_.BordersV
+        | ImGui.ImGuiTableFlags_.BordersOuterH
+        | ImGui.ImGuiTableFlags_.Resizable
+        | ImGui.ImGuiTableFlags_.RowBg
+        | ImGui.ImGuiTableFlags_.NoBordersInBody
+    )
+    if ImGui.BeginTable(table_name, len(series.columns)+1, flags):
+        # header
+        ImGui.TableSetupColumn('time')
+        for column in series.columns:
+            ImGui.TableSetupColumn(COLUMN_LABELS.get(column, column))
+        ImGui.TableHeadersRow()
+
+        # body. 文字列は parse 時に作ってある
+        for row in area.rows:
+            ImGui.TableNextRow()
+            for value in row:
+                ImGui.TableNextColumn()
+                ImGui.TextUnformatted(value)
+
+        ImGui.EndTable()
+
+
+class DataState(NamedTuple):
+    '''
+    worker が publish する。GUI からは読むだけ
+    '''
+    area_index: Optional[jma.AreaIndex] = None
+    stable: Optional[jma.StationTable] = None
+    times: Tuple[datetime.datetime, ...] = ()
+    # times の表示用
+    time_rows: Tuple[Tuple[int, Tuple[str, ...]], ...] = ()
+    forecast: Optional[jma.forecast.Forecast] = None
+    amedas: Optional[dict] = None
+
+
+class Gui(dockspace.DockingGui):
+    def __init__(self, loop: asyncio.AbstractEventLoop, cache_dir: pathlib.Path, backend: str = 'file') -> None:
+        from pydear.utils.loghandler import ImGuiLogHandler
+        log_handler = ImGuiLogHandler()
+        log_handler.setFormatter(logging.Formatter(
+            '%(name)s:%(lineno)s[%(levelname)s]%(message)s'))
+        log_handler.register_root()
+
+        # dock 毎の描画時間を計る
+        self.frame_times = jma.worker.FrameTimes()
+        # font atlas に入れる文字。_setup_font より先に読む
+        self.glyphs = jma.glyphs.GlyphSet(cache_dir / 'glyphs.txt')
+
+        def dock(name: str, draw, is_open=True) -> dockspace.Dock:
+            return dockspace.Dock(name, self.frame_times.wrap(name, draw),
+                                  (ctypes.c_bool * 1)(is_open))
+
+        docks = [
+            dock('log', log_handler.draw),
+            dock('area', self.select_area),
+            dock('times', self.select_time),
+            dock('selected', self.show_selected),
+            dock('forecast', self.show_forecast),
+            dock('metrics', self.show_metrics),
+            dock('imgui', ImGui.ShowMetricsWindow, False),
+        ]
+        super().__init__(loop, docks=docks)
+
+        self.time_selected = None
+        self.area_selected = None
+        self.area_view: Optional[jma.area_view.AreaTreeView] = None
+        self.area_filter = (ctypes.c_char * 256)()
+        self.stable_selected = None
+        self.amedas_store = None
+
+        # 取得・decode・索引は worker thread
+        self.metrics = jma.metrics.Metrics()
+        self.worker = jma.worker.Worker(cache_dir, backend, metrics=self.metrics)
+        self.data = jma.worker.Slot(DataState())
+        self.worker.submit(self.start_async())
+
+    def _setup_font(self):
+        io = ImGui.GetIO()
+        font_size = 24
+
+        # 前回までに表示した文字だけ。初回は日本語全部
+        ranges = self.glyphs.ranges()
+        if ranges:
+            # Build まで参照を持っておく
+            self.japanese_range = (ctypes.c_ushort * len(ranges))(*ranges)
+            logger.info(f'{len(self.glyphs)} glyphs from {self.glyphs.path}')
+        else:
+            self.japanese_range = io.Fonts.GetGlyphRangesJapanese()
+        io.Fonts.AddFontFromFileTTF('C:/Windows/Fonts/MSGothic.ttc',
+                                    font_size, None, self.japanese_range)
+
+        # 天気 code の icon と COLUMN_LABELS の icon だけ
+        icons = jma.weather_code.icon_codepoints()
+        icons += [ord(c) for label in COLUMN_LABELS.values() for c in label if ord(c) >= 0xf000]
+        icon_range = jma.glyphs.to_ranges(icons)
+        self.icon_range = (ctypes.c_ushort * len(icon_range))(*icon_range)
+
+        font_cfg = ImGui.ImFontConfig()
+        font_cfg.FontDataOwnedByAtlas = True
+        font_cfg.OversampleH = 3  # FIXME: 2 may be a better default?
+        font_cfg.OversampleV = 1
+        font_cfg.GlyphMaxAdvanceX = 9999
+        font_cfg.RasterizerMultiply = 1.0
+        font_cfg.EllipsisChar = 65535
+        font_cfg.MergeMode = True
+        import weather_icons
+        io.Fonts.AddFontFromFileTTF(str(weather_icons.get_path()), font_size, font_cfg, self.icon_range)
+
+        io.Fonts.Build()
+
+    async def start_async(self):
+        getter = self.worker.getter
+        assert getter
+        area = await getter.get_async(jma.AREA_URL)
+        stable = await getter.get_async(jma.AMEDAS_STALBE_URL)
+        import jma.snapshot
+        area_index, stable = await self.worker.loop.run_in_executor(
+            None, jma.snapshot.load_or_build, getter.cache_dir / 'snapshot.bin', area, stable)
+        self.data.update(area_index=area_index, stable=stable)
+        self.glyphs.add_all(node.name for node in area_index.nodes)
+        self.glyphs.add_all(stable.kj_names)
+        self.glyphs.add_all(telop for telop, _ in jma.weather_code.WEATHER_CODES.values())
+        self.glyphs.save()
+
+        times = await getter.get_json_async(jma.HIMAWARI_TIMES_URL)
+        times = tuple(jma.timeaxis.to_datetimes(
+            jma.timeaxis.parse_compact([t['validtime'] for t in times])))
+        self.data.update(times=times, time_rows=tuple(
+            (i, (f'{t}',)) for i, t in enumerate(times)))
+
+    def select_area(self, p_open: ctypes.Array):
+        if ImGui.Begin('area', p_open):
+            area_index = self.data.value.area_index
+            if area_index:
+                if not self.area_view or self.area_view.index is not area_index:
+                    self.area_view = jma.area_view.AreaTreeView(area_index)
+                    for root in area_index.roots:
+                        self.area_view.toggle(root)
+                if ImGui.InputText('filter', self.area_filter, len(self.area_filter)):
+                    self.area_view.set_filter(self.area_filter.value.decode('utf-8', errors='ignore'))
+                selected = area_selector(self.area_view, self.area_selected)
+                if selected:
+                    self.area_selected = selected
+                    if len(self.area_selected) > 1:
+                        office = self.area_selected[1]
+                        self.worker.submit(self.get_forecast(office))
+        ImGui.End()
+
+    async def get_forecast(self, office: jma.AreaNode):
+        assert self.worker.getter
+        url = jma.FORECAST_URL % {'office': office.key}
+        data = await self.worker.getter.get_json_async(url, use_cache=False)
+        forecast = await self.worker.loop.run_in_executor(None, jma.forecast.Forecast, data)
+        self.data.update(forecast=forecast)
+        if self.glyphs.add_all(value for series in (forecast.three_day, forecast.rain6, forecast.temperature)
+                               for area in series.areas for row in area.rows for value in row):
+            self.glyphs.save()
+
+    def _show_series(self, table_name: str, series: jma.forecast.TimeSeries):
+        for area in series.areas:
+            show_table(table_name, series, area)
+
+    def show_forecast(self, p_open: ctypes.Array):
+        if ImGui.Begin('forecast', p_open):
+            forecast = self.data.value.forecast
+            if forecast:
+                self._show_series('forecast3', forecast.three_day)
+                self._show_series('rain6', forecast.rain6)
+                self._show_series('temperature', forecast.temperature)
+        ImGui.End()
+
+    def select_time(self, p_open: ctypes.Array):
+        if ImGui.Begin('times', p_open):
+            selected = table_selector(
+                ['value'], self.data.value.time_rows, self.time_selected)
+            if selected:
+                self.time_selected = selected
+            # if isinstance(selected, int):
+            #     self.worker.submit(
+            #         self.select_time_async(self.data.value.times[selected]))
+        ImGui.End()
+
+    async def select_time_async(self, time: datetime.datetime):
+        assert self.worker.getter
+        url = jma.AMEDAS_MAP_URL % {'time': time.strftime(jma.DATE_FORMAT)}
+        amedas = await self.worker.getter.get_json_async(url)
+        self.data.update(amedas=amedas)
+        stable = self.data.value.stable
+        if stable:
+            # worker thread からしか触らない
+            if not self.amedas_store:
+                import jma.amedas
+                # 10 分毎の 24 時間分
+                self.amedas_store = jma.amedas.AmedasStore(stable, max_times=144)
+            self.amedas_store.add(time, amedas)
+
+    def show_selected(self, p_open: ctypes.Array):
+        if ImGui.Begin('amedas', p_open):
+            if self.area_selected:
+                ImGui.TextUnformatted(f'center: {self.area_selected[0].name}')
+                if len(self.area_selected) > 1:
+                    ImGui.TextUnformatted(
+                        f'office: {self.area_selected[1].name}')
+            if self.time_selected is not None:
+                ImGui.TextUnformatted(f'{self.data.value.times[self.time_selected]}')
+        ImGui.End()
+
+    def show_metrics(self, p_open: ctypes.Array):
+        if ImGui.Begin('metrics', p_open):
+            if self.worker.getter:
+                ImGui.TextUnformatted(f'{self.worker.getter.stats}')
+            flags = (
+                ImGui.ImGuiTableFlags_.BordersV
+                | ImGui.ImGuiTableFlags_.BordersOuterH
+                | ImGui.ImGuiTableFlags_.RowBg
+            )
+            if ImGui.BeginTable('frame_times', 4, flags):
+                for header in ('draw', 'ms', 'avg', 'max'):
+                    ImGui.TableSetupColumn(header)
+                ImGui.TableHeadersRow()
+                for name, last, average, worst in self.frame_times.summary():
+                    ImGui.TableNextRow()
+                    for value in (name, f'{last:.2f}', f'{average:.2f}', f'{worst:.2f}'):
+                        ImGui.TableNextColumn()
+                        ImGui.TextUnformatted(value)
+                ImGui.EndTable()
+            if ImGui.BeginTable('fetch_metrics', 4, flags):
+                for header in ('metric', 'value', 'p50', 'p99'):
+                    ImGui.TableSetupColumn(header)
+                ImGui.TableHeadersRow()
+                for name, instrument in self.metrics.instruments.items():
+                    ImGui.TableNextRow()
+                    if isinstance(instrument, jma.metrics.Histogram):
+                        values = (name, f'{instrument.count}',
+                                  f'{instrument.quantile(0.5):g}', f'{instrument.quantile(0.99):g}')
+                    else:
+                        values = (name, f'{instrument.value:g}', '', '')
+                    for value in values:
+                        ImGui.TableNextColumn()
+                        ImGui.TextUnformatted(value)
+                ImGui.EndTable()
+        ImGui.End()
+
+
+def run(cache_dir: pathlib.Path, backend: str = 'file'):
+    from pydear.utils import glfw_app
+    app = glfw_app.GlfwApp('pyjma')
+
+    gui = Gui(app.loop, cache_dir, backend)
+    from pydear.backends import impl_glfw
+    impl_glfw = impl_glfw.ImplGlfwInput(app.window)
+    while app.clear():
+        start = time.perf_counter()
+        impl_glfw.process_inputs()
+        gui.render()
+        gui.frame_times.add('frame', (time.perf_counter() - start) * 1000)
+    gui.worker.shutdown()
+    del gui
@@ -0,0 +1,161 @@
+'''
+ひまわり全球(fd)の tile。
+
+https://www.jma.go.jp/bosai/himawari/data/satimg/{basetime}/fd/{validtime}/{band}/{prod}/{z}/{x}/{y}.jpg
+
+* disk: HttpGetter の cache(tile は変わらないので ttl 無し)
+* memory: decode 済みの pixel を LRU で保持する。animation で毎 frame jpeg を decode しない
+
+jpeg の decode には Pillow が必要。
+'''
+from typing import Dict, Iterator, List, NamedTuple, Optional, Set, Tuple
+import asyncio
+import io
+import logging
+import jma
+from .http_getter import HttpGetter
+from .object_cache import ObjectCache
+
+logger = logging.getLogger(__name__)
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+TILE_SIZE = 256
+
+
+class TargetTime(NamedTuple):
+    basetime: str
+    validtime: str
+
+
+class TileKey(NamedTuple):
+    time: TargetTime
+    band: str
+    prod: str
+    z: int
+    x: int
+    y: int
+
+    @property
+    def url(self) -> str:
+        return jma.HIMAWARI_TILE_URL % {
+            'basetime': self.time.basetime, 'validtime': self.time.validtime,
+            'band': self.band, 'prod': self.prod, 'z': self.z, 'x': self.x, 'y': self.y}
+
+
+class Tile(NamedTuple):
+    key: TileKey
+    width: int
+    height: int
+    # RGBA
+    pixels: bytes
+
+
+class Viewport(NamedTuple):
+    z: int
+    # tile 座標。end は含まない
+    x0: int
+    y0: int
+    x1: int
+    y1: int
+
+    def keys(self, time: TargetTime, band: str, prod: str, *, margin=0) -> Iterator[TileKey]:
+        count = 1 << self.z
+        for y in range(max(0, self.y0 - margin), min(count, self.y1 + margin)):
+            for x in range(max(0, self.x0 - margin), min(count, self.x1 + margin)):
+                yield TileKey(time, band, prod, self.z, x, y)
+
+
+def decode_jpeg(data: bytes) -> Tuple[int, int, bytes]:
+    '''
+    width, height, RGBA
+    '''
+    if not Image:
+        raise RuntimeError('Pillow is required to decode himawari tiles')
+    image = Image.open(io.BytesIO(data)).convert('RGBA')
+    return image.width, image.height, image.tobytes()
+
+
+class TileFetcher:
+    def __init__(self, getter: HttpGetter, *, memory_bytes: int = 256 * 1024 * 1024) -> None:
+        self.getter = getter
+        self.loop = getter.loop
+        # key => decode 済み tile
+        self.tiles = ObjectCache(memory_bytes)
+        self.pending: Dict[TileKey, asyncio.Task] = {}
+
+    @staticmethod
+    async def get_times_async(getter: HttpGetter) -> List[TargetTime]:
+        times = await getter.get_json_async(jma.HIMAWARI_TIMES_URL)
+        return [TargetTime(t['basetime'], t['validtime']) for t in times]
+
+    def get_tile(self, key: TileKey) -> Optional[Tile]:
+        '''
+        描画用。memory に無ければ None
+        '''
+        return self.tiles.get(key, None)
+
+    async def _load_async(self, key: TileKey) -> Tile:
+        data = await self.getter.get_async(key.url)
+        width, height, pixels = await self.loop.run_in_executor(None, decode_jpeg, data)
+        tile = Tile(key, width, height, pixels)
+        self.tiles.put(key, None, tile, len(tile.pixels))
+        return tile
+
+    def _on_done(self, key: TileKey, task: asyncio.Task):
+        if self.pending.get(key) is task:
+            del self.pending[key]
+        if not task.cancelled() and task.exception():
+            logger.warning('%s: %s', key.url, task.exception())
+
+    def request(self, key: TileKey) -> asyncio.Task:
+        task = self.pending.get(key)
+        if not task:
+            task = self.loop.create_task(self._load_async(key))
+            task.add_done_callback(lambda t: self._on_done(key, t))
+            self.pending[key] = task
+        return task
+
+    async def get_tile_async(self, key: TileKey) -> Tile:
+        tile = self.get_tile(key)
+        if tile:
+            return tile
+        return await asyncio.shield(self.request(key))
+
+    async def get_tiles_async(self, keys: List[TileKey]) -> List[Tile]:
+        return await asyncio.gather(*(self.get_tile_async(key) for key in keys))
+
+    def prefetch(self, viewport: Viewport, times: List[TargetTime], current: int, band: str, prod: str, *,
+                 margin=1, frames=1) -> Set[TileKey]:
+        '''
+        表示中の tile、その周囲 margin tile、前後 frames 個の validtime の近い順に先読みする。
+        viewport 内の key を返すので、動かしたら cancel(keep) で外れた分を止める
+        '''
+        keys: List[TileKey] = [*viewport.keys(times[current], band, prod),
+                               *viewport.keys(times[current], band, prod, margin=margin)]
+        for distance in range(1, frames + 1):
+            for i in (current + distance, current - distance):
+                if 0 <= i < len(times):
+                    keys += viewport.keys(times[i], band, prod)
+        requested: Set[TileKey] = set()
+        for key in keys:
+            if key in requested:
+                continue
+            requested.add(key)
+            if not self.get_tile(key):
+                self.request(key)
+        return requested
+
+    def cancel(self, keep: Optional[Set[TileKey]] = None):
+        '''
+        viewport を大きく動かしたときに不要な先読みを止める
+        '''
+        for key, task in list(self.pending.items()):
+            if keep and key in keep:
+                continue
+            # 次の request で cancel 済みの task を返さないように、すぐ外す
+            del self.pending[key]
+            task.cancel()
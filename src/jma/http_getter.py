@@ -1,10 +1,15 @@
-import json
-from typing import Optional, NamedTuple, List
+from typing import Any, AsyncIterator, Hashable, Optional, NamedTuple, Dict, List, Tuple
 import pathlib
 import logging
 import urllib.parse
 import asyncio
+import time
 import aiohttp
+from .cache_policy import CacheMeta, CachePolicy
+from .cache_backend import CacheBackend, FileCacheBackend
+from .object_cache import ObjectCache
+from .json_stream import StreamDecoder, fast_loads, top_level_items
+from .metrics import BYTES_BUCKETS, NULL_METRICS, Metrics
 
 logger = logging.getLogger(__name__)
 
@@ -12,75 +17,464 @@ logger = logging.getLogger(__name__)
 class GetTask(NamedTuple):
     url: str
     future: asyncio.Future
+    # queue に入れた time.monotonic()
+    queued: float
+    # False なら disk cache に書かない
+    store: bool = True
+
+
+def is_transient(ex: BaseException) -> bool:
+    match ex:
+        case aiohttp.ClientResponseError() as response_error:
+            return response_error.status == 429 or response_error.status >= 500
+        case aiohttp.ClientConnectionError() | asyncio.TimeoutError():
+            return True
+        case _:
+            return False
+
+
+class TokenBucket:
+    '''
+    host 毎の rate limit。
+    rate 個/秒 で token が溜まり、capacity 個まで burst できる。
+    '''
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens +
+                          (now - self.last) * self.rate)
+        self.last = now
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class FetchStats:
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        # cache の ttl 内で取得しなかった、200 で取得した、304 で確かめた
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.bytes = 0
+        self.in_flight = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def add(self, latency: float, size: int):
+        self.requests += 1
+        self.bytes += size
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+
+    @property
+    def latency_average(self) -> float:
+        if not self.requests:
+            return 0.0
+        return self.latency_total / self.requests
+
+    @property
+    def requests_per_second(self) -> float:
+        elapsed = time.monotonic() - self.started
+        if elapsed <= 0:
+            return 0.0
+        return self.requests / elapsed
+
+    def __str__(self) -> str:
+        return (f'{self.requests} requests ({self.errors} errors), '
+                f'{self.hits} hits, {self.misses} misses, {self.revalidated} revalidated, {self.bytes} bytes, '
+                f'{self.requests_per_second:.2f} req/s, '
+                f'latency avg {self.latency_average:.3f}s max {self.latency_max:.3f}s')
 
 
 class HttpGetter:
-    def __init__(self, loop: asyncio.AbstractEventLoop, cache_dir: pathlib.Path) -> None:
+    '''
+    rate, burst は host 毎の token bucket。
+    全 office の予報と概況(約 120 url)を burst の後 rate 個/秒 で取るので、既定値で 20 秒くらい。
+    これより速くしたいときは呼ぶ側が指定する(CLI は --rate, --burst)
+    '''
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, cache_dir: pathlib.Path, *,
+                 concurrency: int = 4, rate: float = 5.0, burst: float = 10.0,
+                 policy: Optional[CachePolicy] = None,
+                 object_cache_bytes: int = 64 * 1024 * 1024,
+                 retries: int = 3, backoff: float = 1.0,
+                 backend: Optional[CacheBackend] = None,
+                 metrics: Optional[Metrics] = None) -> None:
         self.cache_dir = cache_dir
-        self.interval = 0.5
+        self.backend = backend or FileCacheBackend(cache_dir)
+        self.policy = policy or CachePolicy()
+        self.objects = ObjectCache(object_cache_bytes)
+        self.concurrency = concurrency
+        # host 毎に rate 個/秒
+        self.rate = rate
+        self.burst = burst
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.stats = FetchStats()
+        self.retries = retries
+        self.backoff = backoff
+        self.metrics = metrics or NULL_METRICS
+        self._create_instruments(self.metrics)
 
         # start loader
         self.loop = loop
-        self.queue: List[GetTask] = []
-        self.task_map = {}
-        self.is_running = True
-        self.loop.create_task(self.load_async_loop())
+        self.queue: asyncio.Queue[GetTask] = asyncio.Queue()
+        # url => 実行中の future。完了したら取り除く
+        self.task_map: Dict[str, asyncio.Future] = {}
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.workers: List[asyncio.Task] = [
+            self.loop.create_task(self.load_async_loop()) for _ in range(concurrency)]
+
+    def _create_instruments(self, metrics: Metrics):
+        self.m_queue_depth = metrics.gauge('jma_queue_depth', 'urls waiting for a loader')
+        self.m_queue_wait = metrics.histogram('jma_queue_wait_seconds', 'time from enqueue to loader pickup')
+        self.m_in_flight = metrics.gauge('jma_fetch_in_flight', 'requests on the wire')
+        self.m_fetch_latency = metrics.histogram('jma_fetch_latency_seconds', 'http request latency')
+        self.m_fetch_bytes = metrics.counter('jma_fetch_bytes_total', 'response body bytes')
+        self.m_fetch_size = metrics.histogram('jma_fetch_size_bytes', 'response body size', BYTES_BUCKETS)
+        self.m_fetch_errors = metrics.counter('jma_fetch_errors_total', 'failed downloads after retries')
+        self.m_retries = metrics.counter('jma_fetch_retries_total', 'transient failures retried')
+        self.m_cache_hits = metrics.counter('jma_cache_hits_total', 'fresh cache entries served without a request')
+        self.m_cache_misses = metrics.counter('jma_cache_misses_total', 'downloads with a 200 response')
+        self.m_cache_revalidated = metrics.counter('jma_cache_revalidated_total', 'conditional requests answered 304')
+        self.m_object_hits = metrics.counter('jma_object_cache_hits_total', 'decoded values served from memory')
+        self.m_dedup_hits = metrics.counter('jma_dedup_hits_total', 'requests joined to an in-flight download')
+        self.m_decode = metrics.histogram('jma_decode_seconds', 'json decode time')
+        self.m_decode_bytes = metrics.counter('jma_decode_bytes_total', 'json bytes decoded')
+
+    def _stop(self) -> Optional[aiohttp.ClientSession]:
+        '''
+        worker と待っている future を止めて、session を外す
+        '''
+        for worker in self.workers:
+            worker.cancel()
+        self.workers.clear()
+        # queue に残っている分と実行中の分。待っている側が永遠に待たないように
+        while not self.queue.empty():
+            task = self.queue.get_nowait()
+            task.future.cancel()
+            self.queue.task_done()
+        for future in list(self.task_map.values()):
+            future.cancel()
+        self.task_map.clear()
+        session, self.session = self.session, None
+        return session
 
     def shutdown(self):
-        self.is_running = False
+        session = self._stop()
+        if session:
+            self.loop.create_task(session.close())
+        self.backend.close()
+
+    async def shutdown_async(self):
+        '''
+        session を閉じ終わるまで待つ。
+        backend は executor で使っている途中かもしれないので、呼ぶ側が executor を止めてから close する
+        '''
+        session = self._stop()
+        if session:
+            await session.close()
+
+    def get_session(self) -> aiohttp.ClientSession:
+        if not self.session:
+            connector = aiohttp.TCPConnector(limit=self.concurrency)
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
+    def get_bucket(self, url: str) -> TokenBucket:
+        host = urllib.parse.urlparse(url).hostname or ''
+        bucket = self.buckets.get(host)
+        if not bucket:
+            bucket = TokenBucket(self.rate, self.burst)
+            self.buckets[host] = bucket
+        return bucket
+
+    async def fetch_async(self, url: str, headers: Dict[str, str]) -> Tuple[Optional[bytes], CacheMeta]:
+        '''
+        304 Not Modified のときは body が None
+        '''
+        await self.get_bucket(url).acquire()
+        start = time.monotonic()
+        self.stats.in_flight += 1
+        self.m_in_flight.inc()
+        try:
+            async with self.get_session().get(url, headers=headers) as response:
+                if response.status == 304:
+                    value = None
+                else:
+                    response.raise_for_status()
+                    value = await response.read()
+                meta = CacheMeta.from_headers(response.headers)
+        finally:
+            self.stats.in_flight -= 1
+            self.m_in_flight.dec()
+        latency = time.monotonic() - start
+        size = len(value) if value else 0
+        self.stats.add(latency, size)
+        self.m_fetch_latency.observe(latency)
+        if value is not None:
+            self.m_fetch_bytes.inc(size)
+            self.m_fetch_size.observe(size)
+        return value, meta
+
+    async def revalidate_async(self, url: str, *, store=True) -> bytes:
+        meta = await self.loop.run_in_executor(None, self.backend.get_meta, url) if store else None
+        headers = meta.conditional_headers() if meta else {}
+        value, new_meta = await self.fetch_async(url, headers)
+        if value is None and meta:
+            logger.debug('%s not modified', url)
+            data = await self.loop.run_in_executor(None, self.backend.refresh, url, meta.refreshed())
+            if data is not None:
+                self.m_cache_revalidated.inc()
+                self.stats.revalidated += 1
+                return data
+        if value is None:
+            # 保存していない url、または 304 の間に消された。条件無しで取り直す
+            logger.warning('%s: 304 without a cached entry', url)
+            value, new_meta = await self.fetch_async(url, {})
+            if value is None:
+                raise ValueError(f'{url}: 304 for an unconditional request')
+        logger.debug('%s done', url)
+        self.m_cache_misses.inc()
+        self.stats.misses += 1
+        if store:
+            await self.loop.run_in_executor(None, self.backend.put, url, value, new_meta)
+        return value
+
+    async def retry_async(self, url: str, *, store=True) -> bytes:
+        retry = 0
+        while True:
+            try:
+                return await self.revalidate_async(url, store=store)
+            except Exception as ex:
+                if retry >= self.retries or not is_transient(ex):
+                    raise
+                delay = self.backoff * (2 ** retry)
+                retry += 1
+                self.m_retries.inc()
+                logger.warning('%s: %s, retry %d after %ss', url, ex, retry, delay)
+                await asyncio.sleep(delay)
 
     async def load_async_loop(self):
-        while self.is_running:
-            if self.queue:
-                url, future = self.queue.pop(0)
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(url) as response:
-                        value = await response.read()
-                        logger.debug(f'{url} done')
-                        self.set_cache(url, value)
-                        future.set_result(value)
-
-            await asyncio.sleep(self.interval)
-
-    def get_cache_path(self, url) -> pathlib.Path:
-        parsed = urllib.parse.urlparse(url)
-        return self.cache_dir / f'{parsed.hostname}{parsed.path}'
+        while True:
+            url, future, queued, store = await self.queue.get()
+            self.m_queue_depth.set(self.queue.qsize())
+            self.m_queue_wait.observe(time.monotonic() - queued)
+            try:
+                if future.done():
+                    continue
+                value = await self.retry_async(url, store=store)
+                if not future.done():
+                    future.set_result(value)
+            except asyncio.CancelledError:
+                # shutdown. 待っている側を解放する
+                future.cancel()
+                raise
+            except Exception as ex:
+                self.stats.errors += 1
+                self.m_fetch_errors.inc()
+                logger.error('%s: %s', url, ex)
+                if not future.done():
+                    future.set_exception(ex)
+            finally:
+                self.queue.task_done()
 
     def get_cache(self, url: str) -> Optional[bytes]:
-        path = self.get_cache_path(url)
-        if path.exists():
-            return path.read_bytes()
-
-    def set_cache(self, url: str, data: bytes):
-        path = self.get_cache_path(url)
-        logger.info(f'save {path} ...')
-        path.parent.mkdir(parents=True, exist_ok=True)
-        path.write_bytes(data)
-
-    def create_task(self, url) -> asyncio.Future:
-        task = self.loop.create_future()
-        get_task = GetTask(url, task)
-        self.queue.append(get_task)
-        self.task_map[url] = get_task
-        return task
-
-    async def get_async(self, url: str, *, use_cache=True) -> bytes:
-        logger.info(f'get {url} ...')
+        '''
+        policy の ttl 内の cache だけを返す
+        '''
+        entry = self.backend.get(url)
+        if entry and self.policy.is_fresh(url, entry[1]):
+            return entry[0]
+
+    def set_cache(self, url: str, data: bytes, meta: Optional[CacheMeta] = None):
+        self.backend.put(url, data, meta or CacheMeta(time.time()))
+
+    def _on_done(self, url: str, future: asyncio.Future):
+        if self.task_map.get(url) is future:
+            del self.task_map[url]
+        if not future.cancelled():
+            # 待っている側が全部 cancel されても警告を出さない
+            future.exception()
+
+    def create_task(self, url, *, store=True) -> asyncio.Future:
+        future = self.loop.create_future()
+        future.add_done_callback(lambda f: self._on_done(url, f))
+        self.queue.put_nowait(GetTask(url, future, time.monotonic(), store))
+        self.m_queue_depth.set(self.queue.qsize())
+        self.task_map[url] = future
+        return future
+
+    async def get_async(self, url: str, *, use_cache=True, store=True) -> bytes:
+        '''
+        store=False なら disk cache に書かない。archive に入れるものなど
+        '''
+        logger.debug('get %s ...', url)
         if use_cache:
-            value = self.get_cache(url)
+            value = await self.loop.run_in_executor(None, self.get_cache, url)
             if value:
+                self.m_cache_hits.inc()
+                self.stats.hits += 1
                 return value
 
-        match self.task_map.get(url):
-            case asyncio.Future() as future:
-                return await future
-            case GetTask() as get_task:
-                return await get_task.future
-            case None:
-                return await self.create_task(url)
-            case _:
-                raise RuntimeError()
+        future = self.task_map.get(url)
+        if future:
+            self.m_dedup_hits.inc()
+        else:
+            future = self.create_task(url, store=store)
+        # waiter が cancel されても共有の download は続ける
+        value = await asyncio.shield(future)
+        if value is None:
+            # stream_json_async の download に相乗りした。body は cache にある
+            entry = await self.loop.run_in_executor(None, self.backend.get, url)
+            if not entry:
+                raise KeyError(url)
+            value = entry[0]
+        return value
+
+    async def get_version_async(self, url: str) -> Optional[Hashable]:
+        '''
+        cache の body の版。304 では変わらない
+        '''
+        return await self.loop.run_in_executor(None, self.backend.get_version, url)
+
+    def _load_fresh(self, url: str):
+        '''
+        fresh な cache の version。無ければ None
+        '''
+        meta = self.backend.get_meta(url)
+        if not meta or not self.policy.is_fresh(url, meta):
+            return None
+        return self.backend.get_version(url)
 
     async def get_json_async(self, url: str, *, use_cache=True) -> dict:
+        if use_cache:
+            version = await self.loop.run_in_executor(None, self._load_fresh, url)
+            if version:
+                value = self.objects.get(url, version)
+                if value is not None:
+                    self.m_cache_hits.inc()
+                    self.stats.hits += 1
+                    self.m_object_hits.inc()
+                    return value
+
         data = await self.get_async(url, use_cache=use_cache)
-        return json.loads(data)
+        return await self._get_object_async(url, data)
+
+    async def _get_object_async(self, url: str, data: bytes) -> Any:
+        version = await self.loop.run_in_executor(None, self.backend.get_version, url)
+        value = self.objects.get(url, version)
+        if value is None:
+            value = await self.loop.run_in_executor(None, self._decode, data)
+            self.objects.put(url, version, value, len(data))
+        else:
+            self.m_object_hits.inc()
+        return value
+
+    def _decode(self, data: bytes) -> Any:
+        start = time.perf_counter()
+        value = fast_loads(data)
+        self.m_decode.observe(time.perf_counter() - start)
+        self.m_decode_bytes.inc(len(data))
+        return value
+
+    async def stream_json_async(self, url: str, *, use_cache=True,
+                                chunk_size: int = 64 * 1024) -> AsyncIterator[Tuple[Any, Any]]:
+        '''
+        download しながら top level の (key, value) を返す。
+        fresh な cache か実行中の download があれば、それを decode してまとめて返す。
+
+        body は cache に書きながら hash を取り、最後まで読めたら commit する。
+        download の間は task_map に入れるので、同じ url の get_async はこれに相乗りする。
+        古い cache があれば conditional request にして、304 なら cache を decode して返す。
+        queue は通らないが rate limit は共有する
+        '''
+        fresh = use_cache and await self.loop.run_in_executor(None, self._load_fresh, url)
+        if fresh or url in self.task_map:
+            value = await self.get_json_async(url, use_cache=use_cache)
+            for record in top_level_items(value):
+                yield record
+            return
+
+        future = self.loop.create_future()
+        future.add_done_callback(lambda f: self._on_done(url, f))
+        self.task_map[url] = future
+        writer = None
+        data = None
+        try:
+            meta = await self.loop.run_in_executor(None, self.backend.get_meta, url)
+            headers = meta.conditional_headers() if meta else {}
+            await self.get_bucket(url).acquire()
+            start = time.monotonic()
+            self.stats.in_flight += 1
+            self.m_in_flight.inc()
+            try:
+                async with self.get_session().get(url, headers=headers) as response:
+                    if response.status != 304 or not meta:
+                        response.raise_for_status()
+                        new_meta = CacheMeta.from_headers(response.headers)
+                        writer = await self.loop.run_in_executor(None, self.backend.open_writer, url)
+                        decoder = StreamDecoder()
+                        async for chunk in response.content.iter_chunked(chunk_size):
+                            await self.loop.run_in_executor(None, writer.write, chunk)
+                            for record in decoder.feed(chunk):
+                                yield record
+                        for record in decoder.close():
+                            yield record
+            finally:
+                self.stats.in_flight -= 1
+                self.m_in_flight.dec()
+            latency = time.monotonic() - start
+            if writer:
+                await self.loop.run_in_executor(None, writer.commit, new_meta)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug('%s done sha256:%s', url, writer.hash.hexdigest())
+            elif meta:
+                logger.debug('%s not modified', url)
+                data = await self.loop.run_in_executor(None, self.backend.refresh, url, meta.refreshed())
+                if data is None:
+                    # 304 の間に消された
+                    data = await self.revalidate_async(url)
+                else:
+                    self.m_cache_revalidated.inc()
+                    self.stats.revalidated += 1
+        except BaseException as ex:
+            if writer:
+                writer.abort()
+            if not future.done():
+                if isinstance(ex, Exception):
+                    future.set_exception(ex)
+                else:
+                    # cancel か、呼んだ側が途中で読むのをやめた
+                    future.cancel()
+            raise
+        size = writer.size if writer else 0
+        self.stats.add(latency, size)
+        self.m_fetch_latency.observe(latency)
+        # 相乗りした側は None を受け取って cache から読む
+        future.set_result(data)
+        if writer:
+            self.m_fetch_bytes.inc(size)
+            self.m_fetch_size.observe(size)
+            self.m_cache_misses.inc()
+            self.stats.misses += 1
+            return
+
+        value = await self._get_object_async(url, data)
+        for record in top_level_items(value):
+            yield record
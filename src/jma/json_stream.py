@@ -0,0 +1,210 @@
+'''
+chunk 毎に JSON を decode する。
+
+top level が object なら (key, value)、array なら (index, value) を
+1 件 decode できた時点で返すので、download が終わる前に処理を始められる。
+amedas map なら 1 station、area.json なら 1 階層が 1 件になる。
+'''
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+import codecs
+import json
+import re
+
+try:
+    import orjson
+    fast_loads: Callable[[bytes], Any] = orjson.loads
+except ImportError:
+    fast_loads = json.loads
+
+WHITESPACE = ' \t\n\r'
+# 値の終端を探すときに止まる文字
+TOKEN = re.compile(r'[][{}"]')
+STRING_TOKEN = re.compile(r'["\\]')
+SCALAR_END = re.compile(r'[ \t\n\r,\]}]')
+
+
+def top_level_items(value: Any) -> Iterable[Tuple[Any, Any]]:
+    '''
+    decode 済みの値を StreamDecoder と同じ形で
+    '''
+    if isinstance(value, dict):
+        return value.items()
+    return enumerate(value)
+
+
+class StreamDecoder:
+    '''
+    値の終端は括弧の深さと文字列の中かどうかを chunk を跨いで覚えて探す。
+    終わっていない値の text は parts に溜めて、終端が見つかったときに 1 回だけ連結して raw_decode する。
+    どの byte も 1 回しか走査しない
+    '''
+
+    def __init__(self) -> None:
+        self.text = codecs.getincrementaldecoder('utf-8')()
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        # start, key, colon, value, comma, end
+        self.state = 'start'
+        self.is_array = False
+        self.key: Any = None
+        self.index = 0
+        # buffer[pos:] + parts が途中までの値
+        self.scanning = False
+        self.parts: List[str] = []
+        self.scalar = False
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        # 見つかった値の終端(buffer の位置)
+        self.value_end: Optional[int] = None
+
+    def _skip_whitespace(self) -> bool:
+        buffer = self.buffer
+        pos = self.pos
+        while pos < len(buffer) and buffer[pos] in WHITESPACE:
+            pos += 1
+        self.pos = pos
+        return pos < len(buffer)
+
+    def _scan(self, text: str, pos: int) -> Optional[int]:
+        '''
+        text[pos:] を前回の続きとして読み、値の終端の次の位置を返す。まだなら None
+        '''
+        if self.scalar:
+            # 数値は後ろに区切りが来るまで終わったかわからない
+            m = SCALAR_END.search(text, pos)
+            return m.start() if m else None
+        size = len(text)
+        while pos < size:
+            if self.escape:
+                self.escape = False
+                pos += 1
+            elif self.in_string:
+                m = STRING_TOKEN.search(text, pos)
+                if not m:
+                    return None
+                pos = m.end()
+                if m.group() == '\\':
+                    self.escape = True
+                else:
+                    self.in_string = False
+                    if self.depth == 0:
+                        return pos
+            else:
+                m = TOKEN.search(text, pos)
+                if not m:
+                    return None
+                pos = m.end()
+                match m.group():
+                    case '"':
+                        self.in_string = True
+                    case '{' | '[':
+                        self.depth += 1
+                    case _:
+                        self.depth -= 1
+                        if self.depth == 0:
+                            return pos
+        return None
+
+    def _decode(self, final: bool):
+        if not self.scanning:
+            self.scanning = True
+            self.scalar = self.buffer[self.pos] not in '{["'
+            self.depth = 0
+            self.in_string = False
+            self.escape = False
+            self.value_end = self._scan(self.buffer, self.pos)
+        if self.value_end is None:
+            if not final:
+                return None
+            if not self.scalar:
+                raise ValueError('incomplete json')
+            self.value_end = len(self.buffer)
+        value, end = self.decoder.raw_decode(self.buffer, self.pos)
+        if end != self.value_end:
+            raise ValueError(f'unexpected data at {end}')
+        self.pos = end
+        self.scanning = False
+        self.value_end = None
+        return value,
+
+    def feed(self, chunk: bytes, *, final=False) -> List[Tuple[Any, Any]]:
+        text = self.text.decode(chunk, final)
+        if self.scanning:
+            # 値の途中。新しい text だけ読む
+            end = self._scan(text, 0)
+            self.parts.append(text)
+            if end is None and not final:
+                return []
+            self.buffer += ''.join(self.parts)
+            if end is not None:
+                self.value_end = len(self.buffer) - len(text) + end
+            self.parts.clear()
+        else:
+            self.buffer += text
+        records = []
+        while self._skip_whitespace():
+            c = self.buffer[self.pos]
+            match self.state:
+                case 'start':
+                    if c == '{':
+                        self.state = 'key'
+                    elif c == '[':
+                        self.is_array = True
+                        self.state = 'value'
+                    else:
+                        raise ValueError(f'top level must be object or array: {c}')
+                    self.pos += 1
+                case 'key':
+                    if c == '}':
+                        self.pos += 1
+                        self.state = 'end'
+                        continue
+                    decoded = self._decode(final)
+                    if not decoded:
+                        break
+                    self.key = decoded[0]
+                    self.state = 'colon'
+                case 'colon':
+                    if c != ':':
+                        raise ValueError(f'":" expected at {self.pos}')
+                    self.pos += 1
+                    self.state = 'value'
+                case 'value':
+                    if self.is_array and c == ']':
+                        self.pos += 1
+                        self.state = 'end'
+                        continue
+                    decoded = self._decode(final)
+                    if not decoded:
+                        break
+                    if self.is_array:
+                        records.append((self.index, decoded[0]))
+                        self.index += 1
+                    else:
+                        records.append((self.key, decoded[0]))
+                    self.state = 'comma'
+                case 'comma':
+                    if c == ',':
+                        self.state = 'value' if self.is_array else 'key'
+                    elif c == (']' if self.is_array else '}'):
+                        self.state = 'end'
+                    else:
+                        raise ValueError(f'"," expected at {self.pos}')
+                    self.pos += 1
+                case 'end':
+                    raise ValueError(f'extra data at {self.pos}')
+
+        # 読み終わった分は捨てる。残るのは途中の値の先頭だけ
+        self.buffer = self.buffer[self.pos:]
+        if self.value_end is not None:
+            self.value_end -= self.pos
+        self.pos = 0
+        return records
+
+    def close(self) -> List[Tuple[Any, Any]]:
+        records = self.feed(b'', final=True)
+        if self.state != 'end':
+            raise ValueError('incomplete json')
+        return records
@@ -0,0 +1,264 @@
+'''
+fetch, cache, decode の計測。
+
+Metrics に counter, gauge, histogram を登録して、値は snapshot() か Prometheus の text 形式で取り出す。
+無効のときは NULL_METRICS の何もしない instrument を返すので、計測する側は分岐しなくてよい。
+'''
+from typing import Dict, List, Optional, Sequence, Union
+import asyncio
+import bisect
+import logging
+import math
+import pathlib
+
+logger = logging.getLogger(__name__)
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BYTES_BUCKETS = tuple(1024 * 4 ** i for i in range(8))
+
+
+class Counter:
+    __slots__ = ('name', 'help', 'value')
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self.value = 0.0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def snapshot(self) -> float:
+        return self.value
+
+
+class Gauge:
+    __slots__ = ('name', 'help', 'value')
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str) -> None:
+        self.name = name
+        self.help = help
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def snapshot(self) -> float:
+        return self.value
+
+
+class Histogram:
+    __slots__ = ('name', 'help', 'buckets', 'counts', 'sum', 'count')
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float]) -> None:
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        # 最後は +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        '''
+        bucket の上限で近似する
+        '''
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return math.inf
+
+    def snapshot(self) -> dict:
+        return {
+            'count': self.count, 'sum': self.sum,
+            'buckets': dict(zip([*self.buckets, math.inf], self.counts)),
+        }
+
+
+Instrument = Union[Counter, Gauge, Histogram]
+
+
+class _NullInstrument:
+    __slots__ = ()
+    value = 0.0
+    count = 0
+    sum = 0.0
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def dec(self, amount: float = 1):
+        pass
+
+    def set(self, value: float):
+        pass
+
+    def observe(self, value: float):
+        pass
+
+
+NULL_INSTRUMENT = _NullInstrument()
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metrics:
+    def __init__(self, *, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.instruments: Dict[str, Instrument] = {}
+
+    def _register(self, instrument: Instrument):
+        if not self.enabled:
+            return NULL_INSTRUMENT
+        found = self.instruments.get(instrument.name)
+        if found:
+            if found.kind != instrument.kind:
+                raise ValueError(f'{instrument.name} is already a {found.kind}')
+            return found
+        self.instruments[instrument.name] = instrument
+        return instrument
+
+    def counter(self, name: str, help: str = '') -> Counter:
+        return self._register(Counter(name, help))
+
+    def gauge(self, name: str, help: str = '') -> Gauge:
+        return self._register(Gauge(name, help))
+
+    def histogram(self, name: str, help: str = '', buckets: Sequence[float] = SECONDS_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, buckets))
+
+    def snapshot(self) -> Dict[str, Union[float, dict]]:
+        return {name: instrument.snapshot() for name, instrument in self.instruments.items()}
+
+    def to_prometheus(self) -> str:
+        lines: List[str] = []
+        for name, instrument in self.instruments.items():
+            if instrument.help:
+                lines.append(f'# HELP {name} {instrument.help}')
+            lines.append(f'# TYPE {name} {instrument.kind}')
+            if isinstance(instrument, Histogram):
+                total = 0
+                for bound, count in zip([*instrument.buckets, math.inf], instrument.counts):
+                    total += count
+                    lines.append(f'{name}_bucket{{le="{_format_value(bound)}"}} {total}')
+                lines.append(f'{name}_sum {_format_value(instrument.sum)}')
+                lines.append(f'{name}_count {instrument.count}')
+            else:
+                lines.append(f'{name} {_format_value(instrument.value)}')
+        return '\n'.join(lines) + '\n'
+
+
+NULL_METRICS = Metrics(enabled=False)
+
+
+class PrometheusFileSink:
+    '''
+    node_exporter の textfile collector 向け。interval 秒毎に書き出す
+    '''
+
+    def __init__(self, metrics: Metrics, path: pathlib.Path, *, interval: float = 15.0) -> None:
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+
+    def write(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        tmp.write_text(self.metrics.to_prometheus(), encoding='utf-8')
+        tmp.replace(self.path)
+
+    async def run_async(self):
+        while True:
+            try:
+                self.write()
+            except OSError as ex:
+                logger.warning('%s: %s', self.path, ex)
+            await asyncio.sleep(self.interval)
+
+
+class PrometheusServer:
+    '''
+    http://host:port/metrics
+    '''
+
+    def __init__(self, metrics: Metrics, port: int, host: str = '127.0.0.1') -> None:
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.runner = None
+
+    async def start_async(self):
+        from aiohttp import web
+
+        async def handle(request: web.Request) -> web.Response:
+            return web.Response(text=self.metrics.to_prometheus(),
+                                content_type='text/plain', charset='utf-8')
+        app = web.Application()
+        app.router.add_get('/metrics', handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+        logger.info('metrics on http://%s:%s/metrics', self.host, self.port)
+
+    async def stop_async(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+class MetricsSinks:
+    '''
+    file と http の出力。stop_async で最後の値を書き出して止める
+    '''
+
+    def __init__(self, metrics: Metrics, *,
+                 path: Optional[pathlib.Path] = None, port: Optional[int] = None) -> None:
+        self.metrics = metrics
+        self.file = PrometheusFileSink(metrics, path) if path else None
+        self.server = PrometheusServer(metrics, port) if port else None
+        self.tasks: List[asyncio.Task] = []
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        if self.file:
+            self.tasks.append(loop.create_task(self.file.run_async()))
+        if self.server:
+            self.tasks.append(loop.create_task(self.server.start_async()))
+
+    async def stop_async(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks.clear()
+        if self.server:
+            await self.server.stop_async()
+        if self.file:
+            # 最後の interval の分
+            try:
+                self.file.write()
+            except OSError as ex:
+                logger.warning('%s: %s', self.file.path, ex)
@@ -0,0 +1,164 @@
+'''
+全国(または指定した office)の府県天気予報をまとめて取得して、
+class10 の area code x 時刻 の 1 つの表にする。
+'''
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+import asyncio
+import datetime
+import logging
+import jma
+from .area_index import AreaIndex, AreaNode
+from .forecast import Forecast
+from .http_getter import HttpGetter
+from .overview import OverviewStore
+
+logger = logging.getLogger(__name__)
+
+
+class Row(NamedTuple):
+    office: str
+    area: str
+    time: datetime.datetime
+    # column => value
+    values: Dict[str, str]
+
+
+class OfficeReport(NamedTuple):
+    forecast: Forecast
+    overview: Optional[dict]
+    # cache の版。同じなら reportDatetime も見ない
+    forecast_version: Hashable
+    overview_version: Hashable
+    # reportDatetime。変わったら更新する
+    forecast_datetime: Optional[str]
+    overview_datetime: Optional[str]
+
+
+def report_datetime(value: Any) -> Optional[str]:
+    '''
+    forecast は list の先頭、overview は dict の reportDatetime
+    '''
+    if isinstance(value, list):
+        value = value[0] if value else None
+    return value.get('reportDatetime') if isinstance(value, dict) else None
+
+
+class NationalForecast:
+    '''
+    行には office の概況を headline, overview の列として付ける
+    '''
+
+    def __init__(self, getter: HttpGetter, area_index: AreaIndex, *,
+                 overviews: Optional[OverviewStore] = None) -> None:
+        self.getter = getter
+        self.area_index = area_index
+        # 取得した概況を版として残す
+        self.overviews = overviews
+        self.reports: Dict[str, OfficeReport] = {}
+        # (class10 code, time) => Row
+        self.table: Dict[Tuple[str, datetime.datetime], Row] = {}
+        # office => その office の行の key
+        self.office_keys: Dict[str, List[Tuple[str, datetime.datetime]]] = {}
+
+    def get_offices(self, keys: Optional[Iterable[str]] = None) -> List[AreaNode]:
+        '''
+        keys が None なら全 office
+        '''
+        offices = self.area_index.level_maps[1]
+        if keys is None:
+            return list(offices.values())
+        return [offices[key] for key in keys if key in offices]
+
+    async def _get_async(self, url: str, use_cache: bool) -> Tuple[Any, Hashable]:
+        value = await self.getter.get_json_async(url, use_cache=use_cache)
+        return value, await self.getter.get_version_async(url)
+
+    async def _fetch_async(self, office: AreaNode, use_cache: bool) -> Optional[OfficeReport]:
+        forecast_url = jma.FORECAST_URL % {'office': office.key}
+        overview_url = jma.OVERVIEW_URL % {'office': office.key}
+        forecast, overview = await asyncio.gather(
+            self._get_async(forecast_url, use_cache),
+            self._get_async(overview_url, use_cache),
+            return_exceptions=True)
+        if isinstance(forecast, BaseException):
+            logger.warning('%s: %s', office.key, forecast)
+            return None
+        if isinstance(overview, BaseException):
+            logger.warning('%s: %s', office.key, overview)
+            overview = (None, None)
+        last = self.reports.get(office.key)
+        if last and last.overview_version == overview[1]:
+            overview_datetime = last.overview_datetime
+        else:
+            overview_datetime = report_datetime(overview[0])
+        if last and last.forecast_version == forecast[1]:
+            forecast_datetime = last.forecast_datetime
+        else:
+            forecast_datetime = report_datetime(forecast[0])
+        if last and last.forecast_datetime == forecast_datetime:
+            # 取り直しても発表が同じなら parse しない
+            return OfficeReport(last.forecast, overview[0], forecast[1], overview[1],
+                                forecast_datetime, overview_datetime)
+        parsed = await self.getter.loop.run_in_executor(None, Forecast, forecast[0])
+        return OfficeReport(parsed, overview[0], forecast[1], overview[1],
+                            forecast_datetime, overview_datetime)
+
+    async def refresh_async(self, keys: Optional[Iterable[str]] = None, *, use_cache=True) -> List[str]:
+        '''
+        並列に取得して、変わった office の行だけ作り直す。変わった office の key を返す。
+        use_cache なら ttl 内の cache は取得しない。古ければ conditional request で確かめる。
+        全 office で約 120 url。速さは getter の rate, burst で決まる
+        '''
+        offices = self.get_offices(keys)
+        reports = await asyncio.gather(*(self._fetch_async(office, use_cache) for office in offices))
+        changed = []
+        for office, report in zip(offices, reports):
+            if not report:
+                continue
+            last = self.reports.get(office.key)
+            self.reports[office.key] = report
+            overview_changed = not last or last.overview_datetime != report.overview_datetime
+            if self.overviews is not None and report.overview and overview_changed:
+                self.overviews.add(office.key, report.overview)
+            if not last or last.forecast is not report.forecast:
+                self._update(office.key, report.forecast)
+            elif overview_changed:
+                self._set_overview(office.key)
+            else:
+                continue
+            changed.append(office.key)
+        return changed
+
+    def _update(self, office: str, forecast: Forecast):
+        for key in self.office_keys.pop(office, []):
+            del self.table[key]
+        keys = []
+        # 天気と降水確率は class10。時刻の刻みが違うので同じ行にならないこともある
+        for series in (forecast.three_day, forecast.rain6):
+            for area in series.areas:
+                for i, time in enumerate(series.times):
+                    key = (area.area.code, time)
+                    row = self.table.get(key)
+                    if not row:
+                        row = Row(office, area.area.code, time, {})
+                        self.table[key] = row
+                        keys.append(key)
+                    for column, values in area.values.items():
+                        if i < len(values):
+                            row.values[column] = values[i]
+        self.office_keys[office] = keys
+        self._set_overview(office)
+
+    def _set_overview(self, office: str):
+        report = self.reports.get(office)
+        overview = report.overview if report else None
+        headline = overview.get('headlineText', '') if overview else ''
+        text = overview.get('text', '') if overview else ''
+        for key in self.office_keys.get(office, []):
+            values = self.table[key].values
+            values['headline'] = headline
+            values['overview'] = text
+
+    def rows(self) -> Iterator[Row]:
+        for key in sorted(self.table):
+            yield self.table[key]
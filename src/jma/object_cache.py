@@ -0,0 +1,54 @@
+from typing import Any, Hashable, NamedTuple, Optional
+import collections
+
+
+class CacheItem(NamedTuple):
+    version: Hashable
+    value: Any
+    size: int
+
+
+class ObjectCache:
+    '''
+    decode 済みの object を key(url) + version で保持する LRU。
+    size は decode 前の byte 数で勘定する。
+    '''
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024) -> None:
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.items: collections.OrderedDict[Hashable, CacheItem] = collections.OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def get(self, key: Hashable, version: Hashable) -> Optional[Any]:
+        item = self.items.get(key)
+        if item is None or item.version != version:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.items.move_to_end(key)
+        return item.value
+
+    def put(self, key: Hashable, version: Hashable, value: Any, size: int):
+        # 古い version は置き換える
+        self.discard(key)
+        if size > self.max_bytes:
+            return
+        self.items[key] = CacheItem(version, value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            _, evicted = self.items.popitem(last=False)
+            self.bytes -= evicted.size
+
+    def discard(self, key: Hashable):
+        item = self.items.pop(key, None)
+        if item:
+            self.bytes -= item.size
+
+    def clear(self):
+        self.items.clear()
+        self.bytes = 0
@@ -0,0 +1,233 @@
+'''
+府県天気概況(overview_forecast)を全 office 分集めて版毎に残し、全文検索する。
+
+版は (office, reportDatetime)。directory を指定すると office 毎の Archive に追記して、次回起動時に読み直す。
+
+日本語は単語に切れないので、文字 n-gram の転置索引にする。
+1 文字と 2 文字の gram の posting(文書 id の昇順)を積集合して候補を絞り、
+候補だけ本文に部分文字列があるかを確かめる。文書の追加は posting の末尾に足すだけ。
+'''
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set
+import array
+import asyncio
+import datetime
+import json
+import logging
+import pathlib
+import unicodedata
+import jma
+from .archive import Archive
+from .area_index import AreaIndex
+from .http_getter import HttpGetter
+
+logger = logging.getLogger(__name__)
+
+JST = datetime.timezone(datetime.timedelta(hours=9))
+
+
+class Bulletin(NamedTuple):
+    id: int
+    office: str
+    # JST
+    report_datetime: datetime.datetime
+    publishing_office: str
+    target_area: str
+    headline: str
+    text: str
+
+    @staticmethod
+    def from_json(id: int, office: str, data: dict) -> 'Bulletin':
+        return Bulletin(id, office, to_jst(data['reportDatetime']),
+                        data.get('publishingOffice', ''), data.get('targetArea', ''),
+                        data.get('headlineText', ''), data.get('text', ''))
+
+
+def to_jst(src: str) -> datetime.datetime:
+    return datetime.datetime.fromisoformat(src).astimezone(JST).replace(tzinfo=None)
+
+
+def hours_ago(hours: float, now: Optional[datetime.datetime] = None) -> datetime.datetime:
+    '''
+    JST
+    '''
+    return (now or datetime.datetime.now(JST).replace(tzinfo=None)) - datetime.timedelta(hours=hours)
+
+
+def normalize(text: str) -> str:
+    '''
+    全角英数を半角に揃えて空白と改行を除く
+    '''
+    return ''.join(unicodedata.normalize('NFKC', text).split())
+
+
+def grams(text: str, n: int) -> Set[str]:
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class NGramIndex:
+    def __init__(self, n: int = 2) -> None:
+        self.n = n
+        # gram => 文書 id の昇順
+        self.postings: Dict[str, array.array] = {}
+        # 文書 id => normalize した本文
+        self.texts: Dict[int, str] = {}
+
+    def add(self, id: int, text: str):
+        '''
+        id は前回より大きいこと
+        '''
+        text = normalize(text)
+        self.texts[id] = text
+        found: Set[str] = set()
+        for n in range(1, self.n + 1):
+            found |= grams(text, n)
+        for gram in found:
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = array.array('i')
+                self.postings[gram] = posting
+            posting.append(id)
+
+    def search(self, query: str) -> List[int]:
+        '''
+        query を含む文書 id の昇順
+        '''
+        query = normalize(query)
+        if not query:
+            return []
+        keys = grams(query, min(self.n, len(query)))
+        postings = []
+        for key in keys:
+            posting = self.postings.get(key)
+            if posting is None:
+                return []
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+        if len(query) <= self.n:
+            return sorted(candidates)
+        # gram が全部あっても並びが違うことがある
+        return sorted(i for i in candidates if query in self.texts[i])
+
+
+class OverviewStore:
+    def __init__(self, directory: Optional[pathlib.Path] = None, *, n: int = 2) -> None:
+        self.directory = directory
+        self.bulletins: List[Bulletin] = []
+        # office => reportDatetime => id
+        self.versions: Dict[str, Dict[datetime.datetime, int]] = {}
+        self.index = NGramIndex(n)
+        self.archives: Dict[str, Archive] = {}
+        if directory and directory.exists():
+            for path in sorted(directory.glob('*.jmaa')):
+                self._load(path.stem, self._get_archive(path.stem))
+
+    def _get_archive(self, office: str) -> Archive:
+        archive = self.archives.get(office)
+        if not archive:
+            assert self.directory
+            archive = Archive(self.directory / f'{office}.jmaa')
+            self.archives[office] = archive
+        return archive
+
+    def _load(self, office: str, archive: Archive):
+        for _, data in archive.items():
+            try:
+                self._add(office, json.loads(data))
+            except (ValueError, KeyError) as ex:
+                logger.warning(f'{archive.path}: {ex}')
+
+    def close(self):
+        for archive in self.archives.values():
+            archive.close()
+        self.archives.clear()
+
+    def __len__(self) -> int:
+        return len(self.bulletins)
+
+    def _add(self, office: str, data: dict) -> Optional[Bulletin]:
+        report_datetime = to_jst(data['reportDatetime'])
+        versions = self.versions.setdefault(office, {})
+        if report_datetime in versions:
+            return None
+        bulletin = Bulletin.from_json(len(self.bulletins), office, data)
+        self.bulletins.append(bulletin)
+        versions[report_datetime] = bulletin.id
+        self.index.add(bulletin.id, '\n'.join((bulletin.target_area, bulletin.headline, bulletin.text)))
+        return bulletin
+
+    def add(self, office: str, data: dict) -> Optional[Bulletin]:
+        '''
+        新しい版なら追加して返す
+        '''
+        bulletin = self._add(office, data)
+        if bulletin and self.directory:
+            self._get_archive(office).append(
+                bulletin.report_datetime, json.dumps(data, ensure_ascii=False).encode('utf-8'))
+        return bulletin
+
+    def latest(self, office: str) -> Optional[Bulletin]:
+        versions = self.versions.get(office)
+        if not versions:
+            return None
+        return self.bulletins[versions[max(versions)]]
+
+    def history(self, office: str) -> List[Bulletin]:
+        '''
+        新しい順
+        '''
+        versions = self.versions.get(office, {})
+        return [self.bulletins[versions[key]] for key in sorted(versions, reverse=True)]
+
+    def search(self, query: str, *, since: Optional[datetime.datetime] = None,
+               offices: Optional[Iterable[str]] = None) -> List[Bulletin]:
+        '''
+        query を含む版を新しい順に。since は JST
+        '''
+        office_set = set(offices) if offices is not None else None
+        found = []
+        for i in self.index.search(query):
+            bulletin = self.bulletins[i]
+            if since and bulletin.report_datetime < since:
+                continue
+            if office_set is not None and bulletin.office not in office_set:
+                continue
+            found.append(bulletin)
+        found.sort(key=lambda bulletin: bulletin.report_datetime, reverse=True)
+        return found
+
+    async def refresh_async(self, getter: HttpGetter, area_index: AreaIndex,
+                            keys: Optional[Iterable[str]] = None) -> List[Bulletin]:
+        '''
+        office(keys が None なら全部)の概況を並列に取得して、新しい版を返す
+        '''
+        offices = area_index.level_maps[1]
+        office_keys = list(offices) if keys is None else [key for key in keys if key in offices]
+        results = await asyncio.gather(*(
+            getter.get_json_async(jma.OVERVIEW_URL % {'office': key}, use_cache=False)
+            for key in office_keys), return_exceptions=True)
+        added = []
+        for key, data in zip(office_keys, results):
+            if isinstance(data, BaseException):
+                logger.warning(f'{key}: {data}')
+                continue
+            bulletin = self.add(key, data)
+            if bulletin:
+                added.append(bulletin)
+        return added
+
+    def offices_mentioning(self, query: str, *, hours: Optional[float] = None,
+                           now: Optional[datetime.datetime] = None) -> Iterator[str]:
+        '''
+        直近 hours 時間に query を含む版を出した office
+        '''
+        since = hours_ago(hours, now) if hours is not None else None
+        seen: Set[str] = set()
+        for bulletin in self.search(query, since=since):
+            if bulletin.office not in seen:
+                seen.add(bulletin.office)
+                yield bulletin.office
@@ -0,0 +1,247 @@
+'''
+GUI 無しで endpoint を周期的に取得して、前回からの差分だけを出力する。
+
+各 endpoint は interval 毎、気象庁の更新時刻に合わせた offset 秒後に取得する。
+出力は 1 行 1 event の JSON(stdout または localhost の TCP)。
+
+amedas は station 毎に変わった要素の前後の値を出す。
+10 分毎にほぼ全 station の値が変わるので、1 回に 1000 件以上になる。
+thresholds を渡すと、観測している要素の増減と閾値(AMEDAS_THRESHOLDS など)を跨いだときだけ出す。
+'''
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterator, List, NamedTuple, Optional, Set, Tuple
+import asyncio
+import bisect
+import datetime
+import functools
+import json
+import logging
+import sys
+import time
+import jma
+from .http_getter import HttpGetter
+
+logger = logging.getLogger(__name__)
+
+
+class Event(NamedTuple):
+    endpoint: str
+    url: str
+    key: str
+    # added, removed, changed。amedas の thresholds 指定時は elements, threshold
+    change: str
+    value: Any
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'endpoint': self.endpoint, 'url': self.url, 'time': datetime.datetime.now().astimezone().isoformat(),
+            'key': self.key, 'change': self.change, 'value': self.value,
+        }, ensure_ascii=False)
+
+
+def diff(old: Optional[dict], new: dict) -> Iterator[tuple]:
+    '''
+    top level の key 毎に比べる。list は index を key にする
+    '''
+    if isinstance(new, list):
+        new = {str(i): v for i, v in enumerate(new)}
+    if isinstance(old, list):
+        old = {str(i): v for i, v in enumerate(old)}
+    old = old or {}
+    for k, v in new.items():
+        if k not in old:
+            yield k, 'added', v
+        elif old[k] != v:
+            yield k, 'changed', v
+    for k, v in old.items():
+        if k not in new:
+            yield k, 'removed', None
+
+
+# 要素 => 閾値の例。値がどの区間にあるかが変わったら event にする
+AMEDAS_THRESHOLDS: Dict[str, List[float]] = {
+    'temp': [0.0, 25.0, 30.0, 35.0],
+    'precipitation1h': [1.0, 10.0, 30.0, 50.0],
+    'wind': [10.0, 15.0, 20.0],
+    'snow1h': [1.0, 3.0, 5.0],
+}
+
+
+def _valid(pair: Any) -> Optional[float]:
+    # [値, 品質 flag]。品質が 0 のものだけ
+    if isinstance(pair, list) and len(pair) == 2 and pair[0] is not None and pair[1] == 0:
+        return pair[0]
+    return None
+
+
+def diff_amedas(old: Optional[dict], new: dict,
+                thresholds: Optional[Dict[str, List[float]]] = None) -> Iterator[tuple]:
+    '''
+    station の増減と、station 毎に変わった要素の {要素: {'old': [値, 品質], 'new': [値, 品質]}}(changed)。
+
+    thresholds があれば changed の代わりに、観測している要素の増減(elements)と
+    閾値を跨いだ要素(threshold)だけ
+    '''
+    old = old or {}
+    for code, elems in new.items():
+        last = old.get(code)
+        if last is None:
+            yield code, 'added', elems
+            continue
+        if thresholds is None:
+            changed = {name: {'old': last.get(name), 'new': elems.get(name)}
+                       for name in {**last, **elems} if last.get(name) != elems.get(name)}
+            if changed:
+                yield code, 'changed', changed
+            continue
+        names = {name for name, pair in elems.items() if _valid(pair) is not None}
+        last_names = {name for name, pair in last.items() if _valid(pair) is not None}
+        if names != last_names:
+            yield code, 'elements', {'added': sorted(names - last_names), 'removed': sorted(last_names - names)}
+        for name, bounds in thresholds.items():
+            value = _valid(elems.get(name))
+            previous = _valid(last.get(name))
+            if value is None or previous is None:
+                continue
+            if bisect.bisect_right(bounds, value) != bisect.bisect_right(bounds, previous):
+                yield code, 'threshold', {'element': name, 'value': value, 'previous': previous}
+    for code in old:
+        if code not in new:
+            yield code, 'removed', None
+
+
+class Endpoint:
+    def __init__(self, name: str, interval: float, offset: float,
+                 get_url: Callable[[HttpGetter], Awaitable[str]], *,
+                 diff: Callable[[Any, Any], Iterator[tuple]] = diff) -> None:
+        self.name = name
+        self.interval = interval
+        self.offset = offset
+        self.get_url = get_url
+        self.diff = diff
+        self.last: Any = None
+        # (url, cache の版)
+        self.last_version: Optional[Tuple[str, Hashable]] = None
+
+    def next_time(self, now: float) -> float:
+        '''
+        interval の境界 + offset。JST で揃える
+        '''
+        jst = now + 9 * 60 * 60
+        base = jst - jst % self.interval + self.offset
+        if base <= jst:
+            base += self.interval
+        return base - 9 * 60 * 60
+
+    async def poll_async(self, getter: HttpGetter) -> List[Event]:
+        url = await self.get_url(getter)
+        data = await getter.get_json_async(url, use_cache=False)
+        version = (url, await getter.get_version_async(url))
+        if version == self.last_version:
+            # 304 で body が変わっていない
+            return []
+        events = [Event(self.name, url, k, change, v)
+                  for k, change, v in self.diff(self.last, data)]
+        self.last = data
+        self.last_version = version
+        return events
+
+
+def static_url(url: str) -> Callable[[HttpGetter], Awaitable[str]]:
+    async def get_url(getter: HttpGetter) -> str:
+        return url
+    return get_url
+
+
+async def get_amedas_url(getter: HttpGetter) -> str:
+    latest = await getter.get_async(jma.AMEDAS_LATEST_URL, use_cache=False)
+    latest_time = datetime.datetime.fromisoformat(latest.decode('ascii').strip())
+    return jma.AMEDAS_MAP_URL % {'time': latest_time.strftime(jma.DATE_FORMAT)}
+
+
+def create_endpoints(offices: List[str], *,
+                     amedas_thresholds: Optional[Dict[str, List[float]]] = None) -> List[Endpoint]:
+    endpoints = [
+        # 10 分毎。観測値は 4 分くらい遅れて出る
+        Endpoint('amedas', 10 * 60, 4 * 60, get_amedas_url,
+                 diff=functools.partial(diff_amedas, thresholds=amedas_thresholds)),
+        Endpoint('himawari_times', 10 * 60, 2 * 60, static_url(jma.HIMAWARI_TIMES_URL)),
+    ]
+    for office in offices:
+        # 定時は 5, 11, 17 時だが随時更新もあるので毎時
+        endpoints.append(Endpoint(f'forecast/{office}', 60 * 60, 60,
+                                  static_url(jma.FORECAST_URL % {'office': office})))
+        endpoints.append(Endpoint(f'overview/{office}', 60 * 60, 60,
+                                  static_url(jma.OVERVIEW_URL % {'office': office})))
+    return endpoints
+
+
+class StdoutSink:
+    async def send_async(self, line: str):
+        sys.stdout.write(line + '\n')
+        sys.stdout.flush()
+
+    async def start_async(self):
+        pass
+
+
+class SocketSink:
+    '''
+    接続してきた client 全部に流す。
+    timeout 秒以内に送信 buffer が捌けない client は切る
+    '''
+
+    def __init__(self, port: int, host: str = '127.0.0.1', *, timeout: float = 10.0) -> None:
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.writers: Set[asyncio.StreamWriter] = set()
+
+    async def start_async(self):
+        async def on_connect(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            self.writers.add(writer)
+            await reader.read()
+            self.writers.discard(writer)
+            writer.close()
+        self.server = await asyncio.start_server(on_connect, self.host, self.port)
+        logger.info('listen %s:%s', self.host, self.port)
+
+    async def _drain_async(self, writer: asyncio.StreamWriter):
+        try:
+            await asyncio.wait_for(writer.drain(), self.timeout)
+        except (asyncio.TimeoutError, ConnectionError) as ex:
+            logger.warning('%s: %r, disconnect', writer.get_extra_info('peername'), ex)
+            self.writers.discard(writer)
+            writer.close()
+
+    async def send_async(self, line: str):
+        data = (line + '\n').encode('utf-8')
+        writers = []
+        for writer in list(self.writers):
+            if writer.is_closing():
+                self.writers.discard(writer)
+                continue
+            writer.write(data)
+            writers.append(writer)
+        await asyncio.gather(*(self._drain_async(writer) for writer in writers))
+
+
+async def run_async(getter: HttpGetter, endpoints: List[Endpoint], sink):
+    await sink.start_async()
+
+    async def run_endpoint(endpoint: Endpoint):
+        # 起動時に一度取って基準にする。差分は出さない
+        initial = True
+        while True:
+            try:
+                events = await endpoint.poll_async(getter)
+                if not initial:
+                    for event in events:
+                        await sink.send_async(event.to_json())
+                logger.info('%s: %d changes', endpoint.name, len(events))
+                initial = False
+            except Exception as ex:
+                logger.warning('%s: %s', endpoint.name, ex)
+            now = time.time()
+            await asyncio.sleep(endpoint.next_time(now) - now)
+
+    await asyncio.gather(*(run_endpoint(endpoint) for endpoint in endpoints))
@@ -0,0 +1,205 @@
+'''
+area.json と amedastable.json から作った索引の binary snapshot。
+
+layout(little endian)
+
+* header: MAGIC, VERSION, area.json の sha256, amedastable.json の sha256
+* string table: 個数, 各 byte 長(uint32 array), utf-8 blob
+* area: node 数, key, name(string index), level(uint8), parent(int32, 先行順の index)
+* stations: station 数, code, kj, kn, en, type, elems(string index), lat, lon(double), alt(float)
+
+元の JSON の hash が変わったら作り直す。
+'''
+from typing import List, Dict, Optional, Tuple
+import array
+import hashlib
+import json
+import logging
+import pathlib
+import struct
+import sys
+from .area_index import AreaIndex, AreaNode
+from .stations import StationTable
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'JMAS'
+VERSION = 1
+HEADER = struct.Struct('<4sI32s32s')
+COUNT = struct.Struct('<I')
+
+
+def hash_source(data: bytes) -> bytes:
+    return hashlib.sha256(data).digest()
+
+
+class _Writer:
+    def __init__(self) -> None:
+        self.strings: List[str] = []
+        self.string_map: Dict[str, int] = {}
+        self.chunks: List[bytes] = []
+
+    def intern(self, value: str) -> int:
+        i = self.string_map.get(value)
+        if i is None:
+            i = len(self.strings)
+            self.strings.append(value)
+            self.string_map[value] = i
+        return i
+
+    def strings_array(self, values: List[str]) -> array.array:
+        return array.array('I', [self.intern(value) for value in values])
+
+    def push_count(self, count: int):
+        self.chunks.append(COUNT.pack(count))
+
+    def push_array(self, values: array.array):
+        if sys.byteorder != 'little':
+            values = array.array(values.typecode, values)
+            values.byteswap()
+        self.chunks.append(values.tobytes())
+
+    def string_table(self) -> bytes:
+        encoded = [value.encode('utf-8') for value in self.strings]
+        lengths = array.array('I', [len(value) for value in encoded])
+        if sys.byteorder != 'little':
+            lengths.byteswap()
+        return COUNT.pack(len(encoded)) + lengths.tobytes() + b''.join(encoded)
+
+
+class _Reader:
+    def __init__(self, data: bytes, pos: int) -> None:
+        self.data = memoryview(data)
+        self.pos = pos
+        self.strings: List[str] = []
+
+    def count(self) -> int:
+        value, = COUNT.unpack_from(self.data, self.pos)
+        self.pos += COUNT.size
+        return value
+
+    def array(self, typecode: str, count: int) -> array.array:
+        values = array.array(typecode)
+        size = values.itemsize * count
+        if self.pos + size > len(self.data):
+            # 途中で切れている
+            raise EOFError(f'{size} bytes at {self.pos}')
+        values.frombytes(self.data[self.pos:self.pos + size])
+        if sys.byteorder != 'little':
+            values.byteswap()
+        self.pos += size
+        return values
+
+    def string_table(self):
+        lengths = self.array('I', self.count())
+        size = sum(lengths)
+        if self.pos + size > len(self.data):
+            raise EOFError(f'{size} bytes at {self.pos}')
+        blob = bytes(self.data[self.pos:self.pos + size])
+        self.pos += len(blob)
+        pos = 0
+        for length in lengths:
+            self.strings.append(blob[pos:pos + length].decode('utf-8'))
+            pos += length
+
+    def string_list(self, count: int) -> List[str]:
+        strings = self.strings
+        indices = self.array('I', count)
+        if indices and max(indices) >= len(strings):
+            raise ValueError(f'string index {max(indices)} >= {len(strings)}')
+        return [strings[i] for i in indices]
+
+
+def dumps(area_hash: bytes, stable_hash: bytes, area: AreaIndex, stations: StationTable) -> bytes:
+    w = _Writer()
+
+    nodes = area.nodes
+    w.push_count(len(nodes))
+    w.push_array(w.strings_array([node.key for node in nodes]))
+    w.push_array(w.strings_array([node.name for node in nodes]))
+    w.push_array(array.array('B', [node.level for node in nodes]))
+    w.push_array(array.array(
+        'i', [node.parent.index if node.parent else -1 for node in nodes]))
+
+    w.push_count(len(stations))
+    for values in (stations.codes, stations.kj_names, stations.kn_names,
+                   stations.en_names, stations.types, stations.elems):
+        w.push_array(w.strings_array(values))
+    w.push_array(stations.lat)
+    w.push_array(stations.lon)
+    w.push_array(stations.alt)
+
+    header = HEADER.pack(MAGIC, VERSION, area_hash, stable_hash)
+    return header + w.string_table() + b''.join(w.chunks)
+
+
+def loads(data: bytes, area_hash: bytes, stable_hash: bytes) -> Optional[Tuple[AreaIndex, StationTable]]:
+    '''
+    hash が一致しないときは None
+    '''
+    if len(data) < HEADER.size:
+        return None
+    magic, version, snapshot_area_hash, snapshot_stable_hash = HEADER.unpack_from(
+        data, 0)
+    if magic != MAGIC or version != VERSION:
+        return None
+    if snapshot_area_hash != area_hash or snapshot_stable_hash != stable_hash:
+        return None
+
+    r = _Reader(data, HEADER.size)
+    r.string_table()
+
+    count = r.count()
+    keys = r.string_list(count)
+    names = r.string_list(count)
+    levels = r.array('B', count)
+    parents = r.array('i', count)
+    nodes = [AreaNode(key, name, level)
+             for key, name, level in zip(keys, names, levels)]
+    for node, parent in zip(nodes, parents):
+        if parent >= 0:
+            # 先行順なので children の順番も保たれる
+            node.parent = nodes[parent]
+            nodes[parent].children.append(node)
+    area = AreaIndex.from_nodes(nodes)
+
+    count = r.count()
+    stations = StationTable()
+    stations.codes = r.string_list(count)
+    stations.kj_names = r.string_list(count)
+    stations.kn_names = r.string_list(count)
+    stations.en_names = r.string_list(count)
+    stations.types = r.string_list(count)
+    stations.elems = r.string_list(count)
+    stations.lat = r.array('d', count)
+    stations.lon = r.array('d', count)
+    stations.alt = r.array('f', count)
+    stations.update_code_map()
+
+    return area, stations
+
+
+def load_or_build(path: pathlib.Path, area_data: bytes, stable_data: bytes) -> Tuple[AreaIndex, StationTable]:
+    '''
+    snapshot が古ければ JSON から作り直して保存する
+    '''
+    area_hash = hash_source(area_data)
+    stable_hash = hash_source(stable_data)
+    if path.exists():
+        try:
+            loaded = loads(path.read_bytes(), area_hash, stable_hash)
+        except (struct.error, ValueError, EOFError) as ex:
+            # 壊れた snapshot は作り直す。読めないなどはそのまま上げる
+            logger.warning('%s: %r', path, ex)
+            loaded = None
+        if loaded:
+            return loaded
+
+    logger.info('build %s ...', path)
+    area = AreaIndex(json.loads(area_data))
+    stations = StationTable.from_json(json.loads(stable_data))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_bytes(dumps(area_hash, stable_hash, area, stations))
+    tmp.replace(path)
+    return area, stations
@@ -0,0 +1,202 @@
+'''
+amedas 観測地点の空間索引。
+
+緯度経度の格子(cell 度)に station を振り分けて、近傍だけ距離を計算する。
+大量の点をまとめて引くときは単位球上のベクトルの内積を chunk 毎に行列で計算する。
+'''
+from typing import Dict, List, Optional, Tuple
+import collections
+import math
+import numpy as np
+from .area_index import AreaIndex, AreaNode
+from .stations import StationTable
+
+EARTH_RADIUS_KM = 6371.0
+# 緯度 1 度の長さ
+DEGREE_KM = math.pi * EARTH_RADIUS_KM / 180
+
+
+def to_xyz(lat, lon) -> np.ndarray:
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def chord_to_km(chord: np.ndarray) -> np.ndarray:
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0, 1))
+
+
+class StationIndex:
+    def __init__(self, stations: StationTable, *, cell: float = 0.5) -> None:
+        self.stations = stations
+        self.cell = cell
+        self.lat = np.asarray(stations.lat, dtype=np.float64)
+        self.lon = np.asarray(stations.lon, dtype=np.float64)
+        self.xyz = to_xyz(self.lat, self.lon)
+
+        iy = np.floor(self.lat / cell).astype(np.int32)
+        ix = np.floor(self.lon / cell).astype(np.int32)
+        self.buckets: Dict[Tuple[int, int], np.ndarray] = {}
+        order = np.lexsort((ix, iy))
+        keys = np.stack([iy[order], ix[order]], axis=1)
+        if len(order):
+            starts = np.flatnonzero(np.any(np.diff(keys, axis=0) != 0, axis=1)) + 1
+            for group in np.split(order, starts):
+                self.buckets[(int(iy[group[0]]), int(ix[group[0]]))] = group
+            self.extent = (int(iy.min()), int(iy.max()), int(ix.min()), int(ix.max()))
+        else:
+            self.extent = (0, 0, 0, 0)
+
+    def distance_km(self, lat: float, lon: float, indices: np.ndarray) -> np.ndarray:
+        return chord_to_km(np.linalg.norm(self.xyz[indices] - to_xyz(lat, lon), axis=-1))
+
+    def _ring(self, cy: int, cx: int, r: int) -> List[np.ndarray]:
+        found = []
+        for y in range(cy - r, cy + r + 1):
+            if r == 0 or y in (cy - r, cy + r):
+                xs = range(cx - r, cx + r + 1)
+            else:
+                xs = (cx - r, cx + r)
+            for x in xs:
+                bucket = self.buckets.get((y, x))
+                if bucket is not None:
+                    found.append(bucket)
+        return found
+
+    def nearest(self, lat: float, lon: float, n: int = 1) -> List[Tuple[int, float]]:
+        '''
+        近い順に (station index, km)
+        '''
+        n = min(n, len(self.stations))
+        if n <= 0:
+            return []
+        cy = math.floor(lat / self.cell)
+        cx = math.floor(lon / self.cell)
+        y0, y1, x0, x1 = self.extent
+        # これより外には station が無い
+        max_ring = max(abs(cy - y0), abs(cy - y1), abs(cx - x0), abs(cx - x1))
+        candidates: List[np.ndarray] = []
+        count = 0
+        r = 0
+        while r <= max_ring:
+            ring = self._ring(cy, cx, r)
+            candidates += ring
+            count += sum(len(bucket) for bucket in ring)
+            if count >= n:
+                indices = np.concatenate(candidates)
+                distances = self.distance_km(lat, lon, indices)
+                nth = np.partition(distances, n - 1)[n - 1]
+                # 次の ring までの最短距離(経度方向は高緯度ほど短い)
+                lat_edge = min(89.0, abs(lat) + (r + 1) * self.cell)
+                bound = r * self.cell * DEGREE_KM * math.cos(math.radians(lat_edge))
+                if nth <= bound:
+                    break
+            r += 1
+        indices = np.concatenate(candidates)
+        distances = self.distance_km(lat, lon, indices)
+        order = np.argsort(distances, kind='stable')[:n]
+        return [(int(indices[i]), float(distances[i])) for i in order]
+
+    def radius(self, lat: float, lon: float, km: float) -> List[Tuple[int, float]]:
+        cy = math.floor(lat / self.cell)
+        cx = math.floor(lon / self.cell)
+        ry = math.ceil(km / DEGREE_KM / self.cell)
+        lat_edge = min(89.0, abs(lat) + (ry + 1) * self.cell)
+        rx = math.ceil(km / (DEGREE_KM * math.cos(math.radians(lat_edge))) / self.cell)
+        # 覆う cell の範囲だけ引く。station の範囲外は空
+        y0, y1, x0, x1 = self.extent
+        ys = range(max(cy - ry, y0), min(cy + ry, y1) + 1)
+        xs = range(max(cx - rx, x0), min(cx + rx, x1) + 1)
+        if len(ys) * len(xs) <= len(self.buckets):
+            candidates = [self.buckets[key] for key in ((y, x) for y in ys for x in xs)
+                          if key in self.buckets]
+        else:
+            # 半径が広すぎるときは bucket を舐めたほうが早い
+            candidates = [bucket for (y, x), bucket in self.buckets.items()
+                          if y in ys and x in xs]
+        if not candidates:
+            return []
+        indices = np.concatenate(candidates)
+        distances = self.distance_km(lat, lon, indices)
+        inside = np.flatnonzero(distances <= km)
+        inside = inside[np.argsort(distances[inside], kind='stable')]
+        return [(int(indices[i]), float(distances[i])) for i in inside]
+
+    def bbox(self, lat0: float, lon0: float, lat1: float, lon1: float) -> np.ndarray:
+        mask = (self.lat >= lat0) & (self.lat <= lat1) & (
+            self.lon >= lon0) & (self.lon <= lon1)
+        return np.flatnonzero(mask)
+
+    def nearest_batch(self, lats, lons, n: int = 1, *, chunk: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+        '''
+        (points, n) の station index と km
+        '''
+        points = to_xyz(lats, lons).reshape(-1, 3)
+        n = min(n, len(self.stations))
+        indices = np.empty((len(points), n), dtype=np.int32)
+        distances = np.empty((len(points), n), dtype=np.float64)
+        for start in range(0, len(points), chunk):
+            # 内積が大きいほど近い
+            dots = points[start:start + chunk] @ self.xyz.T
+            if n < dots.shape[1]:
+                top = np.argpartition(-dots, n - 1, axis=1)[:, :n]
+            else:
+                top = np.broadcast_to(np.arange(dots.shape[1]), (len(dots), dots.shape[1]))
+            top_dots = np.take_along_axis(dots, top, axis=1)
+            order = np.argsort(-top_dots, axis=1, kind='stable')
+            indices[start:start + chunk] = np.take_along_axis(top, order, axis=1)
+            top_dots = np.take_along_axis(top_dots, order, axis=1)
+            distances[start:start + chunk] = EARTH_RADIUS_KM * \
+                np.arccos(np.clip(top_dots, -1, 1))
+        return indices, distances
+
+
+# 市町村名の末尾
+MUNICIPALITY_SUFFIXES = ('', '市', '町', '村', '区')
+
+
+def map_to_areas(stations: StationTable, area_index: AreaIndex) -> Tuple[List[Optional[AreaNode]], List[Optional[AreaNode]]]:
+    '''
+    station => (class20, office)
+
+    amedastable.json には area code が無いので、
+    地点名が class20 の名前(+市町村区)と一致するものを class20 とする。
+    同名が複数あるときや一致しないときは、station code の上 2 桁(府県)が同じ station の
+    多数決で office を決めて、その office 内で選ぶ。
+    '''
+    class20_by_name: Dict[str, List[AreaNode]] = collections.defaultdict(list)
+    for node in area_index.level_maps[4].values():
+        class20_by_name[node.name].append(node)
+
+    candidates: List[List[AreaNode]] = []
+    for name in stations.kj_names:
+        found: List[AreaNode] = []
+        for suffix in MUNICIPALITY_SUFFIXES:
+            found += class20_by_name.get(name + suffix, [])
+        candidates.append(found)
+
+    # 府県毎の office 多数決
+    votes: Dict[str, collections.Counter] = collections.defaultdict(collections.Counter)
+    for code, found in zip(stations.codes, candidates):
+        if len(found) == 1:
+            office = area_index.office_of(found[0])
+            if office:
+                votes[code[:2]][office.key] += 1
+    prefix_office: Dict[str, AreaNode] = {}
+    for prefix, counter in votes.items():
+        office_key, _ = counter.most_common(1)[0]
+        office = area_index.get(office_key, 'offices')
+        if office:
+            prefix_office[prefix] = office
+
+    class20s: List[Optional[AreaNode]] = []
+    offices: List[Optional[AreaNode]] = []
+    for code, found in zip(stations.codes, candidates):
+        office = prefix_office.get(code[:2])
+        if len(found) > 1 and office:
+            found = [node for node in found if area_index.office_of(node) is office] or found
+        class20 = found[0] if len(found) == 1 else None
+        class20s.append(class20)
+        offices.append(area_index.office_of(class20) if class20 else office)
+    return class20s, offices
@@ -0,0 +1,73 @@
+from typing import List, Dict, Optional, NamedTuple
+import array
+
+
+class Station(NamedTuple):
+    code: str
+    kj_name: str
+    kn_name: str
+    en_name: str
+    type: str
+    elems: str
+    lat: float
+    lon: float
+    alt: float
+
+
+def to_degree(src) -> float:
+    # [度, 分]
+    return src[0] + src[1] / 60
+
+
+class StationTable:
+    '''
+    amedastable.json を列毎に持つ。
+    codes の並びが station index になる。
+    '''
+
+    def __init__(self) -> None:
+        self.codes: List[str] = []
+        self.kj_names: List[str] = []
+        self.kn_names: List[str] = []
+        self.en_names: List[str] = []
+        self.types: List[str] = []
+        self.elems: List[str] = []
+        self.lat = array.array('d')
+        self.lon = array.array('d')
+        self.alt = array.array('f')
+        self.code_map: Dict[str, int] = {}
+
+    @staticmethod
+    def from_json(stable: dict) -> 'StationTable':
+        table = StationTable()
+        for code, v in stable.items():
+            table.codes.append(code)
+            table.kj_names.append(v['kjName'])
+            table.kn_names.append(v['knName'])
+            table.en_names.append(v['enName'])
+            table.types.append(v['type'])
+            table.elems.append(v['elems'])
+            table.lat.append(to_degree(v['lat']))
+            table.lon.append(to_degree(v['lon']))
+            table.alt.append(v['alt'])
+        table.update_code_map()
+        return table
+
+    def update_code_map(self):
+        self.code_map = {code: i for i, code in enumerate(self.codes)}
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, i: int) -> Station:
+        return Station(self.codes[i], self.kj_names[i], self.kn_names[i], self.en_names[i],
+                       self.types[i], self.elems[i], self.lat[i], self.lon[i], self.alt[i])
+
+    def index_of(self, code: str) -> Optional[int]:
+        return self.code_map.get(code)
+
+    def get(self, code: str) -> Optional[Station]:
+        i = self.code_map.get(code)
+        if i is None:
+            return None
+        return self[i]
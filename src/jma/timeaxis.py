@@ -0,0 +1,242 @@
+'''
+気象庁の時刻文字列をまとめて numpy の datetime64[s] にする。
+
+* basetime, validtime, amedas の map: yyyymmddHHMMSS(14 文字。整数にしたものも可)
+* forecast, overview: 2022-02-12T05:00:00+09:00
+
+datetime64 は timezone を持たないので、ISO 形式は utc_offset 時間の wall clock に揃える(既定は JST)。
+yyyymmddHHMMSS は書いてあるまま(ひまわりは UTC、amedas は JST)。
+
+datetime を 1 つずつ作らずに、文字を uint8 の (n, 文字数) 配列として桁毎に計算する。
+'''
+from typing import List, Optional, Sequence, Tuple, Union
+import datetime
+import numpy as np
+
+JST_HOURS = 9
+DTYPE = 'datetime64[s]'
+
+COMPACT_LENGTH = 14
+# (year, month, day, hour, minute, second) の開始位置と桁数
+COMPACT_FIELDS = ((0, 4), (4, 2), (6, 2), (8, 2), (10, 2), (12, 2))
+ISO_FIELDS = ((0, 4), (5, 2), (8, 2), (11, 2), (14, 2), (17, 2))
+ISO_SEPARATORS = ((4, b'-'), (7, b'-'), (10, b'T'), (13, b':'), (16, b':'))
+# 2022-02-12T05:00:00
+ISO_LENGTH = 19
+# 2022-02-12T05:00:00+09:00
+ISO_OFFSET_LENGTH = 25
+
+TimeLike = Union[datetime.datetime, np.datetime64, str]
+
+
+def _to_chars(values, width: int) -> np.ndarray:
+    '''
+    (n, width) の uint8
+    '''
+    chars = np.asarray(values, dtype=f'S{width}')
+    return chars.reshape(-1).view(np.uint8).reshape(-1, width)
+
+
+def _number(chars: np.ndarray, start: int, count: int) -> np.ndarray:
+    digits = chars[:, start:start + count].astype(np.int64) - ord('0')
+    value = np.zeros(len(chars), dtype=np.int64)
+    for i in range(count):
+        value = value * 10 + digits[:, i]
+    return value
+
+
+def _compose(year: np.ndarray, month: np.ndarray, day: np.ndarray,
+             hour: np.ndarray, minute: np.ndarray, second: np.ndarray, values) -> np.ndarray:
+    invalid = (month < 1) | (month > 12) | (day < 1) | (hour > 23) | (minute > 59) | (second > 59)
+    months = (year - 1970) * 12 + (month - 1)
+    month_start = months.astype('datetime64[M]')
+    days = month_start.astype('datetime64[D]') + (day - 1).astype('timedelta64[D]')
+    # 2/30 などは翌月になる
+    invalid |= days.astype('datetime64[M]') != month_start
+    if invalid.any():
+        raise ValueError(f'invalid time: {np.asarray(values).reshape(-1)[np.argmax(invalid)]}')
+    return days.astype(DTYPE) + (hour * 3600 + minute * 60 + second).astype('timedelta64[s]')
+
+
+def _check_digits(chars: np.ndarray, columns: Sequence[int], values):
+    if not len(chars):
+        return
+    digits = chars[:, list(columns)]
+    invalid = ((digits < ord('0')) | (digits > ord('9'))).any(axis=1)
+    if invalid.any():
+        raise ValueError(f'invalid time: {np.asarray(values).reshape(-1)[np.argmax(invalid)]}')
+
+
+def parse_compact(values) -> np.ndarray:
+    '''
+    yyyymmddHHMMSS の文字列か整数の並び => datetime64[s]
+    '''
+    array = np.asarray(values)
+    if array.dtype.kind in 'iu':
+        keys = array.reshape(-1).astype(np.int64)
+        keys, second = np.divmod(keys, 100)
+        keys, minute = np.divmod(keys, 100)
+        keys, hour = np.divmod(keys, 100)
+        keys, day = np.divmod(keys, 100)
+        year, month = np.divmod(keys, 100)
+        return _compose(year, month, day, hour, minute, second, array)
+
+    chars = _to_chars(array, COMPACT_LENGTH)
+    lengths = np.char.str_len(array.astype(f'S{COMPACT_LENGTH + 1}')).reshape(-1)
+    if (lengths != COMPACT_LENGTH).any():
+        raise ValueError(f'invalid time: {array.reshape(-1)[np.argmax(lengths != COMPACT_LENGTH)]}')
+    _check_digits(chars, range(COMPACT_LENGTH), array)
+    return _compose(*(_number(chars, start, count) for start, count in COMPACT_FIELDS), array)
+
+
+def parse_iso(values, *, utc_offset: Optional[float] = JST_HOURS) -> np.ndarray:
+    '''
+    2022-02-12T05:00:00+09:00 の並び => utc_offset 時間の wall clock の datetime64[s]
+
+    offset の無いものはそのまま。utc_offset が None なら offset を無視して書いてあるまま
+    '''
+    array = np.asarray(values)
+    chars = _to_chars(array, ISO_OFFSET_LENGTH)
+    _check_digits(chars, [start + i for start, count in ISO_FIELDS for i in range(count)], array)
+    for position, separator in ISO_SEPARATORS:
+        invalid = chars[:, position] != separator[0]
+        if invalid.any():
+            raise ValueError(f'invalid time: {array.reshape(-1)[np.argmax(invalid)]}')
+    times = _compose(*(_number(chars, start, count) for start, count in ISO_FIELDS), array)
+    if utc_offset is None:
+        return times
+
+    # +09:00, -05:00, Z, 無し
+    sign_char = chars[:, ISO_LENGTH]
+    has_offset = (sign_char == ord('+')) | (sign_char == ord('-'))
+    if has_offset.any():
+        _check_digits(chars[has_offset], (20, 21, 23, 24), array.reshape(-1)[has_offset])
+    sign = np.where(sign_char == ord('-'), -1, 1)
+    offset_minutes = np.where(
+        has_offset, sign * (_number(chars, 20, 2) * 60 + _number(chars, 23, 2)), 0)
+    target_minutes = np.where(
+        has_offset | (sign_char == ord('Z')), int(utc_offset * 60), offset_minutes)
+    return times + (target_minutes - offset_minutes).astype('timedelta64[m]')
+
+
+def parse(values, *, utc_offset: Optional[float] = JST_HOURS) -> np.ndarray:
+    '''
+    yyyymmddHHMMSS と ISO 形式が混ざっていてもよい
+    '''
+    array = np.asarray(values)
+    if array.dtype.kind in 'iu':
+        return parse_compact(array)
+    flat = array.astype(f'S{ISO_OFFSET_LENGTH + 1}').reshape(-1)
+    compact = np.char.str_len(flat) == COMPACT_LENGTH
+    if compact.all():
+        return parse_compact(flat)
+    if not compact.any():
+        return parse_iso(flat, utc_offset=utc_offset)
+    times = np.empty(len(flat), dtype=DTYPE)
+    times[compact] = parse_compact(flat[compact])
+    times[~compact] = parse_iso(flat[~compact], utc_offset=utc_offset)
+    return times
+
+
+def to_datetime64(time: TimeLike) -> np.datetime64:
+    if isinstance(time, str):
+        return parse([time])[0]
+    if isinstance(time, datetime.datetime) and time.tzinfo:
+        # 他の aware な値と同じく JST の wall clock にする
+        time = time.astimezone(datetime.timezone(datetime.timedelta(hours=JST_HOURS))).replace(tzinfo=None)
+    return np.datetime64(time, 's')
+
+
+def to_datetimes(times: np.ndarray) -> List[datetime.datetime]:
+    '''
+    naive な datetime の list
+    '''
+    return np.asarray(times).astype('datetime64[us]').tolist()
+
+
+def format_compact(times: np.ndarray) -> np.ndarray:
+    '''
+    datetime64 => yyyymmddHHMMSS
+    '''
+    text = np.datetime_as_string(np.asarray(times, dtype=DTYPE), unit='s')
+    chars = _to_chars(text, ISO_LENGTH)
+    columns = [start + i for start, count in ISO_FIELDS for i in range(count)]
+    return np.ascontiguousarray(chars[:, columns]).view(f'S{COMPACT_LENGTH}').reshape(-1).astype('U')
+
+
+def range_slice(times: np.ndarray, start: Optional[TimeLike] = None, end: Optional[TimeLike] = None) -> slice:
+    '''
+    昇順の times の start <= t < end の範囲
+    '''
+    first = 0 if start is None else int(np.searchsorted(times, to_datetime64(start), side='left'))
+    last = len(times) if end is None else int(np.searchsorted(times, to_datetime64(end), side='left'))
+    return slice(first, max(first, last))
+
+
+def align(*axes: np.ndarray) -> Tuple[np.ndarray, List[np.ndarray]]:
+    '''
+    axes を合わせた昇順の time 軸と、各 axis の値がその軸のどこに入るかの index
+    '''
+    union = np.unique(np.concatenate([np.asarray(axis, dtype=DTYPE) for axis in axes])) if axes \
+        else np.empty(0, dtype=DTYPE)
+    return union, [np.searchsorted(union, np.asarray(axis, dtype=DTYPE)) for axis in axes]
+
+
+def reindex(times: np.ndarray, values: np.ndarray, axis_times: np.ndarray, *, fill=np.nan) -> np.ndarray:
+    '''
+    最後の次元が times の values を axis_times に載せ替える。無い時刻は fill
+    '''
+    times = np.asarray(times, dtype=DTYPE)
+    values = np.asarray(values)
+    dtype = np.result_type(values.dtype, np.min_scalar_type(fill)) if values.size else values.dtype
+    result = np.full(values.shape[:-1] + (len(axis_times),), fill, dtype=dtype)
+    if not len(times) or not len(axis_times):
+        return result
+    positions = np.searchsorted(axis_times, times)
+    found = positions < len(axis_times)
+    found[found] = axis_times[positions[found]] == times[found]
+    result[..., positions[found]] = values[..., found]
+    return result
+
+
+RESAMPLE = ('mean', 'sum', 'min', 'max', 'first', 'last', 'count')
+
+
+def resample(times: np.ndarray, values: np.ndarray, step: np.timedelta64, how: str = 'mean', *,
+             origin: Optional[np.datetime64] = None) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    最後の次元が昇順の times の values を step 毎に集計する。
+    区間は [t, t + step) で、値のある区間だけ返す。NaN は除いて集計する
+    '''
+    if how not in RESAMPLE:
+        raise ValueError(f'unknown resample: {how}')
+    times = np.asarray(times, dtype=DTYPE)
+    values = np.asarray(values)
+    if not len(times):
+        return times, values[..., :0]
+    step = np.timedelta64(step).astype('timedelta64[s]')
+    if origin is None:
+        origin = np.datetime64(0, 's')
+    bins = (times - origin) // step
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    bin_times = origin + bins[starts] * step
+
+    if how == 'first':
+        return bin_times, values[..., starts]
+    if how == 'last':
+        return bin_times, values[..., np.r_[starts[1:], len(times)] - 1]
+
+    floating = values.astype(np.float64)
+    missing = np.isnan(floating)
+    counts = np.add.reduceat(~missing, starts, axis=-1)
+    if how == 'count':
+        return bin_times, counts
+    if how in ('sum', 'mean'):
+        sums = np.add.reduceat(np.where(missing, 0, floating), starts, axis=-1)
+        if how == 'sum':
+            return bin_times, np.where(counts > 0, sums, np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return bin_times, sums / counts
+    # fmin, fmax は NaN を無視する
+    reduce = np.fmin if how == 'min' else np.fmax
+    return bin_times, reduce.reduceat(floating, starts, axis=-1)
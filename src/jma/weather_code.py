@@ -0,0 +1,31 @@
+'''
+天気 code(forecast の weatherCodes) => weather icons の文字。
+
+表は weather_icon.py --generate で weathericons.xml から作ってある。
+'''
+from typing import Optional
+from .weather_code_table import WEATHER_CODES
+
+
+def get_telop(code: str) -> Optional[str]:
+    entry = WEATHER_CODES.get(code)
+    return entry[0] if entry else None
+
+
+def get_icon(code: str) -> Optional[str]:
+    entry = WEATHER_CODES.get(code)
+    return chr(entry[1]) if entry else None
+
+
+def label(code: str) -> str:
+    '''
+    icon 付きの表示用。天気の文字列は weathers にあるので code のまま
+    '''
+    entry = WEATHER_CODES.get(code)
+    if not entry:
+        return code
+    return f'{chr(entry[1])} {code}'
+
+
+def icon_codepoints():
+    return sorted({codepoint for _, codepoint in WEATHER_CODES.values()})
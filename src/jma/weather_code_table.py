@@ -0,0 +1,123 @@
+# generated by weather_icon.py from weathericons.xml. do not edit
+
+# 天気 code => (天気, weather icons の codepoint)
+WEATHER_CODES = {
+    '100': ('晴', 0xf00d),  # wi_day_sunny
+    '101': ('晴時々曇', 0xf002),  # wi_day_cloudy
+    '102': ('晴一時雨', 0xf009),  # wi_day_showers
+    '103': ('晴時々雨', 0xf009),  # wi_day_showers
+    '104': ('晴一時雪', 0xf00a),  # wi_day_snow
+    '105': ('晴時々雪', 0xf00a),  # wi_day_snow
+    '106': ('晴一時雨か雪', 0xf006),  # wi_day_rain_mix
+    '107': ('晴時々雨か雪', 0xf006),  # wi_day_rain_mix
+    '108': ('晴一時雨か雷雨', 0xf010),  # wi_day_thunderstorm
+    '110': ('晴後時々曇', 0xf002),  # wi_day_cloudy
+    '111': ('晴後曇', 0xf002),  # wi_day_cloudy
+    '112': ('晴後一時雨', 0xf009),  # wi_day_showers
+    '113': ('晴後時々雨', 0xf009),  # wi_day_showers
+    '114': ('晴後雨', 0xf008),  # wi_day_rain
+    '115': ('晴後一時雪', 0xf00a),  # wi_day_snow
+    '116': ('晴後時々雪', 0xf00a),  # wi_day_snow
+    '117': ('晴後雪', 0xf00a),  # wi_day_snow
+    '118': ('晴後雨か雪', 0xf006),  # wi_day_rain_mix
+    '119': ('晴後雨か雷雨', 0xf010),  # wi_day_thunderstorm
+    '120': ('晴朝夕一時雨', 0xf009),  # wi_day_showers
+    '121': ('晴朝の内一時雨', 0xf009),  # wi_day_showers
+    '122': ('晴夕方一時雨', 0xf009),  # wi_day_showers
+    '123': ('晴山沿い雷雨', 0xf010),  # wi_day_thunderstorm
+    '124': ('晴山沿い雪', 0xf00a),  # wi_day_snow
+    '125': ('晴午後は雷雨', 0xf010),  # wi_day_thunderstorm
+    '126': ('晴昼頃から雨', 0xf008),  # wi_day_rain
+    '127': ('晴夕方から雨', 0xf008),  # wi_day_rain
+    '128': ('晴夜は雨', 0xf008),  # wi_day_rain
+    '130': ('朝の内霧後晴', 0xf003),  # wi_day_fog
+    '131': ('晴明け方霧', 0xf003),  # wi_day_fog
+    '132': ('晴朝夕曇', 0xf002),  # wi_day_cloudy
+    '140': ('晴時々雨で雷を伴う', 0xf010),  # wi_day_thunderstorm
+    '160': ('晴一時雪か雨', 0xf006),  # wi_day_rain_mix
+    '170': ('晴時々雪か雨', 0xf006),  # wi_day_rain_mix
+    '181': ('晴後雪か雨', 0xf006),  # wi_day_rain_mix
+    '200': ('曇', 0xf013),  # wi_cloudy
+    '201': ('曇時々晴', 0xf00c),  # wi_day_sunny_overcast
+    '202': ('曇一時雨', 0xf01a),  # wi_showers
+    '203': ('曇時々雨', 0xf01a),  # wi_showers
+    '204': ('曇一時雪', 0xf01b),  # wi_snow
+    '205': ('曇時々雪', 0xf01b),  # wi_snow
+    '206': ('曇一時雨か雪', 0xf017),  # wi_rain_mix
+    '207': ('曇時々雨か雪', 0xf017),  # wi_rain_mix
+    '208': ('曇一時雨か雷雨', 0xf01e),  # wi_thunderstorm
+    '209': ('霧', 0xf014),  # wi_fog
+    '210': ('曇後時々晴', 0xf00c),  # wi_day_sunny_overcast
+    '211': ('曇後晴', 0xf00c),  # wi_day_sunny_overcast
+    '212': ('曇後一時雨', 0xf01a),  # wi_showers
+    '213': ('曇後時々雨', 0xf01a),  # wi_showers
+    '214': ('曇後雨', 0xf019),  # wi_rain
+    '215': ('曇後一時雪', 0xf01b),  # wi_snow
+    '216': ('曇後時々雪', 0xf01b),  # wi_snow
+    '217': ('曇後雪', 0xf01b),  # wi_snow
+    '218': ('曇後雨か雪', 0xf017),  # wi_rain_mix
+    '219': ('曇後雨か雷雨', 0xf01e),  # wi_thunderstorm
+    '220': ('曇朝夕一時雨', 0xf01a),  # wi_showers
+    '221': ('曇朝の内一時雨', 0xf01a),  # wi_showers
+    '222': ('曇夕方一時雨', 0xf01a),  # wi_showers
+    '223': ('曇日中時々晴', 0xf00c),  # wi_day_sunny_overcast
+    '224': ('曇昼頃から雨', 0xf019),  # wi_rain
+    '225': ('曇夕方から雨', 0xf019),  # wi_rain
+    '226': ('曇夜は雨', 0xf019),  # wi_rain
+    '228': ('曇昼頃から雪', 0xf01b),  # wi_snow
+    '229': ('曇夕方から雪', 0xf01b),  # wi_snow
+    '230': ('曇夜は雪', 0xf01b),  # wi_snow
+    '231': ('曇海上海岸は霧か霧雨', 0xf014),  # wi_fog
+    '240': ('曇時々雨で雷を伴う', 0xf01e),  # wi_thunderstorm
+    '250': ('曇時々雪で雷を伴う', 0xf06b),  # wi_day_snow_thunderstorm
+    '260': ('曇一時雪か雨', 0xf017),  # wi_rain_mix
+    '270': ('曇時々雪か雨', 0xf017),  # wi_rain_mix
+    '281': ('曇後雪か雨', 0xf017),  # wi_rain_mix
+    '300': ('雨', 0xf019),  # wi_rain
+    '301': ('雨時々晴', 0xf008),  # wi_day_rain
+    '302': ('雨時々止む', 0xf01a),  # wi_showers
+    '303': ('雨時々雪', 0xf017),  # wi_rain_mix
+    '304': ('雨か雪', 0xf017),  # wi_rain_mix
+    '306': ('大雨', 0xf019),  # wi_rain
+    '308': ('雨で暴風を伴う', 0xf018),  # wi_rain_wind
+    '309': ('雨一時雪', 0xf017),  # wi_rain_mix
+    '311': ('雨後晴', 0xf008),  # wi_day_rain
+    '313': ('雨後曇', 0xf019),  # wi_rain
+    '314': ('雨後時々雪', 0xf017),  # wi_rain_mix
+    '315': ('雨後雪', 0xf017),  # wi_rain_mix
+    '316': ('雨か雪後晴', 0xf006),  # wi_day_rain_mix
+    '317': ('雨か雪後曇', 0xf017),  # wi_rain_mix
+    '320': ('朝の内雨後晴', 0xf008),  # wi_day_rain
+    '321': ('朝の内雨後曇', 0xf019),  # wi_rain
+    '322': ('雨朝晩一時雪', 0xf017),  # wi_rain_mix
+    '323': ('雨昼頃から晴', 0xf008),  # wi_day_rain
+    '324': ('雨夕方から晴', 0xf008),  # wi_day_rain
+    '325': ('雨夜は晴', 0xf008),  # wi_day_rain
+    '326': ('雨夕方から雪', 0xf017),  # wi_rain_mix
+    '327': ('雨夜は雪', 0xf017),  # wi_rain_mix
+    '328': ('雨一時強く降る', 0xf019),  # wi_rain
+    '329': ('雨一時みぞれ', 0xf0b5),  # wi_sleet
+    '340': ('雪か雨', 0xf017),  # wi_rain_mix
+    '350': ('雨で雷を伴う', 0xf01e),  # wi_thunderstorm
+    '361': ('雪か雨後晴', 0xf006),  # wi_day_rain_mix
+    '371': ('雪か雨後曇', 0xf017),  # wi_rain_mix
+    '400': ('雪', 0xf01b),  # wi_snow
+    '401': ('雪時々晴', 0xf00a),  # wi_day_snow
+    '402': ('雪時々止む', 0xf01b),  # wi_snow
+    '403': ('雪時々雨', 0xf017),  # wi_rain_mix
+    '405': ('大雪', 0xf01b),  # wi_snow
+    '406': ('風雪強い', 0xf064),  # wi_snow_wind
+    '407': ('暴風雪', 0xf064),  # wi_snow_wind
+    '409': ('雪一時雨', 0xf017),  # wi_rain_mix
+    '411': ('雪後晴', 0xf00a),  # wi_day_snow
+    '413': ('雪後曇', 0xf01b),  # wi_snow
+    '414': ('雪後雨', 0xf017),  # wi_rain_mix
+    '420': ('朝の内雪後晴', 0xf00a),  # wi_day_snow
+    '421': ('朝の内雪後曇', 0xf01b),  # wi_snow
+    '422': ('雪昼頃から雨', 0xf017),  # wi_rain_mix
+    '423': ('雪夕方から雨', 0xf017),  # wi_rain_mix
+    '425': ('雪一時強く降る', 0xf01b),  # wi_snow
+    '426': ('雪後みぞれ', 0xf0b5),  # wi_sleet
+    '427': ('雪一時みぞれ', 0xf0b5),  # wi_sleet
+    '450': ('雪で雷を伴う', 0xf06b),  # wi_day_snow_thunderstorm
+}
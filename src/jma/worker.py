@@ -0,0 +1,134 @@
+'''
+GUI の frame loop と取得・decode・索引作成を別 thread に分ける。
+
+worker thread は自前の asyncio loop で HttpGetter を動かし、
+結果は immutable な値として Slot に publish する。
+GUI は毎 frame Slot.value を読むだけで、lock も待ちも無い。
+'''
+from typing import Callable, Coroutine, Dict, Generic, List, Optional, TypeVar
+import asyncio
+import collections
+import concurrent.futures
+import logging
+import pathlib
+import threading
+import time
+from .cache_backend import create_backend
+from .http_getter import HttpGetter
+from .metrics import Metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class Slot(Generic[T]):
+    '''
+    書き込みは worker thread だけ。参照の差し替えは GIL 下で atomic なので、
+    読む側は常に publish 済みのどれか 1 つの値を見る
+    '''
+
+    def __init__(self, value: T) -> None:
+        self._value = value
+        self.version = 0
+
+    @property
+    def value(self) -> T:
+        return self._value
+
+    def publish(self, value: T):
+        self._value = value
+        self.version += 1
+
+    def update(self, **kw):
+        '''
+        NamedTuple の一部を差し替えて publish する
+        '''
+        self.publish(self._value._replace(**kw))  # type: ignore
+
+
+class Worker:
+    def __init__(self, cache_dir: pathlib.Path, backend: str = 'file', *,
+                 metrics: Optional[Metrics] = None) -> None:
+        self.cache_dir = cache_dir
+        self.loop = asyncio.new_event_loop()
+        self.getter: Optional[HttpGetter] = None
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.getter = HttpGetter(self.loop, cache_dir,
+                                     backend=create_backend(cache_dir, backend), metrics=metrics)
+            ready.set()
+            self.loop.run_forever()
+            self.loop.close()
+
+        self.thread = threading.Thread(target=run, name='jma-worker', daemon=True)
+        self.thread.start()
+        ready.wait()
+
+    def submit(self, coroutine: Coroutine) -> concurrent.futures.Future:
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+        def on_done(f: concurrent.futures.Future):
+            if not f.cancelled() and f.exception():
+                logger.error('%s', f.exception())
+        future.add_done_callback(on_done)
+        return future
+
+    async def _shutdown_async(self):
+        current = asyncio.current_task()
+        if self.getter:
+            await self.getter.shutdown_async()
+        # submit されたまま終わっていない task
+        tasks = [task for task in asyncio.all_tasks() if task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # executor で backend を触っている job が終わってから閉じる
+        await self.loop.shutdown_default_executor()
+        if self.getter:
+            self.getter.backend.close()
+
+    def shutdown(self, timeout: float = 5.0):
+        future = asyncio.run_coroutine_threadsafe(self._shutdown_async(), self.loop)
+        try:
+            future.result(timeout)
+        except Exception as ex:
+            logger.warning('shutdown: %r', ex)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
+
+
+class FrameTimes:
+    '''
+    dock 毎の描画時間(ms)。直近 size frame
+    '''
+
+    def __init__(self, size: int = 120) -> None:
+        self.size = size
+        self.times: Dict[str, collections.deque] = {}
+
+    def add(self, name: str, ms: float):
+        times = self.times.get(name)
+        if times is None:
+            times = collections.deque(maxlen=self.size)
+            self.times[name] = times
+        times.append(ms)
+
+    def wrap(self, name: str, draw: Callable) -> Callable:
+        def timed(*args):
+            start = time.perf_counter()
+            try:
+                return draw(*args)
+            finally:
+                self.add(name, (time.perf_counter() - start) * 1000)
+        return timed
+
+    def summary(self) -> List[tuple]:
+        '''
+        (name, 最新, 平均, 最大)
+        '''
+        return [(name, times[-1], sum(times) / len(times), max(times))
+                for name, times in self.times.items() if times]
@@ -0,0 +1,61 @@
+'''
+テストで共有する小さな入力
+'''
+
+# 北海道の一部だけの area.json
+AREA = {
+    'centers': {'010100': {'name': '北海道地方', 'children': ['011000', '012000']}},
+    'offices': {
+        '011000': {'name': '宗谷地方', 'parent': '010100', 'children': ['011000']},
+        '012000': {'name': '上川・留萌地方', 'parent': '010100', 'children': ['012010']},
+    },
+    'class10s': {
+        '011000': {'name': '宗谷地方', 'parent': '011000', 'children': ['011011']},
+        '012010': {'name': '上川地方', 'parent': '012000', 'children': ['012011']},
+    },
+    'class15s': {
+        '011011': {'name': '宗谷北部', 'parent': '011000', 'children': ['0120200']},
+        '012011': {'name': '上川北部', 'parent': '012010', 'children': ['0122100']},
+    },
+    'class20s': {
+        '0120200': {'name': '稚内市', 'parent': '011011'},
+        '0122100': {'name': '士別市', 'parent': '012011'},
+    },
+}
+
+# forecast/130000.json を縮めたもの
+TIMES3 = ['2022-02-12T05:00:00+09:00', '2022-02-13T00:00:00+09:00']
+TIMES7 = ['2022-02-13T00:00:00+09:00', '2022-02-14T00:00:00+09:00']
+FORECAST = [
+    {
+        'publishingOffice': '気象庁',
+        'reportDatetime': '2022-02-12T05:00:00+09:00',
+        'timeSeries': [
+            {'timeDefines': TIMES3, 'areas': [
+                {'area': {'name': '東京地方', 'code': '130010'},
+                 'weatherCodes': ['100', '200'], 'weathers': ['晴れ', 'くもり'],
+                 'winds': ['北の風', '南の風'], 'waves': ['0.5メートル', '0.5メートル']},
+                {'area': {'name': '伊豆諸島北部', 'code': '130020'},
+                 'weatherCodes': ['101', '201'], 'weathers': ['晴れ時々くもり', 'くもり時々晴れ'],
+                 'winds': ['北東の風', '北東の風']},
+            ]},
+            {'timeDefines': TIMES3, 'areas': [
+                {'area': {'name': '東京地方', 'code': '130010'}, 'pops': ['0', '10']}]},
+            {'timeDefines': TIMES3, 'areas': [
+                {'area': {'name': '東京', 'code': '44132'}, 'temps': ['0', '10']}]},
+        ],
+    },
+    {
+        'publishingOffice': '気象庁',
+        'reportDatetime': '2022-02-12T05:00:00+09:00',
+        'timeSeries': [
+            {'timeDefines': TIMES7, 'areas': [
+                {'area': {'name': '東京地方', 'code': '130010'}, 'weatherCodes': ['100', '101'],
+                 'pops': ['', '10'], 'reliabilities': ['', 'A']}]},
+            {'timeDefines': TIMES7, 'areas': [
+                {'area': {'name': '東京', 'code': '44132'}, 'tempsMin': ['', '2'], 'tempsMax': ['', '12']}]},
+        ],
+        'tempAverage': {'areas': [{'area': {'name': '東京', 'code': '44132'}, 'min': '2.1', 'max': '10.3'}]},
+        'precipAverage': {'areas': [{'area': {'name': '東京', 'code': '44132'}, 'min': '3', 'max': '13'}]},
+    },
+]
@@ -0,0 +1,95 @@
+import unittest
+import pathlib
+import datetime
+import sys
+
+HERE = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(HERE.parent / 'src'))
+
+T0 = datetime.datetime(2022, 2, 12, 0, 0)
+T1 = datetime.datetime(2022, 2, 12, 0, 10)
+MAPS = {
+    T0: {
+        '11001': {'temp': [1.5, 0], 'precipitation10m': [0.5, 0]},
+        '11016': {'temp': [-2.0, 0], 'precipitation10m': [1.0, 0]},
+        # 品質 flag が 0 以外
+        '12011': {'temp': [3.0, 1], 'precipitation10m': [None, 0]},
+    },
+    T1: {
+        '11001': {'temp': [2.0, 0], 'precipitation10m': [1.0, 0]},
+        '11016': {'temp': [None, 0], 'unknown': [1, 0]},
+        '12011': {'temp': [4.5, 0], 'precipitation10m': [2.0, 0]},
+        '99999': {'temp': [10.0, 0]},
+    },
+}
+
+
+def create_store(**kw):
+    from jma.stations import StationTable
+    from jma.amedas import AmedasStore
+
+    stations = StationTable()
+    for code, name in (('11001', '宗谷岬'), ('11016', '稚内'), ('12011', '士別')):
+        stations.codes.append(code)
+        stations.kj_names.append(name)
+        stations.lat.append(0)
+        stations.lon.append(0)
+    stations.update_code_map()
+    store = AmedasStore(stations, **kw)
+    for time, data in MAPS.items():
+        store.add(time, data)
+    return store
+
+
+class TestAmedasStore(unittest.TestCase):
+
+    def test_column(self):
+        import numpy as np
+        from jma.amedas import QUALITY_MISSING
+
+        store = create_store()
+        self.assertEqual(2, len(store))
+        np.testing.assert_array_equal(
+            [[1.5, 2.0], [-2.0, np.nan], [np.nan, 4.5]], store.column('temp'))
+        # strict でなければ品質の悪い値も返す
+        self.assertEqual(3.0, store.column('temp', strict=False)[2, 0])
+        self.assertEqual(QUALITY_MISSING, store.quality[1, 1, store.element_map['temp']])
+
+        np.testing.assert_array_equal([1.5, 1.0, 2.0], store.totals('precipitation10m', T1, 1))
+        np.testing.assert_array_equal([1.0, 0.0, 2.0], store.totals('precipitation10m', T1, 0.1))
+
+    def test_group_max(self):
+        import numpy as np
+        import jma
+        from sample_data import AREA
+
+        store = create_store()
+        groups, offices = store.office_groups(jma.AreaIndex(AREA))
+        self.assertEqual(['011000', '012000'], offices)
+        self.assertEqual([0, 0, 1], groups.tolist())
+        np.testing.assert_array_equal([1.5, np.nan], store.group_max('temp', T0, groups, 2))
+        np.testing.assert_array_equal([2.0, 4.5], store.group_max('temp', T1, groups, 2))
+        # office の分からない station は入れない
+        groups[0] = -1
+        np.testing.assert_array_equal([-2.0, np.nan], store.group_max('temp', T0, groups, 2))
+
+    def test_ranking(self):
+        store = create_store()
+        self.assertEqual([(2, 4.5), (0, 2.0)], store.ranking('temp', T1))
+        self.assertEqual([(1, -2.0)], store.ranking('temp', T0, 1, descending=False))
+        self.assertEqual([(0, 1.5), (1, -2.0)], store.ranking('temp', T0, 2))
+
+    def test_max_times(self):
+        import numpy as np
+
+        store = create_store(capacity=1, max_times=2)
+        t2 = T1 + datetime.timedelta(minutes=10)
+        store.add(t2, {'11001': {'temp': [2.5, 0]}})
+        self.assertEqual([T1, t2], store.times)
+        self.assertEqual({T1: 0, t2: 1}, store.time_map)
+        np.testing.assert_array_equal([[2.0, 2.5], [np.nan, np.nan], [4.5, np.nan]], store.column('temp'))
+        self.assertEqual([np.datetime64(T1, 'm'), np.datetime64(t2, 'm')], store.times64.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
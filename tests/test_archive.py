@@ -0,0 +1,48 @@
+import unittest
+import pathlib
+import tempfile
+import datetime
+import sys
+
+HERE = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(HERE.parent / 'src'))
+
+
+class TestArchive(unittest.TestCase):
+
+    def test_append(self):
+        from jma.archive import Archive
+
+        t0 = datetime.datetime(2022, 2, 12, 7, 50)
+        t1 = datetime.datetime(2022, 2, 12, 8, 0)
+        with tempfile.TemporaryDirectory() as d:
+            path = pathlib.Path(d) / 'amedas.jmaa'
+            with Archive(path) as archive:
+                archive.append(t0, b'{"0": 0}')
+                archive.append(t1, b'{"1": 1}')
+
+            # 書きかけの record
+            with open(path, 'ab') as f:
+                f.write(b'\x01\x02\x03')
+
+            with Archive(path) as archive:
+                self.assertEqual(2, len(archive))
+                self.assertIn(t1, archive)
+                self.assertEqual(b'{"1": 1}', archive.read(t1))
+                self.assertEqual([t0, t1], list(archive.times()))
+                archive.append(t1 + datetime.timedelta(minutes=10), b'{}')
+            with Archive(path) as archive:
+                self.assertEqual(3, len(archive))
+
+    def test_enumerate_times(self):
+        from jma.backfill import enumerate_times
+
+        times = list(enumerate_times(datetime.datetime(2022, 2, 12, 7, 43),
+                                     datetime.datetime(2022, 2, 12, 8, 10)))
+        self.assertEqual([datetime.datetime(2022, 2, 12, 7, 50),
+                          datetime.datetime(2022, 2, 12, 8, 0),
+                          datetime.datetime(2022, 2, 12, 8, 10)], times)
+
+
+if __name__ == '__main__':
+    unittest.main()
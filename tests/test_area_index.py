@@ -0,0 +1,71 @@
+import unittest
+import pathlib
+import sys
+
+HERE = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(HERE.parent / 'src'))
+
+
+class TestAreaIndex(unittest.TestCase):
+
+    def test_index(self):
+        import jma
+        from sample_data import AREA
+
+        index = jma.AreaIndex(AREA)
+        self.assertEqual(1, len(index.roots))
+        self.assertEqual(9, len(index))
+
+        wakkanai = index.get('0120200')
+        assert wakkanai
+        self.assertEqual('011000', index.office_of(wakkanai).key)
+        self.assertEqual('010100', index.center_of(wakkanai).key)
+        self.assertEqual(['010100', '011000', '011000', '011011'],
+                         [node.key for node in index.ancestors(wakkanai)])
+
+        # office と class10 で key が重複する
+        self.assertEqual(2, index.get('011000').level)
+        self.assertEqual(1, index.get('011000', 'offices').level)
+
+        kamikawa = index.get('012000', 'offices')
+        self.assertEqual(['012010', '012011', '0122100'],
+                         [node.key for node in index.descendants(kamikawa)])
+        self.assertFalse(index.contains(kamikawa, wakkanai))
+        self.assertEqual([index.find_by_name('上川・留萌地方')[0], None],
+                         list(index.resolve_offices(['0122100', 'unknown'])))
+
+
+class TestAreaTreeView(unittest.TestCase):
+
+    def test_rows(self):
+        from jma.area_view import AreaTreeView
+        import jma
+        from sample_data import AREA
+
+        index = jma.AreaIndex(AREA)
+        view = AreaTreeView(index)
+        self.assertEqual(['010100'], [row.node.key for row in view.get_rows()])
+
+        view.toggle(index.roots[0])
+        rows = view.get_rows()
+        self.assertEqual(['010100', '011000', '012000'], [row.node.key for row in rows])
+        self.assertEqual([0, 1, 1], [row.depth for row in rows])
+        self.assertIs(rows, view.get_rows())
+
+        view.toggle(index.get('012000', 'offices'))
+        self.assertEqual(['010100', '011000', '012000', '012010'],
+                         [row.node.key for row in view.get_rows()])
+
+        view.set_filter('士')
+        view.set_filter('士別')
+        rows = view.get_rows()
+        self.assertEqual(['010100', '012000', '012010', '012011', '0122100'],
+                         [row.node.key for row in rows])
+        self.assertEqual(index.ancestors(rows[-1].node) + [rows[-1].node], list(rows[-1].path))
+
+        view.set_filter('')
+        self.assertEqual(4, len(view.get_rows()))
+
+
+if __name__ == '__main__':
+    unittest.main()
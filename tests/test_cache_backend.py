@@ -0,0 +1,150 @@
+import unittest
+import pathlib
+import tempfile
+import sys
+
+HERE = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(HERE.parent / 'src'))
+
+
+class TestSqliteCacheBackend(unittest.TestCase):
+
+    def test_dedup(self):
+        from jma.cache_backend import SqliteCacheBackend
+        from jma.cache_policy import CacheMeta
+
+        with tempfile.TemporaryDirectory() as d:
+            backend = SqliteCacheBackend(pathlib.Path(d) / 'cache.sqlite3')
+            data = b'{"11001": {"temp": [1.2, 0]}}' * 10
+            backend.put('https://example.com/a.json?x=1', data, CacheMeta(1, '"a"'))
+            backend.put('https://example.com/a.json?x=2', data, CacheMeta(2))
+            stored = backend.stored_bytes
+            self.assertLess(stored, len(data))
+            self.assertEqual(backend.get_version('https://example.com/a.json?x=1'),
+                             backend.get_version('https://example.com/a.json?x=2'))
+
+            entry = backend.get('https://example.com/a.json?x=1')
+            assert entry
+            self.assertEqual(data, entry[0])
+            self.assertEqual('"a"', entry[1].etag)
+
+            backend.put('https://example.com/a.json?x=2', b'{}', CacheMeta(3))
+            self.assertEqual(2, len(list(backend.urls())))
+            backend.close()
+
+    def test_evict(self):
+        from jma.cache_backend import SqliteCacheBackend
+        from jma.cache_policy import CacheMeta
+        import os
+
+        with tempfile.TemporaryDirectory() as d:
+            backend = SqliteCacheBackend(pathlib.Path(d) / 'cache.sqlite3', max_bytes=3000)
+            for i in range(4):
+                backend.put(f'https://example.com/{i}.json', os.urandom(1000), CacheMeta(i))
+            self.assertLessEqual(backend.stored_bytes, 3000)
+            self.assertIsNone(backend.get('https://example.com/0.json'))
+            self.assertIsNotNone(backend.get('https://example.com/3.json'))
+            backend.close()
+
+    def test_touch(self):
+        from jma.cache_backend import SqliteCacheBackend
+        from jma.cache_policy import CacheMeta
+        import os
+
+        with tempfile.TemporaryDirectory() as d:
+            backend = SqliteCacheBackend(pathlib.Path(d) / 'cache.sqlite3', max_bytes=3500)
+            for i in range(3):
+                backend.put(f'https://example.com/{i}.json', os.urandom(1000), CacheMeta(i))
+            # 読んだ 0 は残って、次に古い 1 が消える
+            self.assertIsNotNone(backend.get('https://example.com/0.json'))
+            backend.put('https://example.com/3.json', os.urandom(1000), CacheMeta(3))
+            self.assertIsNotNone(backend.get('https://example.com/0.json'))
+            self.assertIsNone(backend.get('https://example.com/1.json'))
+            backend.close()
+
+    def test_writer(self):
+        from jma.cache_backend import SqliteCacheBackend
+        from jma.cache_policy import CacheMeta
+
+        with tempfile.TemporaryDirectory() as d:
+            backend = SqliteCacheBackend(pathlib.Path(d) / 'cache.sqlite3')
+            data = b'{"11001": {"temp": [1.2, 0]}}' * 100
+            for url in ('https://example.com/a.json', 'https://example.com/b.json'):
+                writer = backend.open_writer(url)
+                for i in range(0, len(data), 100):
+                    writer.write(data[i:i+100])
+                # memory には圧縮した分だけ
+                self.assertLess(sum(len(chunk) for chunk in writer.chunks), len(data))
+                writer.commit(CacheMeta(1))
+            entry = backend.get('https://example.com/b.json')
+            assert entry
+            self.assertEqual(data, entry[0])
+            self.assertEqual(backend.get_version('https://example.com/a.json'),
+                             backend.get_version('https://example.com/b.json'))
+            backend.close()
+
+    def test_refresh_evicted(self):
+        from jma.cache_backend import SqliteCacheBackend
+        from jma.cache_policy import CacheMeta
+
+        with tempfile.TemporaryDirectory() as d:
+            backend = SqliteCacheBackend(pathlib.Path(d) / 'cache.sqlite3')
+            self.assertIsNone(backend.refresh('https://example.com/a.json', CacheMeta(1, '"a"')))
+            backend.close()
+
+
+class TestFileCacheBackend(unittest.TestCase):
+
+    def test_layout(self):
+        from jma.cache_backend import FileCacheBackend
+        from jma.cache_policy import CacheMeta
+
+        with tempfile.TemporaryDirectory() as d:
+            cache_dir = pathlib.Path(d)
+            backend = FileCacheBackend(cache_dir)
+            backend.put('https://example.com/a/b.json', b'{}', CacheMeta(1, '"b"'))
+            (cache_dir / 'snapshot.bin').write_bytes(b'')
+            (cache_dir / 'glyphs.txt').write_text('')
+            self.assertEqual(['https://example.com/a/b.json'], list(backend.urls()))
+
+            # meta の無い file は get と get_meta が同じ mtime を返す
+            path = backend.get_path('https://example.com/c.json')
+            path.write_bytes(b'[]')
+            entry = backend.get('https://example.com/c.json')
+            assert entry
+            self.assertEqual(entry[1], backend.get_meta('https://example.com/c.json'))
+            self.assertEqual(path.stat().st_mtime, entry[1].fetched)
+
+            self.assertIsNone(backend.refresh('https://example.com/d.json', CacheMeta(1)))
+            self.assertIsNone(backend.get_meta('https://example.com/d.json'))
+
+    def test_query(self):
+        from jma.cache_backend import FileCacheBackend
+        from jma.cache_policy import CacheMeta
+
+        with tempfile.TemporaryDirectory() as d:
+            backend = FileCacheBackend(pathlib.Path(d))
+            backend.put('https://example.com/a.json', b'0', CacheMeta(1))
+            backend.put('https://example.com/a.json?x=1', b'1', CacheMeta(1))
+            backend.put('https://example.com/a.json?x=2', b'2', CacheMeta(1))
+            self.assertEqual(3, len({backend.get_path(f'https://example.com/a.json{query}')
+                                     for query in ('', '?x=1', '?x=2')}))
+            for query, data in (('', b'0'), ('?x=1', b'1'), ('?x=2', b'2')):
+                entry = backend.get(f'https://example.com/a.json{query}')
+                assert entry
+                self.assertEqual(data, entry[0])
+            self.assertEqual(['https://example.com/a.json'], list(backend.urls()))
+
+    def test_abstract(self):
+        from jma.cache_backend import CacheBackend
+
+        class GetOnly(CacheBackend):
+            def get(self, url):
+                return None
+
+        with self.assertRaises(TypeError):
+            GetOnly()  # type: ignore
+
+
+if __name__ == '__main__':
+    unittest.main()
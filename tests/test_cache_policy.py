@@ -0,0 +1,39 @@
+import unittest
+import pathlib
+import sys
+import time
+
+HERE = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(HERE.parent / 'src'))
+
+
+class TestCachePolicy(unittest.TestCase):
+
+    def test_ttl(self):
+        from jma.cache_policy import CachePolicy, CacheMeta
+        import jma
+
+        policy = CachePolicy()
+        forecast = jma.FORECAST_URL % {'office': '130000'}
+        self.assertEqual(600, policy.get_ttl(forecast))
+        self.assertIsNone(policy.get_ttl(
+            f'{jma.BASE_URL}/amedas/data/map/20220211225000.json'))
+
+        self.assertFalse(policy.is_fresh(forecast, None))
+        self.assertTrue(policy.is_fresh(forecast, CacheMeta(time.time())))
+        self.assertFalse(policy.is_fresh(
+            forecast, CacheMeta(time.time() - 3600)))
+
+    def test_conditional_headers(self):
+        from jma.cache_policy import CacheMeta
+
+        meta = CacheMeta.from_headers(
+            {'ETag': '"abc"', 'Last-Modified': 'Fri, 11 Feb 2022 13:50:00 GMT'})
+        self.assertEqual({
+            'If-None-Match': '"abc"',
+            'If-Modified-Since': 'Fri, 11 Feb 2022 13:50:00 GMT',
+        }, meta.conditional_headers())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import unittest
+import pathlib
+import tempfile
+import datetime
+import json
+import sys
+
+HERE = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(HERE.parent / 'src'))
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+T0 = datetime.datetime(2022, 2, 11, 23, 50)
+T1 = datetime.datetime(2022, 2, 12, 0, 0)
+MAPS = {
+    T0: {'11001': {'temp': [-3.5, 0]}, '99999': {}},
+    T1: {'11001': {'temp': [-3.8, 0]}, '12011': {'temp': [-10.1, 1], 'snow': [120, 0]}},
+}
+
+
+def create_mapping():
+    import jma
+    from jma import export
+    from sample_data import AREA
+
+    stations = jma.StationTable.from_json({
+        '11001': {'type': 'A', 'elems': '11111111', 'lat': [45, 31.2], 'lon': [141, 56.1], 'alt': 26,
+                  'kjName': '稚内', 'knName': 'ワッカナイ', 'enName': 'Wakkanai'},
+        '12011': {'type': 'A', 'elems': '11111111', 'lat': [44, 10.0], 'lon': [142, 23.0], 'alt': 140,
+                  'kjName': '士別', 'knName': 'シベツ', 'enName': 'Shibetsu'},
+    })
+    return export.create_mapping(stations, jma.AreaIndex(AREA))
+
+
+def iter_maps():
+    from jma import export
+    for time, data in MAPS.items():
+        yield export.Source('amedas', time.strftime('%Y%m%d%H%M%S'), json.dumps(data).encode('utf-8'))
+
+
+class TestExport(unittest.TestCase):
+
+    def test_archive(self):
+        import numpy as np
+        from jma.archive import Archive
+        from jma import export
+
+        mapping = create_mapping()
+        self.assertEqual(['011000', '012000'], mapping.offices)
+
+        with tempfile.TemporaryDirectory() as d:
+            directory = pathlib.Path(d)
+            with Archive(directory / 'amedas.jmaa') as archive:
+                for time, data in MAPS.items():
+                    archive.append(time, json.dumps(data).encode('utf-8'))
+                rows = export.export(export.iter_archive(archive), mapping, directory / 'out',
+                                     format='npz', workers=2)
+            self.assertEqual({'amedas': 3}, rows)
+
+            day0 = np.load(directory / 'out/amedas/date=2022-02-11/part-00000.npz')
+            self.assertEqual(['11001'], day0['station_code'].tolist())
+            self.assertEqual(['011000'], day0['office'].tolist())
+            day1 = np.load(directory / 'out/amedas/date=2022-02-12/part-00000.npz')
+            self.assertEqual(['11001', '12011'], day1['station_code'].tolist())
+            self.assertEqual(['0120200', '0122100'], day1['class20'].tolist())
+            np.testing.assert_allclose([-3.8, -10.1], day1['temp'])
+            self.assertEqual([0, 1], day1['temp_quality'].tolist())
+            self.assertEqual([np.datetime64(T1, 's')] * 2, day1['time'].tolist())
+
+    def test_partition_writer(self):
+        import numpy as np
+        from jma.export import PartitionWriter
+
+        def columns(count: int):
+            return {'value': np.arange(count)}
+
+        with tempfile.TemporaryDirectory() as d:
+            writer = PartitionWriter(pathlib.Path(d), 'amedas', 'npz', chunk_rows=10)
+            writer.add('2022-02-11', columns(3))
+            writer.add('2022-02-11', columns(3))
+            self.assertEqual([], writer.files)
+            # 日付が進んだら前の日は書く
+            writer.add('2022-02-12', columns(3))
+            self.assertEqual(['date=2022-02-11/part-00000.npz'],
+                             [path.relative_to(writer.directory).as_posix() for path in writer.files])
+            self.assertEqual(6, writer.rows)
+            # 戻ってきたものは溜めておく
+            writer.add('2022-02-11', columns(1))
+            self.assertEqual(1, len(writer.files))
+            writer.add('2022-02-12', columns(8))
+            self.assertEqual(2, len(writer.files))
+            writer.close()
+            self.assertEqual(['date=2022-02-11/part-00000.npz', 'date=2022-02-12/part-00000.npz',
+                              'date=2022-02-11/part-00001.npz'],
+                             [path.relative_to(writer.directory).as_posix() for path in writer.files])
+            self.assertEqual(18, writer.rows)
+
+    def test_decode_forecast(self):
+        import numpy as np
+        from jma.export import decode_forecast
+        from sample_data import FORECAST
+
+        partition, columns = decode_forecast('130000', json.dumps(FORECAST).encode('utf-8'))
+        self.assertEqual('2022-02-12', partition)
+        # 8 + 6 + 2 + 2 + 6 + 4
+        self.assertEqual(28, len(columns['office']))
+        self.assertEqual({'130000'}, set(columns['office'].tolist()))
+        self.assertEqual({'130010', '130020', '44132'}, set(columns['area'].tolist()))
+        rows = list(zip(columns['area'], columns['element'], columns['value']))
+        self.assertEqual(('130010', 'weathers', 'くもり'), rows[3])
+        self.assertIn(('44132', 'tempsMax', '12'), rows)
+        self.assertEqual(np.datetime64('2022-02-12T05:00'), columns['report_datetime'][0])
+
+        partition, columns = decode_forecast('130000', b'[]')
+        self.assertEqual('unknown', partition)
+        self.assertEqual(0, len(columns['office']))
+
+    def test_iter_cache(self):
+        import jma
+        from jma import export
+        from jma.cache_backend import FileCacheBackend
+        from jma.cache_policy import CacheMeta
+
+        with tempfile.TemporaryDirectory() as d:
+            backend = FileCacheBackend(pathlib.Path(d))
+            for time, data in MAPS.items():
+                backend.put(jma.AMEDAS_MAP_URL % {'time': time.strftime('%Y%m%d%H%M%S')},
+                            json.dumps(data).encode('utf-8'), CacheMeta(1))
+            backend.put(jma.FORECAST_URL % {'office': '130000'}, b'[]', CacheMeta(1))
+            backend.put(jma.OVERVIEW_URL % {'office': '130000'}, b'{}', CacheMeta(1))
+
+            self.assertEqual([('amedas', '20220211235000'), ('amedas', '20220212000000')],
+                             [(source.kind, source.key) for source in export.iter_cache(backend, ['amedas'])])
+            self.assertEqual([('amedas', '20220211235000'), ('amedas', '20220212000000'), ('forecast', '130000')],
+                             [(source.kind, source.key)
+                              for source in export.iter_cache(backend, ['amedas', 'forecast'])])
+
+    @unittest.skipUnless(pyarrow, 'pyarrow is not installed')
+    def test_pyarrow(self):
+        import pyarrow.ipc
+        import pyarrow.parquet
+        from jma import export
+
+        mapping = create_mapping()
+        with tempfile.TemporaryDirectory() as d:
+            directory = pathlib.Path(d)
+            for format in ('parquet', 'arrow'):
+                rows = export.export(iter_maps(), mapping, directory / format, format=format, workers=1)
+                self.assertEqual({'amedas': 3}, rows)
+                path = directory / format / f'amedas/date=2022-02-12/part-00000.{format}'
+                if format == 'parquet':
+                    table = pyarrow.parquet.read_table(path)
+                else:
+                    with pyarrow.ipc.open_file(path) as reader:
+                        table = reader.read_all()
+                self.assertEqual(['11001', '12011'], table.column('station_code').to_pylist())
+                self.assertEqual([0, 1], table.column('temp_quality').to_pylist())
+
+if __name__ == '__main__':
+    unittest.main()
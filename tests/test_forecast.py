@@ -0,0 +1,28 @@
+import unittest
+import pathlib
+import sys
+
+HERE = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(HERE.parent / 'src'))
+
+
+class TestForecast(unittest.TestCase):
+
+    def test_parse(self):
+        from jma.forecast import Forecast
+        from sample_data import FORECAST
+
+        forecast = Forecast(FORECAST)
+        self.assertEqual(['weatherCodes', 'weathers', 'winds', 'waves'],
+                         forecast.three_day.columns)
+        izu = forecast.three_day.get('130020')
+        assert izu
+        self.assertEqual(('2022-02-12 05:00:00+09:00', '\uf002 101', '晴れ時々くもり', '北東の風', ''),
+                         izu.rows[0])
+        self.assertEqual('10', forecast.rain6.areas[0].rows[1][1])
+        self.assertEqual(['weatherCodes', 'pops', 'reliabilities'], forecast.week.columns)
+        self.assertEqual('10.3', forecast.temp_average[0].max)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import pathlib
+import tempfile
+import sys
+
+HERE = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(HERE.parent / 'src'))
+
+
+class TestGlyphs(unittest.TestCase):
+
+    def test_ranges(self):
+        from jma.glyphs import to_ranges
+
+        self.assertEqual([0x41, 0x43, 0x6771, 0x6771, 0], to_ranges([0x43, 0x41, 0x42, 0x6771, 0x1f600]))
+
+    def test_glyph_set(self):
+        from jma.glyphs import GlyphSet
+
+        with tempfile.TemporaryDirectory() as d:
+            path = pathlib.Path(d) / 'glyphs.txt'
+            glyphs = GlyphSet(path)
+            # 初回は全部
+            self.assertIsNone(glyphs.ranges())
+            self.assertTrue(glyphs.add_all(['東京都', 'ひらがな ABC']))
+            self.assertFalse(glyphs.add('東京'))
+            self.assertEqual({ord(c) for c in '東京都'}, glyphs.chars)
+            glyphs.save()
+
+            glyphs = GlyphSet(path)
+            ranges = glyphs.ranges([0xf00d])
+            assert ranges
+            self.assertIn(ord('都'), ranges)
+            self.assertIn(0xf00d, ranges)
+
+    def test_threads(self):
+        import threading
+        from jma.glyphs import GlyphSet
+
+        with tempfile.TemporaryDirectory() as d:
+            path = pathlib.Path(d) / 'glyphs.txt'
+            # 東 は足す範囲に含まれる
+            path.write_text('東', encoding='utf-8')
+            glyphs = GlyphSet(path)
+            texts = [chr(c) for c in range(0x4e00, 0x4e00 + 20000)]
+
+            # worker thread が足している間に描画 thread が読む
+            def add():
+                for i in range(0, len(texts), 100):
+                    glyphs.add_all(texts[i:i + 100])
+                glyphs.save()
+            thread = threading.Thread(target=add)
+            thread.start()
+            while thread.is_alive():
+                glyphs.ranges()
+            thread.join()
+            self.assertEqual(20000, len(glyphs))
+            self.assertEqual(20000, len(GlyphSet(path)))
+
+    def test_weather_code(self):
+        from jma import weather_code
+
+        self.assertEqual('晴', weather_code.get_telop('100'))
+        self.assertEqual('\uf00d', weather_code.get_icon('100'))
+        self.assertEqual('999', weather_code.label('999'))
+
+
+if __name__ == '__main__':
+    unittest.main()
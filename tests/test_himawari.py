@@ -0,0 +1,85 @@
+import unittest
+import pathlib
+import asyncio
+import sys
+
+HERE = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(HERE.parent / 'src'))
+
+
+class SlowGetter:
+    '''
+    get_async が終わらない HttpGetter の代わり。要求した url の順番を記録する
+    '''
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.loop = loop
+        self.urls = []
+
+    async def get_async(self, url: str) -> bytes:
+        self.urls.append(url)
+        await asyncio.sleep(10)
+        return b''
+
+
+class TestHimawari(unittest.TestCase):
+
+    def test_url(self):
+        from jma.himawari import TargetTime, TileKey
+
+        key = TileKey(TargetTime('20220211225000', '20220211224000'), 'B13', 'TBB', 3, 5, 2)
+        self.assertEqual(
+            'https://www.jma.go.jp/bosai/himawari/data/satimg/20220211225000/fd/20220211224000/B13/TBB/3/5/2.jpg',
+            key.url)
+
+    def test_viewport(self):
+        from jma.himawari import TargetTime, Viewport
+
+        time = TargetTime('20220211225000', '20220211224000')
+        viewport = Viewport(1, 0, 1, 1, 2)
+        self.assertEqual([(0, 1)], [(key.x, key.y) for key in viewport.keys(time, 'B13', 'TBB')])
+        # z=1 は 2x2 なので margin は端で切れる
+        self.assertEqual([(0, 0), (1, 0), (0, 1), (1, 1)],
+                         [(key.x, key.y) for key in viewport.keys(time, 'B13', 'TBB', margin=1)])
+        self.assertEqual(9, len(list(Viewport(3, 2, 2, 3, 3).keys(time, 'B13', 'TBB', margin=1))))
+
+    def test_prefetch(self):
+        from jma.himawari import TargetTime, TileFetcher, TileKey, Viewport
+
+        times = [TargetTime('20220211225000', f'202202112{i}0000') for i in range(3)]
+
+        async def run_async():
+            getter = SlowGetter(asyncio.get_running_loop())
+            fetcher = TileFetcher(getter)  # type: ignore
+            viewport = Viewport(1, 0, 0, 1, 1)
+            requested = fetcher.prefetch(viewport, times, 1, 'B13', 'TBB', margin=1, frames=1)
+            await asyncio.sleep(0)
+            # 表示中、周囲、次、前の順
+            self.assertEqual(4 + 1 + 1, len(requested))
+            expected = [
+                TileKey(times[1], 'B13', 'TBB', 1, 0, 0),
+                TileKey(times[1], 'B13', 'TBB', 1, 1, 0),
+                TileKey(times[1], 'B13', 'TBB', 1, 0, 1),
+                TileKey(times[1], 'B13', 'TBB', 1, 1, 1),
+                TileKey(times[2], 'B13', 'TBB', 1, 0, 0),
+                TileKey(times[0], 'B13', 'TBB', 1, 0, 0),
+            ]
+            self.assertEqual([key.url for key in expected], getter.urls)
+
+            # viewport を動かしたら外れた tile の先読みを止める
+            tasks = dict(fetcher.pending)
+            keep = fetcher.prefetch(Viewport(1, 1, 1, 2, 2), times, 1, 'B13', 'TBB', margin=0, frames=0)
+            fetcher.cancel(keep)
+            await asyncio.sleep(0)
+            self.assertEqual(keep, set(fetcher.pending))
+            for key, task in tasks.items():
+                self.assertEqual(key not in keep, task.cancelled())
+            fetcher.cancel()
+            await asyncio.sleep(0)
+            self.assertEqual({}, fetcher.pending)
+
+        asyncio.run(run_async())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,314 @@
+import unittest
+import pathlib
+import asyncio
+import tempfile
+import types
+import sys
+from unittest import mock
+
+HERE = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(HERE.parent / 'src'))
+
+
+async def serve_async(routes):
+    '''
+    127.0.0.1 の空いている port で aiohttp を立てる。(runner, base url)
+    '''
+    from aiohttp import web
+    app = web.Application()
+    for path, handle in routes.items():
+        app.router.add_get(path, handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]  # type: ignore
+    return runner, f'http://127.0.0.1:{port}'
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_refill(self):
+        from jma import http_getter
+
+        now = [100.0]
+        sleeps = []
+
+        async def sleep(delay):
+            # 実際には待たずに時計を進める
+            sleeps.append(delay)
+            now[0] += delay
+
+        async def run_async():
+            clock = types.SimpleNamespace(monotonic=lambda: now[0])
+            with mock.patch.object(http_getter, 'time', clock), \
+                    mock.patch.object(http_getter.asyncio, 'sleep', sleep):
+                bucket = http_getter.TokenBucket(2.0, 3.0)
+                # burst の分は待たない
+                for _ in range(3):
+                    await bucket.acquire()
+                self.assertEqual([], sleeps)
+
+                # 空なので 1 / rate 秒待つ
+                await bucket.acquire()
+                self.assertEqual([0.5], sleeps)
+                self.assertEqual(100.5, now[0])
+
+                # 長く空いても capacity までしか溜まらない
+                now[0] += 60
+                for _ in range(3):
+                    await bucket.acquire()
+                self.assertEqual([0.5], sleeps)
+                now[0] += 0.25
+                await bucket.acquire()
+                self.assertEqual([0.5, 0.25], sleeps)
+
+        asyncio.run(run_async())
+
+
+class TestHttpGetter(unittest.TestCase):
+
+    def run_getter(self, routes, body, **kw):
+        from jma.http_getter import HttpGetter
+
+        async def run_async():
+            runner, base = await serve_async(routes)
+            try:
+                with tempfile.TemporaryDirectory() as d:
+                    getter = HttpGetter(asyncio.get_running_loop(), pathlib.Path(d), **kw)
+                    try:
+                        return await body(getter, base)
+                    finally:
+                        getter.shutdown()
+                        await asyncio.sleep(0)
+            finally:
+                await runner.cleanup()
+        return asyncio.run(run_async())
+
+    def test_unexpected_not_modified(self):
+        from aiohttp import web
+        requests = []
+
+        async def handle(request: web.Request) -> web.Response:
+            requests.append(dict(request.headers))
+            if len(requests) == 1:
+                return web.Response(status=304)
+            return web.Response(body=b'{"a": 1}')
+
+        async def body(getter, base):
+            return await getter.get_async(f'{base}/data.json')
+
+        self.assertEqual(b'{"a": 1}', self.run_getter({'/data.json': handle}, body))
+        self.assertEqual(2, len(requests))
+        self.assertNotIn('If-None-Match', requests[1])
+
+    def test_not_modified_after_evict(self):
+        from aiohttp import web
+        from jma.cache_policy import CacheMeta, save_meta
+        requests = []
+
+        async def handle(request: web.Request) -> web.Response:
+            requests.append(dict(request.headers))
+            if request.headers.get('If-None-Match') == '"1"':
+                return web.Response(status=304)
+            return web.Response(body=b'{"a": 1}')
+
+        async def body(getter, base):
+            url = f'{base}/data.json'
+            # meta だけ残って body は消えている
+            path = getter.backend.get_path(url)
+            path.parent.mkdir(parents=True)
+            save_meta(path, CacheMeta(1, '"1"'))
+            return await getter.get_async(url, use_cache=False)
+
+        self.assertEqual(b'{"a": 1}', self.run_getter({'/data.json': handle}, body))
+        self.assertEqual(2, len(requests))
+        self.assertNotIn('If-None-Match', requests[1])
+
+    def test_no_store(self):
+        from aiohttp import web
+
+        async def handle(request: web.Request) -> web.Response:
+            return web.Response(body=b'{}', headers={'ETag': '"1"'})
+
+        async def body(getter, base):
+            url = f'{base}/data.json'
+            self.assertEqual(b'{}', await getter.get_async(url, store=False))
+            self.assertIsNone(getter.backend.get(url))
+            self.assertEqual([], list(getter.backend.urls()))
+
+        self.run_getter({'/data.json': handle}, body)
+
+    def test_failure_is_not_cached(self):
+        from aiohttp import web
+        import aiohttp
+        statuses = [404]
+        requests = []
+
+        async def handle(request: web.Request) -> web.Response:
+            requests.append(request.path)
+            await asyncio.sleep(0.02)
+            return web.Response(status=statuses[-1], body=b'{}')
+
+        async def body(getter, base):
+            url = f'{base}/data.json'
+            results = await asyncio.gather(getter.get_async(url), getter.get_async(url),
+                                           return_exceptions=True)
+            self.assertEqual(1, len(requests))
+            for result in results:
+                self.assertIsInstance(result, aiohttp.ClientResponseError)
+            self.assertNotIn(url, getter.task_map)
+
+            # 失敗した future を使い回さずに取り直す
+            statuses.append(200)
+            self.assertEqual(b'{}', await getter.get_async(url))
+            self.assertEqual(2, len(requests))
+
+        self.run_getter({'/data.json': handle}, body, rate=100, burst=100)
+
+    def test_cancel_waiter(self):
+        from aiohttp import web
+        requests = []
+
+        async def handle(request: web.Request) -> web.Response:
+            requests.append(request.path)
+            await asyncio.sleep(0.05)
+            return web.Response(body=b'{}')
+
+        async def body(getter, base):
+            url = f'{base}/data.json'
+            first = asyncio.create_task(getter.get_async(url))
+            second = asyncio.create_task(getter.get_async(url))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            self.assertEqual(b'{}', await second)
+            self.assertTrue(first.cancelled())
+            self.assertEqual(1, len(requests))
+
+        self.run_getter({'/data.json': handle}, body, rate=100, burst=100)
+
+    def test_retry(self):
+        from aiohttp import web
+        import aiohttp
+        requests = []
+
+        async def transient(request: web.Request) -> web.Response:
+            requests.append(request.path)
+            if len(requests) == 1:
+                return web.Response(status=503)
+            return web.Response(body=b'{}')
+
+        async def not_found(request: web.Request) -> web.Response:
+            requests.append(request.path)
+            return web.Response(status=404)
+
+        async def body(getter, base):
+            self.assertEqual(b'{}', await getter.get_async(f'{base}/transient.json'))
+            self.assertEqual(['/transient.json'] * 2, requests)
+            with self.assertRaises(aiohttp.ClientResponseError):
+                await getter.get_async(f'{base}/not_found.json')
+            self.assertEqual(['/transient.json'] * 2 + ['/not_found.json'], requests)
+
+        self.run_getter({'/transient.json': transient, '/not_found.json': not_found}, body,
+                        rate=100, burst=100, backoff=0.01)
+
+    def test_shutdown(self):
+        from aiohttp import web
+
+        async def handle(request: web.Request) -> web.Response:
+            await asyncio.sleep(1)
+            return web.Response(body=b'{}')
+
+        async def body(getter, base):
+            # 1 つは実行中、1 つは queue で待つ
+            tasks = [asyncio.create_task(getter.get_async(f'{base}/{i}.json')) for i in range(2)]
+            await asyncio.sleep(0.05)
+            getter.shutdown()
+            results = await asyncio.wait_for(
+                asyncio.gather(*tasks, return_exceptions=True), 1)
+            for result in results:
+                self.assertIsInstance(result, asyncio.CancelledError)
+            self.assertEqual({}, getter.task_map)
+
+        self.run_getter({'/{name}.json': handle}, body, concurrency=1, rate=100, burst=100)
+
+    def test_concurrency(self):
+        from aiohttp import web
+        in_flight = [0]
+        peak = [0]
+
+        async def handle(request: web.Request) -> web.Response:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+            await asyncio.sleep(0.02)
+            in_flight[0] -= 1
+            return web.Response(body=b'{}')
+
+        async def body(getter, base):
+            await asyncio.gather(*(getter.get_async(f'{base}/{i}.json') for i in range(8)))
+            self.assertEqual(8, getter.stats.requests)
+            self.assertEqual(0, getter.stats.in_flight)
+
+        self.run_getter({'/{name}.json': handle}, body, concurrency=2, rate=100, burst=100)
+        self.assertEqual(2, peak[0])
+
+    def test_stats(self):
+        from aiohttp import web
+        from jma.cache_policy import CachePolicy
+
+        async def handle(request: web.Request) -> web.Response:
+            if request.headers.get('If-None-Match') == '"1"':
+                return web.Response(status=304)
+            await asyncio.sleep(0.01)
+            return web.Response(body=b'{"a": 1}', headers={'ETag': '"1"'})
+
+        async def body(getter, base):
+            url = f'{base}/data.json'
+            await getter.get_async(url)
+            # ttl 内
+            await getter.get_async(url)
+            # 304
+            await getter.get_async(url, use_cache=False)
+            return getter.stats
+
+        stats = self.run_getter({'/data.json': handle}, body, policy=CachePolicy([], default_ttl=60))
+        self.assertEqual((2, 1, 1, 1, 0), (stats.requests, stats.hits, stats.misses, stats.revalidated, stats.errors))
+        self.assertEqual(8, stats.bytes)
+        self.assertGreaterEqual(stats.latency_max, 0.01)
+        self.assertLessEqual(stats.latency_average, stats.latency_max)
+        self.assertIn('1 hits, 1 misses, 1 revalidated, 8 bytes', str(stats))
+
+    def test_stream(self):
+        from aiohttp import web
+        from jma.cache_policy import CachePolicy
+        requests = []
+
+        async def handle(request: web.Request) -> web.Response:
+            requests.append(dict(request.headers))
+            if request.headers.get('If-None-Match') == '"1"':
+                return web.Response(status=304)
+            await asyncio.sleep(0.02)
+            return web.Response(body=b'{"a": 1, "b": [2]}', headers={'ETag': '"1"'})
+
+        async def body(getter, base):
+            url = f'{base}/data.json'
+
+            async def stream_async():
+                return [record async for record in getter.stream_json_async(url)]
+            # get_async は stream の download に相乗りする
+            records, data = await asyncio.gather(stream_async(), getter.get_async(url))
+            self.assertEqual([('a', 1), ('b', [2])], records)
+            self.assertEqual(b'{"a": 1, "b": [2]}', data)
+            self.assertEqual(1, len(requests))
+
+            # ttl 0 なので conditional request して 304
+            self.assertEqual([('a', 1), ('b', [2])], await stream_async())
+            self.assertEqual(2, len(requests))
+            self.assertEqual('"1"', requests[1]['If-None-Match'])
+            self.assertNotIn(url, getter.task_map)
+
+        self.run_getter({'/data.json': handle}, body, policy=CachePolicy([], default_ttl=0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import pathlib
+import json
+import sys
+
+HERE = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(HERE.parent / 'src'))
+
+
+class TestStreamDecoder(unittest.TestCase):
+
+    def decode(self, data: bytes, size: int):
+        from jma.json_stream import StreamDecoder
+
+        decoder = StreamDecoder()
+        records = []
+        for i in range(0, len(data), size):
+            records += decoder.feed(data[i:i+size])
+        records += decoder.close()
+        return records
+
+    def test_object(self):
+        src = {'11001': {'temp': [1.2, 0], 'name': '宗谷岬'}, '11016': {'temp': [-12, 0]}, 'n': 123}
+        data = json.dumps(src, ensure_ascii=False).encode('utf-8')
+        for size in (1, 3, 7, len(data)):
+            self.assertEqual(list(src.items()), self.decode(data, size))
+
+    def test_array(self):
+        data = b' [ {"a": 1}, 2 , "x" ] '
+        for size in (1, 5):
+            self.assertEqual([(0, {'a': 1}), (1, 2), (2, 'x')], self.decode(data, size))
+        self.assertEqual([], self.decode(b'{}', 1))
+
+    def test_string(self):
+        # 文字列の中の括弧や escape が chunk の境目に来ても終端を間違えない
+        src = {'a\\"}': 'x\\"]}{[', 'b': ['\\\\', {'c': '"'}], 'n': -1.5e3, 't': True}
+        data = json.dumps(src).encode('utf-8')
+        for size in (1, 2, 3, 5):
+            self.assertEqual(list(src.items()), self.decode(data, size))
+
+    def test_scan_once(self):
+        from jma.json_stream import StreamDecoder
+
+        # area.json の offices の様に大きな値が 1 つある
+        src = {'offices': {f'{i:06}': {'name': '地方', 'children': [str(i)] * 4} for i in range(2000)}, 'n': 1}
+        data = json.dumps(src, ensure_ascii=False).encode('utf-8')
+        decoder = StreamDecoder()
+        calls = []
+        raw_decode = decoder.decoder.raw_decode
+        decoder.decoder.raw_decode = lambda s, idx: calls.append(idx) or raw_decode(s, idx)  # type: ignore
+        records = []
+        for i in range(0, len(data), 256):
+            records += decoder.feed(data[i:i+256])
+        records += decoder.close()
+        self.assertEqual(list(src.items()), records)
+        # key 2 つと値 2 つ
+        self.assertEqual(4, len(calls))
+
+    def test_incomplete(self):
+        with self.assertRaises(ValueError):
+            self.decode(b'{"a": 1', 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import unittest
+import pathlib
+import asyncio
+import tempfile
+import sys
+
+HERE = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(HERE.parent / 'src'))
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_instruments(self):
+        from jma.metrics import Metrics, NULL_METRICS
+
+        metrics = Metrics()
+        counter = metrics.counter('jma_test_total', 'test')
+        counter.inc()
+        counter.inc(2)
+        self.assertIs(counter, metrics.counter('jma_test_total'))
+        histogram = metrics.histogram('jma_test_seconds', buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.7, 3.0):
+            histogram.observe(value)
+        self.assertEqual(1.0, histogram.quantile(0.5))
+
+        self.assertEqual(3, metrics.snapshot()['jma_test_total'])
+        text = metrics.to_prometheus()
+        self.assertIn('# TYPE jma_test_total counter\njma_test_total 3\n', text)
+        self.assertIn('jma_test_seconds_bucket{le="1"} 3\n', text)
+        self.assertIn('jma_test_seconds_bucket{le="+Inf"} 4\n', text)
+        self.assertIn('jma_test_seconds_count 4\n', text)
+
+        null = NULL_METRICS.counter('jma_test_total')
+        null.inc()
+        self.assertEqual({}, NULL_METRICS.snapshot())
+
+    def test_file_sink(self):
+        from jma.metrics import Metrics, MetricsSinks
+
+        metrics = Metrics()
+        counter = metrics.counter('jma_test_total', 'test')
+
+        async def run_async(path: pathlib.Path):
+            sinks = MetricsSinks(metrics, path=path)
+            sinks.file.interval = 3600
+            sinks.start(asyncio.get_running_loop())
+            await asyncio.sleep(0.01)
+            self.assertIn('jma_test_total 0\n', path.read_text(encoding='utf-8'))
+            # interval を待たずに止めても最後の値が残る
+            counter.inc()
+            await sinks.stop_async()
+            self.assertEqual([], sinks.tasks)
+            self.assertIn('jma_test_total 1\n', path.read_text(encoding='utf-8'))
+            self.assertFalse(path.with_name(path.name + '.tmp').exists())
+
+        with tempfile.TemporaryDirectory() as d:
+            asyncio.run(run_async(pathlib.Path(d) / 'textfile/jma.prom'))
+
+    def test_getter(self):
+        from aiohttp import web
+        from jma.http_getter import HttpGetter
+        from jma.metrics import Metrics
+
+        async def run_async():
+            async def handle(request: web.Request) -> web.Response:
+                if request.headers.get('If-None-Match') == '"1"':
+                    return web.Response(status=304, headers={'ETag': '"1"'})
+                await asyncio.sleep(0.01)
+                return web.Response(body=b'{"a": 1}', headers={'ETag': '"1"'})
+            app = web.Application()
+            app.router.add_get('/data.json', handle)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]  # type: ignore
+            url = f'http://127.0.0.1:{port}/data.json'
+
+            metrics = Metrics()
+            with tempfile.TemporaryDirectory() as d:
+                getter = HttpGetter(asyncio.get_running_loop(), pathlib.Path(d), metrics=metrics)
+                try:
+                    # 2 つ目は実行中の download に相乗りする
+                    await asyncio.gather(getter.get_async(url, use_cache=False),
+                                         getter.get_async(url, use_cache=False))
+                    await getter.get_json_async(url, use_cache=False)
+                    await getter.get_json_async(url)
+                finally:
+                    getter.shutdown()
+                    await asyncio.sleep(0)
+            await runner.cleanup()
+            return metrics.snapshot()
+
+        snapshot = asyncio.run(run_async())
+        self.assertEqual(1, snapshot['jma_dedup_hits_total'])
+        self.assertEqual(1, snapshot['jma_cache_misses_total'])
+        self.assertEqual(1, snapshot['jma_cache_revalidated_total'])
+        self.assertEqual(1, snapshot['jma_cache_hits_total'])
+        self.assertEqual(8, snapshot['jma_fetch_bytes_total'])
+        self.assertEqual(1, snapshot['jma_decode_seconds']['count'])
+        self.assertEqual(2, snapshot['jma_fetch_latency_seconds']['count'])
+
+
+if __name__ == '__main__':
+    unittest.main()
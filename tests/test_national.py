@@ -0,0 +1,105 @@
+import unittest
+import pathlib
+import asyncio
+import tempfile
+import copy
+import json
+import time
+import sys
+
+HERE = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(HERE.parent / 'src'))
+
+
+def make_forecast(code: str, weather: str, report_datetime: str = '2022-02-12T05:00:00+09:00') -> list:
+    '''
+    class10 が code の 1 area だけの予報
+    '''
+    from sample_data import FORECAST
+    forecast = copy.deepcopy(FORECAST)
+    for report in forecast:
+        report['reportDatetime'] = report_datetime
+    three_day, rain6, _ = forecast[0]['timeSeries']
+    three_day['areas'] = three_day['areas'][:1]
+    three_day['areas'][0]['area']['code'] = code
+    three_day['areas'][0]['weathers'] = [weather, weather]
+    rain6['areas'][0]['area']['code'] = code
+    return forecast
+
+
+def make_overview(text: str, report_datetime: str = '2022-02-12T04:39:00+09:00') -> dict:
+    return {'publishingOffice': '気象台', 'reportDatetime': report_datetime,
+            'targetArea': '北海道', 'headlineText': '', 'text': text}
+
+
+class TestNationalForecast(unittest.TestCase):
+
+    def test_refresh(self):
+        import jma
+        from jma.cache_policy import CacheMeta
+        from jma.http_getter import HttpGetter
+        from jma.national import NationalForecast
+        from sample_data import AREA
+
+        async def run_async():
+            with tempfile.TemporaryDirectory() as d:
+                getter = HttpGetter(asyncio.get_running_loop(), pathlib.Path(d))
+
+                def put(url: str, value):
+                    # ttl 内の cache を置いておけば取得しない
+                    getter.set_cache(url, json.dumps(value, ensure_ascii=False).encode('utf-8'),
+                                     CacheMeta(time.time()))
+
+                for office, code in (('011000', '011000'), ('012000', '012010')):
+                    put(jma.FORECAST_URL % {'office': office}, make_forecast(code, '晴れ'))
+                    put(jma.OVERVIEW_URL % {'office': office}, make_overview(f'{office} は晴れ'))
+
+                national = NationalForecast(getter, jma.AreaIndex(AREA))
+                try:
+                    self.assertEqual(['011000', '012000'], await national.refresh_async())
+                    rows = list(national.rows())
+                    self.assertEqual(['011000', '011000', '012010', '012010'], [row.area for row in rows])
+                    self.assertEqual('晴れ', rows[0].values['weathers'])
+                    self.assertEqual('10', rows[1].values['pops'])
+                    self.assertEqual('012000 は晴れ', rows[2].values['overview'])
+
+                    other_rows = [national.table[key] for key in national.office_keys['012000']]
+                    other_forecast = national.reports['012000'].forecast
+                    first_forecast = national.reports['011000'].forecast
+
+                    # 版が同じなら parse しない
+                    self.assertEqual([], await national.refresh_async())
+                    self.assertIs(first_forecast, national.reports['011000'].forecast)
+
+                    # 取り直しても reportDatetime が同じなら変わっていない
+                    put(jma.FORECAST_URL % {'office': '011000'}, make_forecast('011000', '晴れ'))
+                    put(jma.OVERVIEW_URL % {'office': '011000'}, make_overview('011000 は晴れ'))
+                    self.assertEqual([], await national.refresh_async())
+                    self.assertIs(first_forecast, national.reports['011000'].forecast)
+
+                    # 1 office だけ変わる
+                    put(jma.FORECAST_URL % {'office': '011000'},
+                        make_forecast('011000', 'くもり時々雪', '2022-02-12T11:00:00+09:00'))
+                    self.assertEqual(['011000'], await national.refresh_async())
+                    self.assertIsNot(first_forecast, national.reports['011000'].forecast)
+                    self.assertEqual('くもり時々雪', national.table[rows[0].area, rows[0].time].values['weathers'])
+                    self.assertIs(other_forecast, national.reports['012000'].forecast)
+                    for row, other in zip(other_rows, [national.table[key] for key in national.office_keys['012000']]):
+                        self.assertIs(row, other)
+                    self.assertEqual(4, len(national.table))
+
+                    # 概況だけ変わる
+                    put(jma.OVERVIEW_URL % {'office': '012000'},
+                        make_overview('012000 は雪', '2022-02-12T10:39:00+09:00'))
+                    self.assertEqual(['012000'], await national.refresh_async())
+                    self.assertIs(other_forecast, national.reports['012000'].forecast)
+                    self.assertEqual('012000 は雪', other_rows[0].values['overview'])
+                finally:
+                    getter.shutdown()
+                    await asyncio.sleep(0)
+
+        asyncio.run(run_async())
+
+
+if __name__ == '__main__':
+    unittest.main()
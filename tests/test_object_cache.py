@@ -0,0 +1,36 @@
+import unittest
+import pathlib
+import sys
+
+HERE = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(HERE.parent / 'src'))
+
+
+class TestObjectCache(unittest.TestCase):
+
+    def test_lru(self):
+        from jma.object_cache import ObjectCache
+
+        cache = ObjectCache(10)
+        cache.put('a', 1, {'a': 1}, 4)
+        cache.put('b', 1, {'b': 1}, 4)
+        self.assertEqual({'a': 1}, cache.get('a', 1))
+        # b が一番古い
+        cache.put('c', 1, {'c': 1}, 4)
+        self.assertIsNone(cache.get('b', 1))
+        self.assertEqual(8, cache.bytes)
+
+    def test_version(self):
+        from jma.object_cache import ObjectCache
+
+        cache = ObjectCache(10)
+        cache.put('a', 1, 'old', 4)
+        self.assertIsNone(cache.get('a', 2))
+        cache.put('a', 2, 'new', 4)
+        self.assertEqual('new', cache.get('a', 2))
+        self.assertEqual(1, len(cache))
+        self.assertEqual(4, cache.bytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
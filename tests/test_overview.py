@@ -0,0 +1,58 @@
+import unittest
+import pathlib
+import tempfile
+import datetime
+import sys
+
+HERE = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(HERE.parent / 'src'))
+
+
+def create_overview(report_datetime: str, text: str) -> dict:
+    return {
+        'publishingOffice': '札幌管区気象台', 'reportDatetime': report_datetime,
+        'targetArea': '石狩・空知・後志地方', 'headlineText': '', 'text': text,
+    }
+
+
+class TestOverview(unittest.TestCase):
+
+    def test_search(self):
+        from jma.overview import NGramIndex
+
+        index = NGramIndex()
+        index.add(0, '北海道地方は、大雪に警戒してください。')
+        index.add(1, '雪が大いに降るでしょう。')
+        index.add(2, '晴れ　ＡＢＣ')
+        self.assertEqual([0], index.search('大雪'))
+        self.assertEqual([0, 1], index.search('雪'))
+        # 2-gram は全部あるが並びが違う
+        self.assertEqual([], index.search('雪が大雪'))
+        self.assertEqual([2], index.search('晴れABC'))
+        self.assertEqual([], index.search('雷'))
+
+    def test_store(self):
+        from jma.overview import OverviewStore
+
+        with tempfile.TemporaryDirectory() as d:
+            directory = pathlib.Path(d)
+            store = OverviewStore(directory)
+            self.assertTrue(store.add('016000', create_overview('2022-02-11T16:37:00+09:00', '雪が降っています。')))
+            self.assertTrue(store.add('016000', create_overview('2022-02-12T04:36:00+09:00', '大雪に警戒してください。')))
+            # 同じ版
+            self.assertFalse(store.add('016000', create_overview('2022-02-12T04:36:00+09:00', '大雪に警戒してください。')))
+            self.assertTrue(store.add('130000', create_overview('2022-02-12T04:44:00+09:00', '東京地方は大雪のおそれ。')))
+            store.close()
+
+            store = OverviewStore(directory)
+            self.assertEqual(3, len(store))
+            self.assertEqual(datetime.datetime(2022, 2, 12, 4, 36), store.latest('016000').report_datetime)
+            self.assertEqual(['130000', '016000'], [b.office for b in store.search('大雪')])
+            now = datetime.datetime(2022, 2, 12, 12)
+            self.assertEqual(['016000'], list(store.offices_mentioning('雪が', hours=48, now=now)))
+            self.assertEqual([], list(store.offices_mentioning('雪が', hours=12, now=now)))
+            store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+import pathlib
+import asyncio
+import sys
+
+HERE = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(HERE.parent / 'src'))
+
+
+class TestPoll(unittest.TestCase):
+
+    def test_diff(self):
+        from jma.poll import diff
+
+        old = {'11001': {'temp': [1.2, 0]}, '11016': {'temp': [0.5, 0]}}
+        new = {'11001': {'temp': [1.3, 0]}, '11016': {'temp': [0.5, 0]}, '11046': {'temp': [2.0, 0]}}
+        self.assertEqual([('11001', 'changed', {'temp': [1.3, 0]}),
+                          ('11046', 'added', {'temp': [2.0, 0]})], list(diff(old, new)))
+        self.assertEqual([('11016', 'removed', None)], list(diff(old, {'11001': {'temp': [1.2, 0]}})))
+
+    def test_diff_amedas(self):
+        from jma.poll import diff_amedas
+
+        old = {'11001': {'temp': [10.1, 0], 'wind': [3.0, 0]}, '11016': {'temp': [0.5, 0]}}
+        new = {'11001': {'temp': [10.3, 0], 'wind': [3.0, 0], 'snow1h': [0, 0]}, '11016': {'temp': [0.5, 0]}}
+        self.assertEqual([('11001', 'changed', {'temp': {'old': [10.1, 0], 'new': [10.3, 0]},
+                                                'snow1h': {'old': None, 'new': [0, 0]}})],
+                         list(diff_amedas(old, new)))
+        self.assertEqual([('11001', 'removed', None)], list(diff_amedas(old, {'11016': {'temp': [0.5, 0]}})))
+
+    def test_diff_amedas_thresholds(self):
+        from jma.poll import diff_amedas, AMEDAS_THRESHOLDS
+
+        old = {
+            '11001': {'temp': [24.5, 0], 'wind': [3.0, 0]},
+            '11016': {'temp': [0.5, 0], 'precipitation1h': [0.0, 0]},
+            '11046': {'temp': [1.0, 0]},
+        }
+        new = {
+            # 値が変わっただけでは出さない
+            '11001': {'temp': [24.9, 0], 'wind': [4.0, 0]},
+            '11016': {'temp': [-0.5, 0], 'precipitation1h': [12.0, 0], 'snow1h': [1, 0]},
+            # 品質の悪い値は観測していないものとする
+            '11046': {'temp': [30.0, 1]},
+            '11097': {'temp': [2.0, 0]},
+        }
+        self.assertEqual([
+            ('11016', 'elements', {'added': ['snow1h'], 'removed': []}),
+            ('11016', 'threshold', {'element': 'temp', 'value': -0.5, 'previous': 0.5}),
+            ('11016', 'threshold', {'element': 'precipitation1h', 'value': 12.0, 'previous': 0.0}),
+            ('11046', 'elements', {'added': [], 'removed': ['temp']}),
+            ('11097', 'added', {'temp': [2.0, 0]}),
+        ], list(diff_amedas(old, new, AMEDAS_THRESHOLDS)))
+        self.assertEqual([('11097', 'removed', None)],
+                         [event for event in diff_amedas(new, old, AMEDAS_THRESHOLDS) if event[1] == 'removed'])
+
+    def test_socket_sink(self):
+        from jma.poll import SocketSink
+
+        async def run_async():
+            sink = SocketSink(0, timeout=0.1)
+            await sink.start_async()
+            port = sink.server.sockets[0].getsockname()[1]
+            # 読む client と読まない client
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            _, stalled = await asyncio.open_connection('127.0.0.1', port)
+            await asyncio.sleep(0.01)
+            self.assertEqual(2, len(sink.writers))
+
+            line = 'x' * (1 << 20)
+            for _ in range(32):
+                send = asyncio.create_task(sink.send_async(line))
+                self.assertEqual(len(line) + 1, len(await reader.readexactly(len(line) + 1)))
+                await asyncio.wait_for(send, 1)
+                if len(sink.writers) == 1:
+                    break
+            # 読まない client は buffer が捌けずに切られる
+            self.assertEqual(1, len(sink.writers))
+
+            writer.close()
+            stalled.close()
+            await asyncio.sleep(0.01)
+            self.assertEqual(set(), sink.writers)
+            sink.server.close()
+            await sink.server.wait_closed()
+
+        asyncio.run(run_async())
+
+    def test_next_time(self):
+        from jma.poll import Endpoint
+        import datetime
+
+        endpoint = Endpoint('amedas', 600, 240, None)  # type: ignore
+        jst = datetime.timezone(datetime.timedelta(hours=9))
+        now = datetime.datetime(2022, 2, 12, 8, 5, tzinfo=jst)
+        self.assertEqual(datetime.datetime(2022, 2, 12, 8, 14, tzinfo=jst),
+                         datetime.datetime.fromtimestamp(endpoint.next_time(now.timestamp()), jst))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import pathlib
+import tempfile
+import json
+import sys
+
+HERE = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(HERE.parent / 'src'))
+
+STABLE = {
+    '11001': {'type': 'C', 'elems': '11112010', 'lat': [45, 31.2], 'lon': [141, 56.1],
+              'alt': 26, 'kjName': '宗谷岬', 'knName': 'ソウヤミサキ', 'enName': 'Cape Soya'},
+    '11016': {'type': 'A', 'elems': '11111111', 'lat': [45, 24.9], 'lon': [141, 40.7],
+              'alt': 3, 'kjName': '稚内', 'knName': 'ワッカナイ', 'enName': 'Wakkanai'},
+}
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def test_round_trip(self):
+        from sample_data import AREA
+        import jma.snapshot
+
+        area_data = json.dumps(AREA).encode('utf-8')
+        stable_data = json.dumps(STABLE).encode('utf-8')
+        with tempfile.TemporaryDirectory() as d:
+            path = pathlib.Path(d) / 'snapshot.bin'
+            built_area, built_stations = jma.snapshot.load_or_build(
+                path, area_data, stable_data)
+            self.assertTrue(path.exists())
+
+            loaded = jma.snapshot.loads(path.read_bytes(), jma.snapshot.hash_source(
+                area_data), jma.snapshot.hash_source(stable_data))
+            assert loaded
+            area, stations = loaded
+            self.assertEqual([(n.key, n.name, n.level) for n in built_area.nodes],
+                             [(n.key, n.name, n.level) for n in area.nodes])
+            self.assertEqual('011000', area.office_of(area.get('0120200')).key)
+            self.assertEqual(built_stations[1], stations[1])
+            self.assertEqual('Wakkanai', stations.get('11016').en_name)
+
+            # source が変わったら無効
+            self.assertIsNone(jma.snapshot.loads(
+                path.read_bytes(), jma.snapshot.hash_source(b'{}'), jma.snapshot.hash_source(stable_data)))
+
+    def test_corrupt(self):
+        from sample_data import AREA
+        import jma.snapshot
+
+        area_data = json.dumps(AREA).encode('utf-8')
+        stable_data = json.dumps(STABLE).encode('utf-8')
+        with tempfile.TemporaryDirectory() as d:
+            path = pathlib.Path(d) / 'snapshot.bin'
+            jma.snapshot.load_or_build(path, area_data, stable_data)
+            data = path.read_bytes()
+
+            # 途中で切れたものは作り直す
+            path.write_bytes(data[:len(data) // 2])
+            with self.assertRaises(EOFError):
+                jma.snapshot.loads(path.read_bytes(), jma.snapshot.hash_source(area_data),
+                                   jma.snapshot.hash_source(stable_data))
+            _, stations = jma.snapshot.load_or_build(path, area_data, stable_data)
+            self.assertEqual('Wakkanai', stations.get('11016').en_name)
+            self.assertEqual(data, path.read_bytes())
+
+            # 読めないのは壊れているのとは違う
+            path.unlink()
+            path.mkdir()
+            with self.assertRaises(OSError):
+                jma.snapshot.load_or_build(path, area_data, stable_data)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+import pathlib
+import sys
+
+HERE = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(HERE.parent / 'src'))
+
+
+def create_stations():
+    from jma.stations import StationTable
+    import random
+
+    rng = random.Random(0)
+    table = StationTable()
+    for i in range(500):
+        table.codes.append(f'{11 + i % 3}{i:03}')
+        table.kj_names.append(f'地点{i}')
+        table.lat.append(rng.uniform(24, 46))
+        table.lon.append(rng.uniform(123, 146))
+    table.update_code_map()
+    return table
+
+
+class TestStationIndex(unittest.TestCase):
+
+    def test_nearest(self):
+        from jma.station_index import StationIndex
+        import numpy as np
+
+        index = StationIndex(create_stations())
+        points = [(35.68, 139.76), (43.06, 141.35), (20.0, 150.0)]
+        for lat, lon in points:
+            # 全件との比較
+            expected = index.distance_km(lat, lon, np.arange(len(index.stations)))
+            order = np.argsort(expected, kind='stable')[:5]
+            found = index.nearest(lat, lon, 5)
+            self.assertEqual([int(i) for i in order], [i for i, _ in found])
+
+            # 覆う cell を引く場合と bucket を舐める場合
+            for km in (50, 200, 3000):
+                within = index.radius(lat, lon, km)
+                inside = np.flatnonzero(expected <= km)
+                self.assertEqual(sorted(int(i) for i in inside), sorted(i for i, _ in within))
+
+        indices, distances = index.nearest_batch([p[0] for p in points], [p[1] for p in points], 5)
+        for (lat, lon), row, km in zip(points, indices, distances):
+            self.assertEqual([i for i, _ in index.nearest(lat, lon, 5)], list(row))
+            self.assertAlmostEqual(index.nearest(lat, lon, 1)[0][1], km[0], places=3)
+
+    def test_bbox(self):
+        from jma.station_index import StationIndex
+
+        index = StationIndex(create_stations())
+        found = index.bbox(34, 138, 36, 141)
+        for i in found:
+            self.assertTrue(34 <= index.lat[i] <= 36 and 138 <= index.lon[i] <= 141)
+
+    def test_map_to_areas(self):
+        from sample_data import AREA
+        from jma.stations import StationTable
+        from jma.station_index import map_to_areas
+        import jma
+
+        stations = StationTable()
+        stations.codes += ['11001', '11016', '12011']
+        stations.kj_names += ['宗谷岬', '稚内', '士別']
+        stations.update_code_map()
+        class20s, offices = map_to_areas(stations, jma.AreaIndex(AREA))
+        self.assertEqual([None, '0120200', '0122100'], [n.key if n else None for n in class20s])
+        # 宗谷岬 は同じ府県の多数決
+        self.assertEqual(['011000', '011000', '012000'], [n.key for n in offices])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+import pathlib
+import datetime
+import sys
+import numpy as np
+
+HERE = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(HERE.parent / 'src'))
+
+
+class TestTimeAxis(unittest.TestCase):
+
+    def test_parse(self):
+        import jma
+        from jma import timeaxis
+
+        src = ['20220211225000', '20220212000000', '20240229235959']
+        times = timeaxis.parse_compact(src)
+        self.assertEqual([jma.to_datetime(t) for t in src], timeaxis.to_datetimes(times))
+        self.assertEqual(times.tolist(), timeaxis.parse_compact([int(t) for t in src]).tolist())
+        self.assertEqual(src, timeaxis.format_compact(times).tolist())
+
+        iso = ['2022-02-12T05:00:00+09:00', '2022-02-12T05:00:00Z', '2022-02-12T05:00:00-05:30']
+        expected = [datetime.datetime.fromisoformat(t.replace('Z', '+00:00')).astimezone(
+            datetime.timezone(datetime.timedelta(hours=9))).replace(tzinfo=None) for t in iso]
+        self.assertEqual(expected, timeaxis.to_datetimes(timeaxis.parse_iso(iso)))
+        self.assertEqual(expected[:1] + times[:1].tolist(),
+                         timeaxis.to_datetimes(timeaxis.parse([iso[0], src[0]])))
+
+        for invalid in ('20220230000000', '2022021122500x', '2022021122500'):
+            with self.assertRaises(ValueError):
+                timeaxis.parse_compact([invalid])
+
+    def test_align(self):
+        from jma import timeaxis
+
+        times = timeaxis.parse_compact(
+            [f'20220212{h:02}{m:02}00' for h in range(3) for m in range(0, 60, 10)])
+        self.assertEqual(slice(7, 12), timeaxis.range_slice(
+            times, '20220212011000', '2022-02-12T02:00:00+09:00'))
+
+        axis, (a, b) = timeaxis.align(times[:3], times[2:5])
+        self.assertEqual(times[:5].tolist(), axis.tolist())
+        self.assertEqual([2, 3, 4], b.tolist())
+        values = timeaxis.reindex(times[2:5], np.array([[2.0, 3.0, 4.0]]), axis)
+        np.testing.assert_array_equal([[np.nan, np.nan, 2, 3, 4]], values)
+
+        values = np.arange(len(times), dtype=np.float64)
+        values[1] = np.nan
+        hours, means = timeaxis.resample(times, values, np.timedelta64(1, 'h'))
+        self.assertEqual(times[::6].tolist(), hours.tolist())
+        np.testing.assert_allclose([14 / 5, 8.5, 14.5], means)
+        _, last = timeaxis.resample(times, values, np.timedelta64(1, 'h'), 'last')
+        np.testing.assert_array_equal([5, 11, 17], last)
+
+
+if __name__ == '__main__':
+    unittest.main()
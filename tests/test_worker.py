@@ -0,0 +1,81 @@
+import unittest
+import pathlib
+import tempfile
+import threading
+import sys
+
+HERE = pathlib.Path(__file__).absolute().parent
+sys.path.append(str(HERE.parent / 'src'))
+
+
+class TestWorker(unittest.TestCase):
+
+    def test_publish(self):
+        from typing import NamedTuple
+        from jma.worker import Worker, Slot
+
+        class State(NamedTuple):
+            value: int = 0
+            thread: str = ''
+
+        with tempfile.TemporaryDirectory() as d:
+            worker = Worker(pathlib.Path(d))
+            slot = Slot(State())
+
+            async def work_async():
+                slot.update(value=1, thread=threading.current_thread().name)
+                return slot.version
+
+            self.assertEqual(1, worker.submit(work_async()).result(timeout=5))
+            self.assertEqual(State(1, 'jma-worker'), slot.value)
+            worker.shutdown()
+            self.assertFalse(worker.thread.is_alive())
+
+    def test_shutdown(self):
+        import asyncio
+        import concurrent.futures
+        import time
+        from jma.worker import Worker
+
+        with tempfile.TemporaryDirectory() as d:
+            worker = Worker(pathlib.Path(d), 'sqlite')
+            results = []
+
+            def use_backend():
+                time.sleep(0.2)
+                results.append(worker.getter.backend.get_meta('https://example.com/a.json'))
+
+            async def executor_async():
+                await asyncio.get_running_loop().run_in_executor(None, use_backend)
+
+            async def forever_async():
+                await asyncio.sleep(3600)
+
+            started = worker.submit(executor_async())
+            pending = worker.submit(forever_async())
+            time.sleep(0.05)
+            worker.shutdown()
+            self.assertFalse(worker.thread.is_alive())
+            # executor の job は閉じる前の backend で終わる
+            self.assertEqual([None], results)
+            with self.assertRaises(concurrent.futures.CancelledError):
+                pending.result(timeout=0)
+            with self.assertRaises(concurrent.futures.CancelledError):
+                started.result(timeout=0)
+            self.assertTrue(worker.loop.is_closed())
+
+    def test_frame_times(self):
+        from jma.worker import FrameTimes
+
+        frame_times = FrameTimes(2)
+        draw = frame_times.wrap('area', lambda p_open: p_open)
+        self.assertEqual(1, draw(1))
+        draw(2)
+        draw(3)
+        (name, _, _, _), = frame_times.summary()
+        self.assertEqual('area', name)
+        self.assertEqual(2, len(frame_times.times['area']))
+
+
+if __name__ == '__main__':
+    unittest.main()